@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Category, Course, Lesson, Material, Enrollment, QuestionAnswer
+from .models import Category, Course, Lesson, Material, Enrollment, QuestionAnswer, Job
 
 @admin.register(Category)
 class CategoryAdmin(admin.ModelAdmin):
@@ -19,6 +19,12 @@ admin.site.register(Material)
 admin.site.register(Enrollment)
 admin.site.register(QuestionAnswer)
 
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = ('name', 'status', 'attempts', 'run_at', 'wait_seconds', 'run_seconds', 'finished_at')
+    list_filter = ('status', 'name')
+    readonly_fields = ('locked_by', 'locked_until', 'last_error', 'wait_seconds', 'run_seconds', 'started_at', 'finished_at')
+
 
 """
 alternatively: pre m2m:
@@ -4,3 +4,9 @@ from django.apps import AppConfig
 class CoreConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'core'
+
+    def ready(self):
+        from . import signals  # noqa: F401  connects the cache invalidation receivers
+        from . import tasks  # noqa: F401  registers the background tasks (core/jobs.py)
+        from .cache import check_web_workers
+        check_web_workers()
@@ -0,0 +1,215 @@
+# core, async_views.py:
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import StreamingHttpResponse
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework import status
+from rest_framework.exceptions import APIException, NotAuthenticated
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.response import Response
+
+from users.authentication import aauthenticate
+from .cache import aget_version, aresponse_cache_key, aget_cached_response, aset_cached_response
+from .conditional import make_etag, atable_validators, check_not_modified, set_validators
+from .counters import afresh_counts, counts_period
+from .feeds import acan_follow, question_stream, read_stream_token
+from .models import Category, Course, Lesson, QuestionAnswer
+from .pagination import KeysetPagination
+from .serializers import CategorySerializer, CourseSerializer, LessonSerializer, QuestionAnswerSerializer
+
+"""
+Async GET path for the read-heavy endpoints, for an ASGI server:
+
+    WEB_CONCURRENCY=4 uvicorn lms_backend.asgi:application   # worker count read by core/cache.py too
+
+categories/, categories/<pk>/, courses/, courses/<pk>/, lessons/ and questions/ answer GET/HEAD
+here and every other method with the DRF view in core/views.py (same URL, same responses: same
+serializers, query plans, cache keys, ETags and keyset pagination).
+
+- DRF views are synchronous: under ASGI each one runs on a thread while the event loop waits, a
+  slow query holds that thread. Here the queries run through the async ORM (aget, aiterator, async
+  for over a page, aaggregate) and the loop serves other requests meanwhile; authentication reads
+  only the token and a cache hit (core/cache.py) needs no thread at all
+- the async ORM still runs each query on a thread (the request's own, connections are per thread):
+  what the event loop saves is a worker held by a waiting request, not the queries' CPU time
+- throughput is lower, not higher: python manage.py benchmark_async_reads (gunicorn with the DRF views
+  against uvicorn with these, same worker count) measures about half the requests per second here. Every
+  query still takes a thread hop (sync_to_async) on top of its own work and the workers are CPU-bound,
+  there is no waiting for the event loop to fill. Deploy uvicorn for the streams, not for read throughput
+- a page is fetched completely (prefetches included) before it is serialized, serializing never queries
+- LMS_ASYNC_READS (lms_backend/settings.py) is on under ASGI only: WSGI and runserver keep the DRF views
+
+lessons/<pk>/questions/stream/ (Server-Sent Events, core/feeds.py) is async only: a stream waits
+for minutes, on the event loop instead of a thread.
+"""
+
+WWW_AUTHENTICATE = 'Bearer realm="api"'
+
+
+def render(data, status_code=status.HTTP_200_OK):
+    # a DRF Response without content negotiation (no APIView): JSON, rendered by Django's handler
+    response = Response(data, status=status_code)
+    response.accepted_renderer = JSONRenderer()
+    response.accepted_media_type = 'application/json'
+    response.renderer_context = {}
+    return response
+
+
+def error_response(exc):
+    # DRF's exception handler, for the exceptions these views can raise
+    data = exc.detail if isinstance(exc.detail, (list, dict)) else {'detail': exc.detail}
+    response = render(data, exc.status_code)
+    if exc.status_code == status.HTTP_401_UNAUTHORIZED:
+        response['WWW-Authenticate'] = WWW_AUTHENTICATE
+    return response
+
+
+def read_async(sync_view, async_view):
+    """URL view: GET/HEAD go to async_view, other methods to the DRF view. The DRF view itself when LMS_ASYNC_READS is off."""
+    if not getattr(settings, 'LMS_ASYNC_READS', False):
+        return sync_view
+    call_sync = sync_to_async(sync_view)
+
+    @wraps(sync_view)  # keeps .cls: the API schema still documents the DRF view
+    async def view(request, *args, **kwargs):
+        if request.method not in ('GET', 'HEAD'):
+            return await call_sync(request, *args, **kwargs)
+        request = Request(request)  # query_params and build_absolute_uri for serializers and pagination
+        try:
+            user = await aauthenticate(request._request)
+            if user is None:
+                raise NotAuthenticated()
+            request.user = user
+            return await async_view(request, *args, **kwargs)
+        except APIException as exc:
+            return error_response(exc)
+
+    return csrf_exempt(view)
+
+
+async def ais_course_instructor(request, course):
+    # is_course_instructor() without a blocking query
+    memo = getattr(request, '_instructor_of', None)
+    if memo is None:
+        memo = request._instructor_of = {}
+    if course.pk not in memo:
+        prefetched = getattr(course, '_prefetched_objects_cache', {}).get('instructors')
+        if prefetched is not None:
+            memo[course.pk] = any(user.pk == request.user.pk for user in prefetched)
+        else:
+            memo[course.pk] = await Course.instructors.through.objects.filter(
+                course_id=course.pk, user_id=request.user.pk,
+            ).aexists()
+    return memo[course.pk]
+
+
+async def category_list(request):
+    etag = make_etag('categories', await aget_version('categories'))
+    not_modified = check_not_modified(request, etag=etag)
+    if not_modified:
+        return not_modified
+    cache_key = await aresponse_cache_key('categories', request)
+    data = await aget_cached_response(cache_key)
+    if data is None:
+        categories = CategorySerializer.setup_queryset(Category.objects.all(), context={'request': request})
+        rows = [category async for category in categories.aiterator()]
+        data = CategorySerializer(rows, many=True, context={'request': request}).data
+        await aset_cached_response(cache_key, data)
+    return set_validators(render(data), etag=etag)
+
+
+async def category_detail(request, pk):
+    try:
+        category = await Category.objects.aget(pk=pk)
+    except Category.DoesNotExist:
+        return render({'detail': 'Category not found'}, status.HTTP_404_NOT_FOUND)
+    etag = make_etag('category', category.pk, category.updated_at, category.courses_count)
+    not_modified = check_not_modified(request, etag=etag)
+    if not_modified:
+        return not_modified
+    serializer = CategorySerializer(category, context={'request': request})
+    return set_validators(render(serializer.data), etag=etag)
+
+
+async def course_list(request):
+    period = counts_period()
+    etag = make_etag('courses', await aget_version('courses'), period)
+    not_modified = check_not_modified(request, etag=etag)
+    if not_modified:
+        return not_modified
+    cache_key = await aresponse_cache_key('courses', request)
+    data = await aget_cached_response(cache_key)
+    built = data is None
+    if built:
+        courses = CourseSerializer.setup_queryset(Course.objects.all(), context={'request': request})
+        paginator = KeysetPagination(ordering=('category__title', 'title'))
+        page = await paginator.apaginate_queryset(courses, request)
+        serializer = CourseSerializer(page, many=True, context={'request': request})
+        data = paginator.get_paginated_response(serializer.data).data
+        await aset_cached_response(cache_key, data)
+    return set_validators(render(await afresh_counts('courses', request, data, period, built)), etag=etag)
+
+
+async def course_detail(request, pk):
+    courses = CourseSerializer.setup_queryset(
+        Course.objects.all(), context={'request': request}, required=('updated_at', 'enrollment_count', 'lesson_count'),
+    )
+    try:
+        course = await courses.aget(pk=pk)
+    except Course.DoesNotExist:
+        return render({'detail': 'Course not found'}, status.HTTP_404_NOT_FOUND)
+    # teachers see the courses they teach, admins and students all of them
+    if request.user.role == 'teacher':
+        if not await ais_course_instructor(request, course):
+            return render({'detail': 'Permission denied'}, status.HTTP_403_FORBIDDEN)
+    elif request.user.role not in ('admin', 'student'):
+        return render({'detail': 'Unauthorized role'}, status.HTTP_403_FORBIDDEN)
+    etag = make_etag(
+        'course', course.pk, course.updated_at, course.enrollment_count, course.lesson_count, await aget_version('courses'),
+    )
+    not_modified = check_not_modified(request, etag=etag)
+    if not_modified:
+        return not_modified
+    serializer = CourseSerializer(course, context={'request': request})
+    return set_validators(render(serializer.data), etag=etag)
+
+
+async def lesson_list(request):
+    etag, last_modified = await atable_validators(Lesson.objects.all(), 'lessons', counters=('question_count',))
+    not_modified = check_not_modified(request, etag=etag, last_modified=last_modified)
+    if not_modified:
+        return not_modified
+    lessons = LessonSerializer.setup_queryset(Lesson.objects.all(), context={'request': request})
+    paginator = KeysetPagination(ordering=('-created_at',))
+    page = await paginator.apaginate_queryset(lessons, request)
+    serializer = LessonSerializer(page, many=True, context={'request': request})
+    data = paginator.get_paginated_response(serializer.data).data
+    return set_validators(render(data), etag=etag, last_modified=last_modified)
+
+
+async def questionanswer_list(request):
+    questions = QuestionAnswerSerializer.setup_queryset(QuestionAnswer.objects.all(), context={'request': request})
+    paginator = KeysetPagination(ordering=('-created_at',))
+    page = await paginator.apaginate_queryset(questions, request)
+    serializer = QuestionAnswerSerializer(page, many=True, context={'request': request})
+    return render(paginator.get_paginated_response(serializer.data).data)
+
+
+async def lesson_question_stream(request, pk):
+    # text/event-stream, see core/feeds.py; EventSource sends no Authorization header, the signed
+    # ?token= from stream/url/ is the credential, the access behind it is checked again on every connect
+    user_id = read_stream_token(request.GET.get('token', ''), pk)
+    if user_id is None:
+        return render({'detail': 'Invalid or expired stream link.'}, status.HTTP_403_FORBIDDEN)
+    if not await acan_follow(user_id, pk):
+        return render({'detail': 'Enroll in this course to follow its questions.'}, status.HTTP_403_FORBIDDEN)
+    last_id = request.headers.get('Last-Event-ID') or request.GET.get('last_event_id')
+    if last_id is not None and not last_id.isdigit():
+        return render({'detail': 'Last-Event-ID must be a question id.'}, status.HTTP_400_BAD_REQUEST)
+    response = StreamingHttpResponse(question_stream(pk, int(last_id) if last_id else None), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-store'
+    response['X-Accel-Buffering'] = 'no'  # nginx: pass each event on as it is written
+    return response
@@ -0,0 +1,79 @@
+# core, bulk.py:
+from django.db import transaction
+
+from users.models import User
+from .counters import ENROLLMENTS_PER_COURSE
+from .models import Course, Enrollment
+from .serializers import BulkEnrollmentRowSerializer
+
+BULK_CHUNK_SIZE = 1000
+
+
+def bulk_enroll(rows, chunk_size=BULK_CHUNK_SIZE):
+    """
+    Enroll many (student_id, course_id, price) rows with set-based validation:
+    one query for the students' roles, one for the courses, one for the existing enrollments,
+    then bulk_create in chunks inside one transaction, and one recount of the courses' enrollment_count.
+    Returns (created_count, errors) where errors is a list of {'index': i, 'errors': {...}};
+    created_count is the rows actually inserted, a pair enrolled concurrently is not counted.
+    """
+    errors = []
+    parsed = []
+    for index, row in enumerate(rows):
+        serializer = BulkEnrollmentRowSerializer(data=row)
+        if serializer.is_valid():
+            parsed.append((index, serializer.validated_data))
+        else:
+            errors.append({'index': index, 'errors': serializer.errors})
+
+    student_ids = {row['student_id'] for _, row in parsed}
+    course_ids = {row['course_id'] for _, row in parsed}
+    roles = dict(User.objects.filter(pk__in=student_ids).values_list('pk', 'role'))
+    courses = set(Course.objects.filter(pk__in=course_ids).values_list('pk', flat=True))
+    existing = set(
+        Enrollment.objects.filter(student_id__in=student_ids, course_id__in=course_ids)
+        .values_list('student_id', 'course_id')
+    )
+
+    valid = []
+    seen = set()
+    for index, row in parsed:
+        pair = (row['student_id'], row['course_id'])
+        row_errors = {}
+        if row['student_id'] not in roles:
+            row_errors['student_id'] = ['Student not found.']
+        elif roles[row['student_id']] != 'student':
+            row_errors['student_id'] = ['User is not a student.']
+        if row['course_id'] not in courses:
+            row_errors['course_id'] = ['Course not found.']
+        if not row_errors and pair in existing:
+            row_errors['non_field_errors'] = ['Student is already enrolled in this course.']
+        elif not row_errors and pair in seen:
+            row_errors['non_field_errors'] = ['Duplicate row in this request.']
+        if row_errors:
+            errors.append({'index': index, 'errors': row_errors})
+            continue
+        seen.add(pair)
+        valid.append(Enrollment(student_id_id=pair[0], course_id_id=pair[1], price=row['price']))
+
+    if not valid:
+        errors.sort(key=lambda error: error['index'])
+        return 0, errors
+    # ignore_conflicts doesn't tell how many rows went in: the rows of these students and courses are
+    # counted before and after the insert, in one transaction. SQLite holds the write lock from BEGIN
+    # (transaction_mode IMMEDIATE) so nobody else inserts in between; on PostgreSQL run it REPEATABLE READ
+    touched = Enrollment.objects.filter(
+        student_id__in={enrollment.student_id_id for enrollment in valid},
+        course_id__in={enrollment.course_id_id for enrollment in valid},
+    )
+    with transaction.atomic():
+        before = touched.count()
+        for start in range(0, len(valid), chunk_size):
+            # a concurrent request that enrolled the same pair after our check is skipped, not an error
+            Enrollment.objects.bulk_create(valid[start:start + chunk_size], ignore_conflicts=True)
+        created = touched.count() - before
+        # recounted rather than incremented, for the same reason
+        ENROLLMENTS_PER_COURSE.recount({enrollment.course_id_id for enrollment in valid})
+
+    errors.sort(key=lambda error: error['index'])
+    return created, errors
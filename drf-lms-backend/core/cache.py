@@ -0,0 +1,119 @@
+# core, cache.py:
+import hashlib
+import os
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.exceptions import ImproperlyConfigured
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import transaction
+
+"""
+Versioned response cache for the catalog read endpoints.
+
+Every cached namespace ('categories', 'courses') has a version number in the cache.
+Response keys include the version, so bumping it (signals.py does this on every write)
+makes all older responses unreachable at once, no key scanning or delete_pattern needed.
+The cache has to be shared by all processes (settings.CACHES): a bump made in one worker is
+invisible to the others with a per-process LocMemCache, they keep serving the old version.
+"""
+
+VERSION_KEY = 'lms:version:%s'
+
+
+def get_cache():
+    return caches[getattr(settings, 'LMS_CACHE_ALIAS', 'default')]
+
+
+def check_shared(processes, who):
+    """Raises ImproperlyConfigured when `processes` processes would each keep their own cache."""
+    if processes > 1 and isinstance(get_cache(), LocMemCache):
+        raise ImproperlyConfigured(
+            f'{who}: {processes} processes with a LocMemCache, their version bumps would not reach each other. '
+            'Configure a shared cache backend (FileBasedCache, Redis, memcached) in CACHES.'
+        )
+
+
+def check_web_workers():
+    # uvicorn --workers and gunicorn --workers default to WEB_CONCURRENCY
+    check_shared(int(os.environ.get('WEB_CONCURRENCY') or 1), 'WEB_CONCURRENCY')
+
+
+def get_version(name):
+    cache = get_cache()
+    key = VERSION_KEY % name
+    version = cache.get(key)
+    if version is None:
+        # start from a timestamp so an evicted version never goes back to a number used before
+        cache.add(key, time.time_ns(), None)
+        version = cache.get(key)
+    return version
+
+
+def _bump(names):
+    cache = get_cache()
+    for name in names:
+        key = VERSION_KEY % name
+        try:
+            cache.incr(key)
+        except ValueError:  # version was never read or got evicted
+            cache.set(key, time.time_ns(), None)
+
+
+def bump_version(*names):
+    _bump(names)
+    # bump again after commit: a reader that cached the old rows while the transaction was open is dropped too
+    if transaction.get_connection().in_atomic_block:
+        transaction.on_commit(lambda: _bump(names))
+
+
+def response_cache_key(name, request):
+    """Key for one cached GET response, read the version before querying the database."""
+    url = hashlib.md5(request.build_absolute_uri().encode('utf-8')).hexdigest()
+    return f'lms:response:{name}:{get_version(name)}:{url}'
+
+
+def get_cached_response(key):
+    return get_cache().get(key)
+
+
+def set_cached_response(key, data, timeout=None):
+    get_cache().set(key, data, timeout or getattr(settings, 'LMS_RESPONSE_CACHE_TIMEOUT', 60 * 60))
+
+
+# async views (core/async_views.py): an in-process cache is called directly, other backends through
+# their async API. Django's async cache API is the sync one run on a thread (sync_to_async), a hop
+# that costs more than the locmem lookup itself
+def is_in_process():
+    return isinstance(get_cache(), (LocMemCache, DummyCache))
+
+
+async def aget_version(name):
+    if is_in_process():
+        return get_version(name)
+    cache = get_cache()
+    key = VERSION_KEY % name
+    version = await cache.aget(key)
+    if version is None:
+        await cache.aadd(key, time.time_ns(), None)
+        version = await cache.aget(key)
+    return version
+
+
+async def aresponse_cache_key(name, request):
+    url = hashlib.md5(request.build_absolute_uri().encode('utf-8')).hexdigest()
+    return f'lms:response:{name}:{await aget_version(name)}:{url}'
+
+
+async def aget_cached_response(key):
+    if is_in_process():
+        return get_cached_response(key)
+    return await get_cache().aget(key)
+
+
+async def aset_cached_response(key, data, timeout=None):
+    if is_in_process():
+        return set_cached_response(key, data, timeout)
+    await get_cache().aset(key, data, timeout or getattr(settings, 'LMS_RESPONSE_CACHE_TIMEOUT', 60 * 60))
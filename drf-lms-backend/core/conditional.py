@@ -0,0 +1,67 @@
+# core, conditional.py:
+import hashlib
+
+from django.db.models import Count, F, Max, Sum
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+
+"""
+Conditional GET helpers (ETag / Last-Modified / 304).
+
+Validators are computed before any serialization, so a client that already has the
+current representation gets a bodyless 304 for the cost of one cheap query (or none).
+Last-Modified is only sent when updated_at covers everything in the body: course
+responses embed instructors whose changes don't touch Course.updated_at, so they
+are validated with an ETag that includes the catalog cache version instead. Nor do the
+counter columns (core/counters.py) move updated_at: ETags include their values.
+"""
+
+
+def make_etag(*parts):
+    digest = hashlib.md5('|'.join(str(part) for part in parts).encode('utf-8')).hexdigest()
+    return 'W/' + quote_etag(digest)  # weak: JSON and the browsable API share it
+
+
+def table_aggregates(counters):
+    aggregates = {'last_modified': Max('updated_at'), 'count': Count('id')}
+    for field in counters:
+        # weighted by id: a child moving between two parents changes it too
+        aggregates[field] = Sum(F(field) * F('id'))
+    return aggregates
+
+
+def table_result(name, stats, counters):
+    etag = make_etag(name, *stats.values())
+    # updated_at doesn't cover counters: ETag only, an If-Modified-Since would miss their changes
+    return etag, None if counters else stats['last_modified']
+
+
+def table_validators(queryset, name, counters=()):
+    """ETag and Last-Modified for a whole list, from MAX(updated_at), COUNT(*) and a checksum of the counter columns in one query."""
+    return table_result(name, queryset.aggregate(**table_aggregates(counters)), counters)
+
+
+async def atable_validators(queryset, name, counters=()):
+    return table_result(name, await queryset.aaggregate(**table_aggregates(counters)), counters)
+
+
+def check_not_modified(request, etag=None, last_modified=None):
+    """Returns a 304 response when the client's If-None-Match / If-Modified-Since still match, else None."""
+    if request.method not in ('GET', 'HEAD'):
+        return None
+    timestamp = int(last_modified.timestamp()) if last_modified else None
+    response = get_conditional_response(request, etag=etag, last_modified=timestamp)
+    if response is not None and etag:
+        response['ETag'] = etag
+    return response
+
+
+def set_validators(response, etag=None, last_modified=None):
+    if response.status_code != 200:
+        return response
+    if etag:
+        response['ETag'] = etag
+    if last_modified:
+        response['Last-Modified'] = http_date(last_modified.timestamp())
+    response['Cache-Control'] = 'private, no-cache'  # keep the copy, but revalidate it every time
+    return response
@@ -0,0 +1,190 @@
+# core, counters.py:
+import hashlib
+import time
+
+from django.conf import settings
+from django.db.models import Count, F, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+from .cache import bump_version, get_cached_response, set_cached_response, aget_cached_response, aset_cached_response
+from .models import Category, Course, Lesson, Enrollment, QuestionAnswer
+
+"""
+Denormalized counters, so listings read a column instead of running Count() over a join:
+
+    Category.courses_count    Course.enrollment_count    Course.lesson_count    Lesson.question_count
+
+- a created row adds 1 to its parent with one UPDATE ... SET n = n + 1 (F(), no read-modify-write race)
+- a deleted row subtracts 1, a queryset delete recounts the parents it touched
+- a cascade from the parent needs nothing, the counter goes with the parent; the one cascade that
+  leaves the parent behind (deleting a user with enrollments/questions) is handled in core/signals.py
+- bulk paths (bulk_create skips save()) recount the parents they touched in one set-based UPDATE
+- python manage.py reconcile_counters repairs any drift (raw SQL, fixtures) in one pass per counter
+The hooks are CountedMixin and CountedQuerySet in core/models.py, cascades keep Django's fast delete.
+
+A counter change writes the counter column only: not updated_at, not the catalog cache version, so
+an enrollment or a question leaves the cached catalog pages and their ETags alone. Readers get the
+counts separately: a cached course page has its counters overlaid from a per-page entry re-read at
+most every LMS_COUNTS_CACHE_TIMEOUT seconds (fresh_counts), detail ETags include the counter values
+and the lesson list ETag a checksum of question_count (core/conditional.py).
+"""
+
+
+class Counter:
+    def __init__(self, child, fk, parent, field, cache_name):
+        self.child = child
+        self.fk = fk            # attname of the child's FK to the parent
+        self.parent = parent
+        self.field = field      # counter column on the parent
+        self.cache_name = cache_name  # cached listing that shows the counter, bumped by reconcile()
+
+    def adjust(self, parent_id, delta):
+        self.parent.objects.filter(pk=parent_id).update(**{self.field: F(self.field) + delta})
+
+    def actual(self):
+        # per-parent child count as a correlated subquery, 0 when there are no children
+        counts = (
+            self.child._base_manager.filter(**{self.fk: OuterRef('pk')}).order_by()
+            .values(self.fk).annotate(n=Count('pk')).values('n')
+        )
+        return Coalesce(Subquery(counts), Value(0))
+
+    def recount(self, parent_ids):
+        """Sets the counter of these parents from their actual children, in one UPDATE."""
+        parent_ids = {pk for pk in parent_ids if pk is not None}
+        if not parent_ids:
+            return 0
+        return self.parent.objects.filter(pk__in=parent_ids).update(**{self.field: self.actual()})
+
+    def drifted(self):
+        return self.parent.objects.alias(actual=self.actual()).exclude(**{self.field: F('actual')})
+
+    def reconcile(self):
+        """Repairs every parent whose counter differs from its children, returns how many were fixed."""
+        # a repair, not the write path: the cached listings are rebuilt with the right numbers
+        fixed = self.parent.objects.filter(pk__in=self.drifted().values('pk')).update(**{self.field: self.actual()})
+        if fixed and self.cache_name:
+            bump_version(self.cache_name)
+        return fixed
+
+
+COURSES_PER_CATEGORY = Counter(Course, 'category_id', Category, 'courses_count', 'categories')
+LESSONS_PER_COURSE = Counter(Lesson, 'course_id_id', Course, 'lesson_count', 'courses')
+ENROLLMENTS_PER_COURSE = Counter(Enrollment, 'course_id_id', Course, 'enrollment_count', 'courses')
+QUESTIONS_PER_LESSON = Counter(QuestionAnswer, 'lesson_id_id', Lesson, 'question_count', None)
+
+COUNTERS = {
+    'courses_count': COURSES_PER_CATEGORY,
+    'lesson_count': LESSONS_PER_COURSE,
+    'enrollment_count': ENROLLMENTS_PER_COURSE,
+    'question_count': QUESTIONS_PER_LESSON,
+}
+
+
+def counters_for(model):
+    return [counter for counter in COUNTERS.values() if counter.child is model]
+
+
+def child_created(instance):
+    for counter in counters_for(type(instance)):
+        counter.adjust(getattr(instance, counter.fk), 1)
+
+
+def child_moved(instance):
+    # a save that changed the parent FK moves the row from one counter to the other
+    loaded = getattr(instance, '_loaded_parents', {})
+    for counter in counters_for(type(instance)):
+        old, new = loaded.get(counter.fk), getattr(instance, counter.fk)
+        if counter.fk in loaded and old != new:
+            counter.adjust(old, -1)
+            counter.adjust(new, 1)
+            loaded[counter.fk] = new
+
+
+def child_deleted(instance):
+    for counter in counters_for(type(instance)):
+        counter.adjust(getattr(instance, counter.fk), -1)
+
+
+def children_deleted(model, parent_ids):
+    """After a queryset delete: parent_ids maps each counter's fk to the parents the rows belonged to."""
+    for counter in counters_for(model):
+        counter.recount(parent_ids.get(counter.fk, ()))
+
+
+def user_deleted(user):
+    """Before a user's cascade delete: their enrollments and questions go, the courses and lessons stay."""
+    Course.objects.filter(enrollment__student_id=user.pk).update(
+        enrollment_count=F('enrollment_count') - 1,  # one enrollment per (student, course)
+    )
+    per_lesson = (
+        QuestionAnswer._base_manager.filter(lesson_id=OuterRef('pk'), user_id=user.pk).order_by()
+        .values('lesson_id').annotate(n=Count('pk')).values('n')
+    )
+    Lesson.objects.filter(questionanswer__user_id=user.pk).update(
+        question_count=F('question_count') - Subquery(per_lesson),
+    )
+
+
+# counters of a cached listing, kept apart from the page: (model, counter columns) per cache namespace
+LISTED = {'courses': (Course, ('enrollment_count', 'lesson_count'))}
+
+
+def counts_period():
+    """Listings show counters at most LMS_COUNTS_CACHE_TIMEOUT seconds old; part of their ETag."""
+    return int(time.time() // getattr(settings, 'LMS_COUNTS_CACHE_TIMEOUT', 60))
+
+
+def counts_key(name, request, period):
+    url = hashlib.md5(request.build_absolute_uri().encode('utf-8')).hexdigest()
+    return f'lms:counts:{name}:{period}:{url}'
+
+
+def page_rows(data):
+    return data['results'] if isinstance(data, dict) else data
+
+
+def counts_of(rows, fields):
+    return {row['id']: [row[field] for field in fields] for row in rows if 'id' in row and all(field in row for field in fields)}
+
+
+def overlay(data, fields, counts):
+    for row in page_rows(data):
+        for field, value in zip(fields, counts.get(row.get('id'), ())):
+            if field in row:
+                row[field] = value
+    return data
+
+
+def fresh_counts(name, request, data, period, built=False):
+    """
+    A listing page with its counters of this period: a page just serialized stores its own,
+    one served from the response cache gets them from the period's entry, or one pk IN query.
+    """
+    model, fields = LISTED[name]
+    key = counts_key(name, request, period)
+    timeout = getattr(settings, 'LMS_COUNTS_CACHE_TIMEOUT', 60)
+    if built:
+        set_cached_response(key, counts_of(page_rows(data), fields), timeout)
+        return data
+    counts = get_cached_response(key)
+    if counts is None:
+        ids = [row['id'] for row in page_rows(data) if 'id' in row]
+        counts = {pk: values for pk, *values in model.objects.filter(pk__in=ids).values_list('pk', *fields)}
+        set_cached_response(key, counts, timeout)
+    return overlay(data, fields, counts)
+
+
+async def afresh_counts(name, request, data, period, built=False):
+    model, fields = LISTED[name]
+    key = counts_key(name, request, period)
+    timeout = getattr(settings, 'LMS_COUNTS_CACHE_TIMEOUT', 60)
+    if built:
+        await aset_cached_response(key, counts_of(page_rows(data), fields), timeout)
+        return data
+    counts = await aget_cached_response(key)
+    if counts is None:
+        ids = [row['id'] for row in page_rows(data) if 'id' in row]
+        counts = {pk: values async for pk, *values in model.objects.filter(pk__in=ids).values_list('pk', *fields)}
+        await aset_cached_response(key, counts, timeout)
+    return overlay(data, fields, counts)
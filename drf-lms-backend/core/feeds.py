@@ -0,0 +1,222 @@
+# core, feeds.py:
+import asyncio
+import json
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core import signing
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Exists, OuterRef, Q, Subquery
+from django.utils import timezone
+
+from users.models import User
+from .models import Course, Enrollment, Lesson, QuestionAnswer
+from .serializers import QuestionAnswerSerializer
+
+"""
+Live Q&A of a lesson over Server-Sent Events, instead of polling /api/questions/ (every question
+of every lesson) to see what's new.
+
+GET /api/lessons/<pk>/questions/stream/url/          JWT, checks enrollment -> {"url": ".../stream/?token=...", "expires_at": ...}
+GET /api/lessons/<pk>/questions/stream/?token=...    text/event-stream, EventSource can't send an Authorization header
+
+    id: 4211
+    event: question
+    data: {"id": 4211, "user_name": "ana", "lesson_title": ..., "description": ...}
+
+- a new stream starts with the lesson's last BACKLOG questions; a reconnecting EventSource sends
+  Last-Event-ID and gets only the questions after it (?last_event_id= does the same on a fresh
+  page), one range read on the (lesson, id) index
+- questions created in this process are pushed when their transaction commits: serialized once,
+  fanned out to the lesson's subscribers through bounded queues (QUEUE_SIZE). A subscriber whose
+  queue is full is dropped - its stream ends, the browser reconnects and resumes from Last-Event-ID -
+  a slow client never blocks the request that created the question nor the other subscribers
+- questions created by other worker processes (or bulk_create) arrive with the next index read,
+  every POLL_SECONDS whether questions were pushed meanwhile or not; the same beat sends a keepalive
+  comment for proxies. Only index reads move the read cursor, a pushed question with a higher id
+  doesn't hide one committed elsewhere before it (sent later, out of id order)
+- opening a stream (reconnects included) checks the token, then the access stream/url/ checked
+  (admin, the course's instructor, an active enrollment) with one query: the token is only the
+  credential, a lost enrollment ends the follow at the next reconnect
+- a stream ends after MAX_SECONDS (the browser reconnects in RETRY_MS): connections move to new
+  workers and an expired token or lost enrollment takes effect within MAX_SECONDS
+- served by an async view: run under ASGI (lms_backend/asgi.py), a WSGI worker thread would be
+  held for the whole stream
+"""
+
+DEFAULTS = {
+    'QUEUE_SIZE': 100,     # pending events per subscriber before it is dropped
+    'BACKLOG': 50,         # questions sent by a new stream, and per index read on resume
+    'POLL_SECONDS': 15,
+    'MAX_SECONDS': 30 * 60,
+    'RETRY_MS': 3000,
+    'URL_TTL': 4 * 60 * 60,  # seconds a signed stream URL can be (re)connected
+}
+TOKEN_SALT = 'core.feeds.questions'
+DROPPED = object()  # queue marker: the subscriber fell behind
+
+
+def get_setting(name):
+    return getattr(settings, 'LMS_FEEDS', {}).get(name, DEFAULTS[name])
+
+
+def sign_stream(lesson_id, user_id):
+    """Returns (token, expires_at) for the lesson's question stream, valid for URL_TTL seconds."""
+    token = signing.dumps({'lesson': lesson_id, 'user': user_id}, salt=TOKEN_SALT)
+    return token, timezone.now() + timedelta(seconds=get_setting('URL_TTL'))
+
+
+def read_stream_token(token, lesson_id):
+    """The user id the token was signed for, None if it is forged, expired or for another lesson."""
+    try:
+        data = signing.loads(token, salt=TOKEN_SALT, max_age=get_setting('URL_TTL'))
+    except signing.BadSignature:
+        return None
+    if data.get('lesson') != lesson_id:
+        return None
+    return data.get('user')
+
+
+async def acan_follow(user_id, lesson_id):
+    """can_watch_lesson() (core/views.py) for the token's user, one query."""
+    course = Subquery(Lesson.objects.filter(pk=lesson_id).values('course_id'))
+    teaches = Exists(Course.instructors.through.objects.filter(user_id=OuterRef('pk'), course_id=course))
+    enrolled = Exists(Enrollment.objects.filter(student_id=OuterRef('pk'), course_id=course, is_active=True))
+    return await User.objects.filter(
+        Q(role='admin') | Q(teaches, role='teacher') | (Q(enrolled) & ~Q(role__in=('admin', 'teacher'))),
+        pk=user_id, is_active=True,
+    ).aexists()
+
+
+def event_frame(question_id, data):
+    return f'id: {question_id}\nevent: question\ndata: {json.dumps(data, cls=DjangoJSONEncoder)}\n\n'
+
+
+class Subscriber:
+    def __init__(self, loop):
+        self.loop = loop
+        self.queue = asyncio.Queue(get_setting('QUEUE_SIZE'))
+        self.dropped = False
+
+    def offer(self, event):
+        # on the subscriber's event loop
+        if self.dropped:
+            return
+        if self.queue.full():
+            self.dropped = True
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            event = DROPPED
+        self.queue.put_nowait(event)
+
+
+class Hub:
+    """In-process fan-out: lesson id -> subscribers, published to from any thread."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.subscribers = {}
+
+    def subscribe(self, lesson_id):
+        subscriber = Subscriber(asyncio.get_running_loop())
+        with self.lock:
+            self.subscribers.setdefault(lesson_id, set()).add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, lesson_id, subscriber):
+        with self.lock:
+            subscribers = self.subscribers.get(lesson_id)
+            if subscribers is not None:
+                subscribers.discard(subscriber)
+                if not subscribers:
+                    del self.subscribers[lesson_id]
+
+    def has_subscribers(self, lesson_id):
+        return lesson_id in self.subscribers
+
+    def publish(self, lesson_id, event):
+        with self.lock:
+            subscribers = list(self.subscribers.get(lesson_id, ()))
+        for subscriber in subscribers:
+            if subscriber.dropped:
+                continue
+            try:
+                subscriber.loop.call_soon_threadsafe(subscriber.offer, event)
+            except RuntimeError:  # its loop is closed, the stream is gone
+                self.unsubscribe(lesson_id, subscriber)
+        return len(subscribers)
+
+
+hub = Hub()
+
+
+def publish_question(question):
+    """After a question commits: one serialization for all of the lesson's streams in this process."""
+    lesson_id = question.lesson_id_id
+    if not question.is_active or not hub.has_subscribers(lesson_id):
+        return 0
+    data = QuestionAnswerSerializer(question).data
+    return hub.publish(lesson_id, (question.pk, event_frame(question.pk, data)))
+
+
+def lesson_questions(lesson_id):
+    return QuestionAnswerSerializer.setup_queryset(QuestionAnswer.objects.filter(lesson_id=lesson_id, is_active=True))
+
+
+async def read_questions(lesson_id, after=None):
+    """(id, frame) in id order: the BACKLOG questions after `after`, or the latest BACKLOG ones."""
+    questions = lesson_questions(lesson_id)
+    if after is None:
+        rows = [row async for row in questions.order_by('-id')[:get_setting('BACKLOG')]][::-1]
+    else:
+        rows = [row async for row in questions.filter(id__gt=after).order_by('id')[:get_setting('BACKLOG')]]
+    data = QuestionAnswerSerializer(rows, many=True).data
+    return [(row.pk, event_frame(row.pk, item)) for row, item in zip(rows, data)]
+
+
+async def question_stream(lesson_id, last_id=None):
+    """The event stream body, ends after MAX_SECONDS or when its subscriber is dropped."""
+    subscriber = hub.subscribe(lesson_id)  # before the first read: a question committed in between is in one or both
+    deadline = time.monotonic() + get_setting('MAX_SECONDS')
+    # cursor: the last id of an index read, only they move it (a pushed id can be ahead of a question
+    # another process committed before it); pushed: the ids after it sent from the queue, not to resend
+    cursor, pushed = last_id, set()
+    try:
+        yield f'retry: {get_setting("RETRY_MS")}\n\n'
+        events = await read_questions(lesson_id, cursor)
+        next_poll = time.monotonic() + get_setting('POLL_SECONDS')
+        while True:
+            for question_id, frame in events:
+                cursor = question_id
+                if question_id not in pushed:
+                    yield frame
+            cursor = cursor or 0
+            pushed = {question_id for question_id in pushed if question_id > cursor}
+            if len(events) == get_setting('BACKLOG'):  # a client far behind gets the missed questions BACKLOG at a time
+                events = await read_questions(lesson_id, cursor)
+                continue
+            events = []
+            now = time.monotonic()
+            if now >= deadline:
+                return
+            if now >= next_poll:
+                # every POLL_SECONDS, pushes or not: questions from other processes, and a comment so
+                # proxies keep an idle connection
+                events = await read_questions(lesson_id, cursor)
+                next_poll = time.monotonic() + get_setting('POLL_SECONDS')
+                yield ': keepalive\n\n'
+                continue
+            try:
+                event = await asyncio.wait_for(subscriber.queue.get(), min(next_poll, deadline) - now)
+            except asyncio.TimeoutError:
+                continue
+            if event is DROPPED:
+                return
+            question_id, frame = event
+            if question_id > cursor and question_id not in pushed:  # not already sent by an index read
+                pushed.add(question_id)
+                yield frame
+    finally:
+        hub.unsubscribe(lesson_id, subscriber)
@@ -0,0 +1,116 @@
+# core, images.py:
+import hashlib
+from io import BytesIO
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.utils import timezone
+from PIL import Image, ImageOps
+
+from .cache import bump_version
+from .jobs import enqueue
+from .media import get_setting
+from .models import Course
+
+"""
+Course banner variants: the uploaded original (often a multi-MB photo) is only kept for the
+detail page, catalog cards get fixed-size JPEG thumbnails and WebP versions of it.
+
+- Course.save() enqueues a 'banner_variants' job (core/jobs.py) run by manage.py run_workers,
+  the upload request doesn't wait for the resize
+- variants are stored by content hash: course_banners/variants/<sha256>/<width>.<jpg|webp>,
+  the same picture used by several courses (or uploaded again) is decoded once
+- Course.banner_variants = {"name": <banner it was built from>, "sha256": .., "widths": [..]};
+  until it matches the current banner, CourseSerializer.banner_srcset is null and clients use banner_url
+- python manage.py build_banner_variants catches up on banners set without save() (fixtures,
+  queryset updates) or whose job failed
+
+<picture>
+  <source type="image/webp" srcset={course.banner_srcset.webp} sizes="(max-width: 600px) 100vw, 320px">
+  <img src={course.banner_srcset.thumbnail} srcset={course.banner_srcset.jpeg} alt={course.title}>
+</picture>
+"""
+
+VARIANTS_DIR = 'course_banners/variants'
+FORMATS = (('jpeg', 'jpg', {'quality': 82, 'optimize': True, 'progressive': True}),
+           ('webp', 'webp', {'quality': 78, 'method': 4}))
+
+
+def variant_name(digest, width, extension):
+    return f'{VARIANTS_DIR}/{digest}/{width}.{extension}'
+
+
+def needs_variants(course):
+    return bool(course.banner) and course.banner_variants.get('name') != course.banner.name
+
+
+def schedule_banner_variants(course_id):
+    # in the saving transaction: a rolled back save leaves no job behind
+    enqueue('banner_variants', course_id=course_id)
+
+
+def banner_digest(file):
+    digest = hashlib.sha256()
+    for chunk in file.chunks():
+        digest.update(chunk)
+    file.seek(0)
+    return digest.hexdigest()
+
+
+def render_variants(file, digest):
+    """Writes the missing variant files for this content, returns the widths it has."""
+    widths = sorted(get_setting('BANNER_WIDTHS'))
+    aspect_w, aspect_h = get_setting('BANNER_ASPECT')
+    with Image.open(file) as image:
+        # JPEG: decode at 1/2, 1/4 or 1/8 scale when that is still big enough, a 24 MP photo
+        # becomes a few MP before any pixel is resized
+        image.draft('RGB', (widths[-1], widths[-1]))
+        image = ImageOps.exif_transpose(image).convert('RGB')
+        # no upscaling: a small original only gets the widths it can fill (at least the smallest)
+        fits = [width for width in widths if width <= image.width] or widths[:1]
+        for width in reversed(fits):
+            size = (width, width * aspect_h // aspect_w)
+            image = ImageOps.fit(image, size, Image.LANCZOS) if image.size != size else image
+            for image_format, extension, options in FORMATS:
+                name = variant_name(digest, width, extension)
+                if default_storage.exists(name):
+                    continue
+                buffer = BytesIO()
+                image.save(buffer, image_format, **options)
+                default_storage.save(name, ContentFile(buffer.getvalue()))
+    return fits
+
+
+def build_banner_variants(course_id):
+    """Builds (or reuses) the variants of a course's current banner, returns Course.banner_variants."""
+    course = Course.objects.filter(pk=course_id).only('id', 'banner', 'banner_variants').first()
+    if course is None or not needs_variants(course):
+        return course.banner_variants if course else None
+    name = course.banner.name
+    with course.banner.open('rb') as file:
+        digest = banner_digest(file)
+        # the same content built for another course: nothing to decode
+        done = Course.objects.filter(banner_variants__sha256=digest).values_list('banner_variants', flat=True).first()
+        widths = done['widths'] if done else render_variants(file, digest)
+    variants = {'name': name, 'sha256': digest, 'widths': widths}
+    # the banner may have been replaced while we were resizing: then the newer build wins
+    if Course.objects.filter(pk=course_id, banner=name).update(banner_variants=variants, updated_at=timezone.now()):
+        bump_version('courses')
+    return variants
+
+
+def banner_srcset(course, request=None):
+    """{'webp': srcset, 'jpeg': srcset, 'thumbnail': url} for the current banner, None until it is built."""
+    if needs_variants(course) or not course.banner:
+        return None
+    digest, widths = course.banner_variants['sha256'], course.banner_variants['widths']
+
+    def url(width, extension):
+        location = default_storage.url(variant_name(digest, width, extension))
+        return request.build_absolute_uri(location) if request is not None else location
+
+    return {
+        'webp': ', '.join(f'{url(width, "webp")} {width}w' for width in widths),
+        'jpeg': ', '.join(f'{url(width, "jpg")} {width}w' for width in widths),
+        'thumbnail': url(widths[0], 'jpg'),
+    }
@@ -0,0 +1,271 @@
+# core, imports.py:
+import csv
+import hashlib
+import json
+import os
+import re
+
+from django.db import transaction
+from rest_framework.exceptions import ValidationError
+
+from users.models import User
+from .cache import bump_version
+from .counters import COURSES_PER_CATEGORY, LESSONS_PER_COURSE
+from .jobs import enqueue
+from .models import CatalogImport, CatalogImportRef, Category, Course, Job, Lesson
+from .serializers import CourseImportRowSerializer, LessonImportRowSerializer
+
+"""
+Streaming catalog import: the manifest is read row by row and written in chunks, each chunk
+in its own transaction (courses, instructor through rows, lessons and the checkpoint together).
+
+Manifest, CSV with a header or NDJSON, one record per row, a course before its lessons:
+    kind,ref,title,description,price,duration,is_active,category,instructors,course,video
+    course,py-101,Python 101,Basics,500,10,true,Programming,teacher01|teacher02,,
+    lesson,,Variables,First steps,,,,,,py-101,lesson_videos/py-101-1.mp4
+
+- categories are matched by title (created when missing), instructors by username (role teacher)
+- a failed run is resumed by importing the same file again: the checkpoint is keyed by the
+  file's sha256 and the rows of committed chunks are skipped
+- invalid rows are skipped and reported, they don't stop the import; so are lines that aren't UTF-8
+- a lesson's video must already be in MEDIA_ROOT/lesson_videos/ and not belong to another course's lesson
+
+POST /api/courses/import/       multipart: manifest=<file>, input=csv|ndjson (default: from the file name)
+                                -> 202, the manifest is stored and imported by a background job (run_workers)
+GET  /api/courses/import/<pk>/  progress: rows_done, courses/lessons created, errors, is_finished
+python manage.py import_catalog catalog.csv     # in this process, with progress lines
+"""
+
+IMPORT_CHUNK_SIZE = 1000
+MAX_REPORTED_ERRORS = 100
+INPUTS = ('csv', 'ndjson')
+UNDECODABLE = object()  # a row with bytes that aren't UTF-8
+BAD_BYTES = re.compile('[\udc80-\udcff]')  # what surrogateescape decodes them to
+
+
+def detect_input(name, value=None):
+    value = value or ('csv' if str(name).lower().endswith('.csv') else 'ndjson')
+    if value not in INPUTS:
+        raise ValidationError({'input': [f'Choose one of: {", ".join(INPUTS)}.']})
+    return value
+
+
+def file_digest(file):
+    digest = hashlib.sha256()
+    for chunk in file.chunks():
+        digest.update(chunk)
+    file.seek(0)
+    return digest.hexdigest()
+
+
+def read_rows(file, input_format):
+    # File.__iter__ yields byte lines, so the manifest is never loaded whole; bytes that aren't UTF-8
+    # are kept as surrogates (no UnicodeDecodeError mid-import) and their row is reported
+    lines = (line.decode('utf-8-sig', 'surrogateescape') for line in file)
+    if input_format == 'csv':
+        for row in csv.DictReader(lines):
+            if any(BAD_BYTES.search(value) for value in (*row, *row.values()) if isinstance(value, str)):
+                yield UNDECODABLE
+                continue
+            # empty cells fall back to the serializer defaults
+            yield {key: value for key, value in row.items() if key and value not in ('', None)}
+        return
+    for line in lines:
+        if not line.strip():
+            continue
+        if BAD_BYTES.search(line):
+            yield UNDECODABLE
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError:
+            row = None
+        yield row if isinstance(row, dict) else None
+
+
+class CatalogImporter:
+    def __init__(self, job, chunk_size=IMPORT_CHUNK_SIZE):
+        self.job = job
+        self.chunk_size = chunk_size
+        self.errors = []
+        # lookup maps, loaded once: a row never costs a query
+        self.categories = {}
+        for pk, title in Category.objects.order_by('-id').values_list('id', 'title'):
+            self.categories[title] = pk  # oldest category wins on duplicate titles
+        self.teachers = dict(User.objects.filter(role='teacher').values_list('username', 'id'))
+        self.refs = dict(job.refs.values_list('ref', 'course_id'))
+
+    def run(self, rows, progress=None):
+        chunk = []
+        for number, row in enumerate(rows, start=1):
+            if number <= self.job.rows_done:
+                continue  # committed by an earlier run
+            chunk.append((number, row))
+            if len(chunk) >= self.chunk_size:
+                self.write_chunk(chunk)
+                chunk = []
+                if progress:
+                    progress(self.job)
+        if chunk:
+            self.write_chunk(chunk)
+        self.job.is_finished = True
+        self.job.save(update_fields=['is_finished', 'updated_at'])
+        if progress:
+            progress(self.job)
+        return self.job
+
+    def error(self, number, errors):
+        self.job.error_count += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({'row': number, 'errors': errors})
+        if len(self.job.errors) < MAX_REPORTED_ERRORS:  # kept across runs, saved with the chunk
+            self.job.errors.append({'row': number, 'errors': errors})
+
+    def parse_chunk(self, chunk):
+        courses, lessons = [], []
+        chunk_refs = set()
+        for number, row in chunk:
+            if row is UNDECODABLE:
+                self.error(number, {'row': ['Not valid UTF-8, save the manifest as UTF-8.']})
+                continue
+            kind = row.get('kind') if row is not None else None
+            if kind == 'course':
+                serializer = CourseImportRowSerializer(data=row)
+                if not serializer.is_valid():
+                    self.error(number, serializer.errors)
+                    continue
+                data = serializer.validated_data
+                unknown = [name for name in data['instructors'] if name not in self.teachers]
+                if unknown:
+                    self.error(number, {'instructors': [f'Unknown teacher: {", ".join(unknown)}.']})
+                elif data['ref'] in self.refs or data['ref'] in chunk_refs:
+                    self.error(number, {'ref': ['Duplicate course ref.']})
+                else:
+                    chunk_refs.add(data['ref'])
+                    courses.append(data)
+            elif kind == 'lesson':
+                serializer = LessonImportRowSerializer(data=row)
+                if not serializer.is_valid():
+                    self.error(number, serializer.errors)
+                elif serializer.validated_data['course'] not in self.refs and serializer.validated_data['course'] not in chunk_refs:
+                    self.error(number, {'course': ['No course with this ref earlier in the manifest.']})
+                else:
+                    lessons.append((number, serializer.validated_data))
+            else:
+                self.error(number, {'kind': ['Expected a JSON object with kind "course" or "lesson".']})
+        return courses, self.own_videos(lessons)
+
+    def own_videos(self, lessons):
+        # a video file belongs to one course: one query per chunk for the lessons already using these files
+        owners = {}
+        for video, course_id in Lesson.objects.filter(
+            video__in={data['video'] for _, data in lessons if data['video']},
+        ).values_list('video', 'course_id'):
+            owners.setdefault(video, set()).add(course_id)
+        kept = []
+        for number, data in lessons:
+            course = self.refs.get(data['course'], data['course'])  # a ref of this chunk: its course isn't created yet
+            users = owners.setdefault(data['video'], set()) if data['video'] else set()
+            if users - {course}:
+                self.error(number, {'video': ['This file is the video of a lesson of another course.']})
+                continue
+            users.add(course)
+            kept.append(data)
+        return kept
+
+    def write_chunk(self, chunk):
+        courses, lessons = self.parse_chunk(chunk)
+        with transaction.atomic():
+            new_titles = {data['category'] for data in courses} - self.categories.keys()
+            for category in Category.objects.bulk_create([Category(title=title) for title in sorted(new_titles)]):
+                self.categories[category.title] = category.pk
+
+            created = Course.objects.bulk_create([
+                Course(
+                    title=data['title'], description=data['description'], price=data['price'],
+                    duration=data['duration'], is_active=data['is_active'],
+                    category_id=self.categories[data['category']],
+                )
+                for data in courses
+            ], batch_size=self.chunk_size)
+            Through = Course.instructors.through
+            Through.objects.bulk_create([
+                Through(course_id=course.pk, user_id=self.teachers[name])
+                for course, data in zip(created, courses)
+                for name in dict.fromkeys(data['instructors'])  # a teacher listed twice is one row
+            ], batch_size=self.chunk_size)
+            CatalogImportRef.objects.bulk_create([
+                CatalogImportRef(catalog_import=self.job, ref=data['ref'], course_id=course.pk)
+                for course, data in zip(created, courses)
+            ], batch_size=self.chunk_size)
+            for course, data in zip(created, courses):
+                self.refs[data['ref']] = course.pk
+
+            Lesson.objects.bulk_create([
+                Lesson(
+                    title=data['title'], description=data['description'], video=data['video'],
+                    is_active=data['is_active'], course_id_id=self.refs[data['course']],
+                )
+                for data in lessons
+            ], batch_size=self.chunk_size)
+            COURSES_PER_CATEGORY.recount({course.category_id for course in created})
+            LESSONS_PER_COURSE.recount({self.refs[data['course']] for data in lessons})
+
+            self.job.rows_done = chunk[-1][0]
+            self.job.courses_created += len(created)
+            self.job.lessons_created += len(lessons)
+            self.job.save(update_fields=['rows_done', 'courses_created', 'lessons_created', 'error_count', 'errors', 'updated_at'])
+            # bulk_create sends no signals, invalidate the catalog caches here
+            bump_version('categories', 'courses')
+
+
+def import_catalog(file, input_format=None, chunk_size=IMPORT_CHUNK_SIZE, progress=None):
+    """
+    Imports a manifest (a django File), resuming an earlier unfinished import of the same content.
+    Returns (job, resumed_from, errors); errors are this run's skipped rows, capped at MAX_REPORTED_ERRORS.
+    """
+    input_format = detect_input(file.name, input_format)
+    job, _ = CatalogImport.objects.get_or_create(
+        digest=file_digest(file), defaults={'name': os.path.basename(file.name or '')[:255]},
+    )
+    resumed_from = job.rows_done
+    if job.is_finished:
+        return job, resumed_from, []
+    importer = CatalogImporter(job, chunk_size=chunk_size)
+    importer.run(read_rows(file, input_format), progress=progress)
+    return job, resumed_from, importer.errors
+
+
+def start_import(file, input_format=None):
+    """
+    Stores an uploaded manifest and queues its import (core/tasks.py), in one transaction.
+    Returns (job, queued); queued is False when this content was imported already.
+    """
+    input_format = detect_input(file.name, input_format)
+    digest = file_digest(file)
+    with transaction.atomic():
+        job, _ = CatalogImport.objects.get_or_create(digest=digest, defaults={'name': os.path.basename(file.name or '')[:255]})
+        if job.is_finished:
+            return job, False
+        pending = Job.objects.filter(
+            name='catalog_import', status__in=(Job.QUEUED, Job.RUNNING), payload__import_id=job.pk,
+        ).exists()
+        if not pending:
+            if not job.manifest:  # a failed run's file is still there
+                job.manifest.save(f'{digest}.{input_format}', file, save=False)
+            job.input_format = input_format
+            job.save(update_fields=['manifest', 'input_format', 'updated_at'])
+            enqueue('catalog_import', import_id=job.pk)
+    return job, True
+
+
+def run_import(import_id, chunk_size=IMPORT_CHUNK_SIZE, progress=None):
+    """The background side of start_import(): imports the stored manifest, then deletes it."""
+    job = CatalogImport.objects.get(pk=import_id)
+    if job.is_finished or not job.manifest:
+        return job
+    with job.manifest.open('rb') as file:
+        CatalogImporter(job, chunk_size=chunk_size).run(read_rows(file, job.input_format), progress=progress)
+    job.manifest.delete(save=False)
+    job.save(update_fields=['manifest', 'updated_at'])
+    return job
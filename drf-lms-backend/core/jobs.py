@@ -0,0 +1,230 @@
+# core, jobs.py:
+import os
+import random
+import socket
+import threading
+import time
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections, connection, transaction
+from django.db.models import Avg, Count, Max, Q
+from django.utils import timezone
+
+from .models import Job, JobLock
+
+"""
+Background jobs in a table, no broker: heavy work is enqueued in the request's transaction
+(a rolled back request leaves no job behind) and run by python manage.py run_workers.
+
+    @task('banner_variants')                     # core/tasks.py
+    def banner_variants(course_id): ...
+    enqueue('banner_variants', course_id=7)      # anywhere, e.g. Course.save()
+
+- claiming: SELECT ... FOR UPDATE SKIP LOCKED on databases that have it (PostgreSQL, MySQL 8),
+  on SQLite the claimer first UPDATEs the JobLock row, which takes the database write lock before
+  reading, so claims are serialized and two workers never pick the same job
+- a claimed job holds a lease (locked_until = now + TIMEOUT_SECONDS); a job whose worker died is
+  picked up again once the lease ran out. A task that can run longer calls renew_lease() between
+  steps (core/tasks.py certificates, after each chunk): it extends the lease, or raises LeaseLost
+  when another worker already took the job over
+- a failing job is retried after BACKOFF_SECONDS * 2^(attempt - 1) (with jitter, capped at
+  MAX_BACKOFF_SECONDS) until max_attempts, then it stays 'failed' with its traceback in last_error
+- every run records wait_seconds (due -> picked up) and run_seconds; run_workers --stats sums them up
+
+python manage.py run_workers --processes 2 --threads 4
+python manage.py run_workers --once    # run what is due in this process and exit (cron, tests)
+python manage.py run_workers --stats
+"""
+
+DEFAULTS = {
+    'PROCESSES': 1,
+    'THREADS': 2,                    # per process; tasks here mostly wait on disk, Pillow and the database
+    'POLL_SECONDS': 1.0,             # idle wait between claims when the queue is empty
+    'TIMEOUT_SECONDS': 10 * 60,      # lease of a claimed job
+    'MAX_ATTEMPTS': 5,
+    'BACKOFF_SECONDS': 10,
+    'MAX_BACKOFF_SECONDS': 60 * 60,
+    'KEEP_SECONDS': 7 * 24 * 60 * 60,  # finished jobs are pruned after this long, failed ones are kept
+}
+TASKS = {}
+running = threading.local()  # the job this worker thread is running, for renew_lease()
+QUEUE_LOCK = 'queue'
+MAX_ERROR_LENGTH = 10_000
+
+
+def get_setting(name):
+    return getattr(settings, 'LMS_JOBS', {}).get(name, DEFAULTS[name])
+
+
+class Task:
+    def __init__(self, name, func, max_attempts=None):
+        self.name = name
+        self.func = func
+        self.max_attempts = max_attempts
+
+    def __call__(self, **payload):
+        return self.func(**payload)
+
+
+def task(name, max_attempts=None):
+    """Registers a function as a background task; its keyword arguments must be JSON serializable."""
+    def register(func):
+        TASKS[name] = Task(name, func, max_attempts)
+        return func
+    return register
+
+
+def enqueue(name, run_at=None, **payload):
+    if name not in TASKS:
+        raise KeyError(f'No task named {name!r}, register it with @task in core/tasks.py')
+    return Job.objects.create(
+        name=name, payload=payload, run_at=run_at or timezone.now(),
+        max_attempts=TASKS[name].max_attempts or get_setting('MAX_ATTEMPTS'),
+    )
+
+
+class LeaseLost(Exception):
+    pass
+
+
+def renew_lease():
+    """Extends the running job's lease by TIMEOUT_SECONDS; a no-op outside a worker (a command, a test)."""
+    job = getattr(running, 'job', None)
+    if job is None:
+        return
+    locked_until = timezone.now() + timedelta(seconds=get_setting('TIMEOUT_SECONDS'))
+    if not Job.objects.filter(pk=job.pk, locked_by=job.locked_by, attempts=job.attempts).update(locked_until=locked_until):
+        raise LeaseLost(f'Job #{job.pk} was claimed again, stopping.')
+    job.locked_until = locked_until
+
+
+def worker_name(thread=0):
+    return f'{socket.gethostname()}:{os.getpid()}:{thread}'
+
+
+def lock_queue():
+    if not JobLock.objects.filter(name=QUEUE_LOCK).update(locked_at=timezone.now()):
+        JobLock.objects.get_or_create(name=QUEUE_LOCK)
+
+
+def claim(worker):
+    """Takes the next due job (or one whose worker died) and leases it to worker, None if there is none."""
+    now = timezone.now()
+    due = Q(status=Job.QUEUED, run_at__lte=now) | Q(status=Job.RUNNING, locked_until__lt=now)
+    with transaction.atomic():
+        if connection.features.has_select_for_update_skip_locked:
+            job = Job.objects.select_for_update(skip_locked=True).filter(due).order_by('run_at', 'id').first()
+        else:
+            lock_queue()  # write first: holds SQLite's write lock until this transaction commits
+            job = Job.objects.filter(due).order_by('run_at', 'id').first()
+        if job is None:
+            return None
+        if job.status == Job.RUNNING and job.attempts >= job.max_attempts:
+            # the worker died on its last attempt (killed, out of memory): don't retry forever
+            job.status = Job.FAILED
+            job.finished_at = now
+            job.last_error = f'Lease of {job.locked_by} expired on the last attempt.'
+            job.save(update_fields=['status', 'finished_at', 'last_error', 'updated_at'])
+            return claim(worker)
+        job.wait_seconds = max((now - (job.locked_until if job.status == Job.RUNNING else job.run_at)).total_seconds(), 0)
+        job.status = Job.RUNNING
+        job.attempts += 1
+        job.locked_by = worker
+        job.locked_until = now + timedelta(seconds=get_setting('TIMEOUT_SECONDS'))
+        job.started_at = now
+        job.save(update_fields=['status', 'attempts', 'locked_by', 'locked_until', 'wait_seconds', 'started_at', 'updated_at'])
+    return job
+
+
+def backoff(attempt):
+    delay = min(get_setting('BACKOFF_SECONDS') * 2 ** (attempt - 1), get_setting('MAX_BACKOFF_SECONDS'))
+    return delay * random.uniform(0.5, 1.0)  # jitter: a burst of failures doesn't retry in lockstep
+
+
+def run_job(job):
+    """Runs a claimed job and records the outcome; returns the job with its new status."""
+    started = time.perf_counter()
+    error = None
+    retry = True
+    spec = TASKS.get(job.name)
+    if spec is None:
+        error, retry = f'No task named {job.name!r} in this worker.', False
+    else:
+        running.job = job
+        try:
+            spec(**job.payload)
+        except Exception:
+            error = traceback.format_exc()
+        finally:
+            running.job = None
+    job.run_seconds = time.perf_counter() - started
+    now = timezone.now()
+
+    if error is None:
+        job.status, job.last_error, job.finished_at = Job.DONE, '', now
+    elif retry and job.attempts < job.max_attempts:
+        job.status, job.last_error = Job.QUEUED, error[-MAX_ERROR_LENGTH:]
+        job.run_at = now + timedelta(seconds=backoff(job.attempts))
+    else:
+        job.status, job.last_error, job.finished_at = Job.FAILED, error[-MAX_ERROR_LENGTH:], now
+    fields = dict(
+        status=job.status, last_error=job.last_error, finished_at=job.finished_at, run_at=job.run_at,
+        run_seconds=job.run_seconds, locked_by='', locked_until=None, updated_at=now,
+    )
+    # only if the lease is still ours: a job that outran its lease may have been claimed again
+    Job.objects.filter(pk=job.pk, locked_by=job.locked_by, attempts=job.attempts).update(**fields)
+    return job
+
+
+def work(worker, stop, once=False, log=None):
+    """Claims and runs jobs until stop is set (or, with once, until nothing is due)."""
+    poll = get_setting('POLL_SECONDS')
+    # a caller's transaction (a test, --once from a script) keeps its connection
+    own_connection = not connection.in_atomic_block
+    try:
+        while not stop.is_set():
+            if own_connection:
+                close_old_connections()  # like a request: drop a connection that went bad or too old
+            job = claim(worker)
+            if job is None:
+                if once:
+                    return
+                stop.wait(poll)
+                continue
+            run_job(job)
+            if log:
+                log(job)
+    finally:
+        if own_connection:
+            connection.close()
+
+
+def run_threads(threads, stop, once=False, log=None):
+    if threads == 1:
+        return work(worker_name(), stop, once, log)
+    pool = [
+        threading.Thread(target=work, args=(worker_name(number), stop, once, log), name=f'job-worker-{number}')
+        for number in range(threads)
+    ]
+    for thread in pool:
+        thread.start()
+    for thread in pool:
+        thread.join()
+
+
+def prune_jobs():
+    """Deletes done jobs older than KEEP_SECONDS; failed ones stay until someone looks at them."""
+    cutoff = timezone.now() - timedelta(seconds=get_setting('KEEP_SECONDS'))
+    deleted, _ = Job.objects.filter(status=Job.DONE, finished_at__lt=cutoff).delete()
+    return deleted
+
+
+def job_stats():
+    """Per task and status: count, average/max run time and average wait, from the recorded timings."""
+    return list(
+        Job.objects.values('name', 'status').order_by('name', 'status').annotate(
+            count=Count('id'), avg_run=Avg('run_seconds'), max_run=Max('run_seconds'), avg_wait=Avg('wait_seconds'),
+        )
+    )
@@ -0,0 +1,196 @@
+# core, management/commands/benchmark_async_reads.py:
+import collections
+import http.client
+import multiprocessing
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from io import StringIO
+
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+
+from core.models import Course
+from users.models import User
+from users.serializers import LMSTokenObtainPairSerializer
+from .benchmark_concurrency import SEED, percentile
+
+"""
+python manage.py benchmark_async_reads                          # gunicorn (WSGI, DRF views) vs uvicorn (ASGI, async views)
+python manage.py benchmark_async_reads --workers 4 --clients 64 --seconds 20
+python manage.py benchmark_async_reads --server asgi            # one of them only
+starts each server with the same number of worker processes on a scratch database (migrated and
+seeded like benchmark_concurrency, the configured one is never touched) and runs forked clients
+against it, each sending one GET at a time, on a new connection, over the endpoints core/async_views.py
+serves: catalog pages (cached), a course (cached after its first read), lesson and question pages
+(queried on every request). Prints throughput and latency per endpoint and every failed request.
+The clients share the machine with the servers: on a few cores they take CPU time from them, compare
+the two servers with each other, not with production figures. gunicorn and uvicorn must be installed.
+"""
+
+SERVERS = {
+    'wsgi': ('gunicorn', 'lms_backend.wsgi:application', '--workers', '{workers}', '--bind', '127.0.0.1:{port}'),
+    'asgi': ('uvicorn', 'lms_backend.asgi:application', '--workers', '{workers}', '--port', '{port}', '--no-access-log'),
+}
+ENDPOINTS = ('categories/', 'courses/', 'courses/<pk>/', 'lessons/', 'questions/')
+SCRATCH_SETTINGS = """from lms_backend.settings import *  # noqa: F401,F403
+
+DEBUG = False
+ALLOWED_HOSTS = ['127.0.0.1']
+DATABASES['default']['NAME'] = {database!r}
+DATABASES['replica']['NAME'] = {replica!r}
+CACHES['default']['LOCATION'] = {cache!r}
+"""
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def get(port, path, token):
+    client = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+    try:
+        client.request('GET', f'/api/{path}', headers={'Authorization': f'Bearer {token}', 'Connection': 'close'})
+        response = client.getresponse()
+        response.read()
+        return response.status
+    finally:
+        client.close()
+
+
+def run_client(port, token, courses, seconds, seed, results):
+    rng = random.Random(seed)
+    timings, errors = collections.defaultdict(list), collections.Counter()
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        endpoint = rng.choice(ENDPOINTS)
+        path = endpoint.replace('<pk>', str(rng.choice(courses)))
+        started = time.perf_counter()
+        try:
+            status = get(port, path, token)
+        except OSError as exc:
+            errors[f'{endpoint}: {exc.__class__.__name__}: {exc}'] += 1
+            continue
+        if status != 200:
+            errors[f'{endpoint}: HTTP {status}'] += 1
+        else:
+            timings[endpoint].append(time.perf_counter() - started)
+    results.put((dict(timings), errors))
+
+
+class Command(BaseCommand):
+    help = 'GET load on the async read endpoints: gunicorn with the DRF views vs uvicorn with the async views.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=2, help='server worker processes, the same for both')
+        parser.add_argument('--clients', type=int, default=32, help='concurrent client processes')
+        parser.add_argument('--seconds', type=float, default=10)
+        parser.add_argument('--server', choices=('wsgi', 'asgi', 'both'), default='both')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError('This benchmark seeds a scratch SQLite database, the default database is not SQLite.')
+        servers = ('wsgi', 'asgi') if options['server'] == 'both' else (options['server'],)
+        original = dict(connection.settings_dict)
+        with tempfile.TemporaryDirectory() as directory:
+            try:
+                token, courses = self.seed(os.path.join(directory, 'benchmark.sqlite3'))
+            finally:
+                connections.close_all()
+                connection.settings_dict.update(original)
+            with open(os.path.join(directory, 'benchmark_settings.py'), 'w') as file:
+                file.write(SCRATCH_SETTINGS.format(
+                    database=os.path.join(directory, 'benchmark.sqlite3'),
+                    replica=os.path.join(directory, 'replica.sqlite3'),
+                    cache=os.path.join(directory, 'cache'),
+                ))
+            for name in servers:
+                self.run_server(name, directory, token, courses, options)
+
+    def seed(self, path):
+        connections.close_all()
+        connection.settings_dict.update(NAME=path)
+        call_command('migrate', verbosity=0)
+        call_command('seed_lms', stdout=StringIO(), **SEED)
+        student = User.objects.filter(role='student').first()
+        courses = list(Course.objects.values_list('pk', flat=True))
+        return str(LMSTokenObtainPairSerializer.get_token(student).access_token), courses
+
+    def run_server(self, name, directory, token, courses, options):
+        port = free_port()
+        command = [sys.executable, '-m'] + [
+            part.format(workers=options['workers'], port=port) for part in SERVERS[name]
+        ]
+        environment = {
+            **os.environ,
+            'DJANGO_SETTINGS_MODULE': 'benchmark_settings',
+            'PYTHONPATH': os.pathsep.join([directory, str(settings.BASE_DIR)]),
+            'WEB_CONCURRENCY': str(options['workers']),  # core/cache.py checks the cache backend against it
+        }
+        environment.pop('LMS_SERVER', None)  # lms_backend/asgi.py sets it, wsgi.py must not inherit it
+        self.stdout.write(f'{name}: {" ".join(command[2:])}')
+        log = os.path.join(directory, f'{name}.log')  # a pipe nobody reads would block the server once full
+        with open(log, 'w') as output:
+            server = subprocess.Popen(command, cwd=settings.BASE_DIR, env=environment, stdout=output, stderr=subprocess.STDOUT)
+        try:
+            self.wait_until_up(server, port, token, log)
+            self.run_load(port, token, courses, options)
+        finally:
+            server.terminate()
+            try:
+                server.wait(timeout=30)
+            except subprocess.TimeoutExpired:
+                server.kill()
+
+    def wait_until_up(self, server, port, token, log):
+        deadline = time.monotonic() + 60
+        while time.monotonic() < deadline:
+            if server.poll() is not None:
+                with open(log) as output:
+                    raise CommandError(f'The server exited ({server.returncode}):\n{output.read()}')
+            try:
+                if get(port, 'categories/', token) == 200:
+                    return
+            except OSError:
+                pass
+            time.sleep(0.2)
+        raise CommandError('The server did not answer within 60 seconds.')
+
+    def run_load(self, port, token, courses, options):
+        context = multiprocessing.get_context('fork')
+        results = context.Queue()
+        clients = [
+            context.Process(target=run_client, args=(port, token, courses, options['seconds'], seed, results))
+            for seed in range(options['clients'])
+        ]
+        for client in clients:
+            client.start()
+        timings, errors = collections.defaultdict(list), collections.Counter()
+        for _ in clients:
+            client_timings, client_errors = results.get()
+            for endpoint, values in client_timings.items():
+                timings[endpoint] += values
+            errors.update(client_errors)
+        for client in clients:
+            client.join()
+
+        total = sum(len(values) for values in timings.values())
+        self.stdout.write(f'  all            {total / options["seconds"]:8.1f}/s')
+        for endpoint in ENDPOINTS:
+            values = timings[endpoint]
+            self.stdout.write(
+                f'  {endpoint:13}  {len(values) / options["seconds"]:8.1f}/s  p50 {percentile(values, 0.5):7.1f} ms  '
+                f'p99 {percentile(values, 0.99):7.1f} ms  max {percentile(values, 1):7.1f} ms'
+            )
+        failed = sum(errors.values())
+        self.stdout.write(f'  errors {failed}' if failed else self.style.SUCCESS('  errors 0'))
+        for message, count in errors.most_common():
+            self.stdout.write(f'    {count:6}  {message}')
@@ -0,0 +1,151 @@
+# core, management/commands/benchmark_concurrency.py:
+import collections
+import multiprocessing
+import os
+import random
+import tempfile
+import time
+from io import StringIO
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, close_old_connections, connection, connections, transaction
+
+from core.models import Course, Enrollment, Lesson, QuestionAnswer
+from users.models import User
+
+"""
+python manage.py benchmark_concurrency                          # stock SQLite settings vs DATABASES['default']
+python manage.py benchmark_concurrency --processes 16 --seconds 20 --writes 0.3
+python manage.py benchmark_concurrency --profile all            # + configured with CONN_MAX_AGE=0, as it runs under ASGI
+forked processes (like gunicorn workers) run a mixed load of "requests": catalog and lesson Q&A
+pages, enrollments (get_or_create in a transaction: a read, then a write) and question posts
+(insert, counter update, search index triggers); prints throughput, latency and every database
+error per profile. Each profile gets a fresh database in a temporary directory, migrated and
+seeded small: the configured database is never touched.
+"""
+
+STOCK = {'OPTIONS': {}, 'CONN_MAX_AGE': 0, 'CONN_HEALTH_CHECKS': False}  # a new project's sqlite3 settings
+SEED = {
+    'categories': 10, 'teachers': 50, 'students': 2000, 'courses': 500, 'lessons_per_course': 5,
+    'materials_per_course': 1, 'enrollments': 20000, 'questions': 50000, 'batch_size': 5000,
+}
+
+
+def read_catalog(rng, ids):
+    list(Course.objects.select_related('category').order_by('category__title', 'title', 'id')[:20])
+
+
+def read_questions(rng, ids):
+    list(QuestionAnswer.objects.select_related('user_id').filter(lesson_id=rng.choice(ids['lessons'])).order_by('-id')[:50])
+
+
+def enroll(rng, ids):
+    with transaction.atomic():
+        Enrollment.objects.get_or_create(
+            student_id_id=rng.choice(ids['students']), course_id_id=rng.choice(ids['courses']), defaults={'price': 0},
+        )
+
+
+def post_question(rng, ids):
+    with transaction.atomic():
+        QuestionAnswer.objects.create(
+            user_id_id=rng.choice(ids['students']), lesson_id_id=rng.choice(ids['lessons']), description='benchmark question',
+        )
+
+
+READS = (read_catalog, read_questions)
+WRITES = (enroll, post_question)
+
+
+def run_load(seconds, writes, seed, results):
+    rng = random.Random(seed)
+    ids = {
+        'students': list(User.objects.filter(role='student').values_list('pk', flat=True)),
+        'courses': list(Course.objects.values_list('pk', flat=True)),
+        'lessons': list(Lesson.objects.values_list('pk', flat=True)),
+    }
+    timings, errors = {'read': [], 'write': []}, collections.Counter()
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        kind = 'write' if rng.random() < writes else 'read'
+        operation = rng.choice(WRITES if kind == 'write' else READS)
+        close_old_connections()  # request_started / request_finished: CONN_MAX_AGE decides if it is reused
+        started = time.perf_counter()
+        try:
+            operation(rng, ids)
+        except OperationalError as exc:
+            errors[f'{kind}: {exc}'] += 1
+        else:
+            timings[kind].append(time.perf_counter() - started)
+        close_old_connections()
+    results.put((timings, errors))
+
+
+def percentile(values, fraction):
+    return sorted(values)[min(len(values) - 1, int(len(values) * fraction))] * 1000 if values else 0
+
+
+class Command(BaseCommand):
+    help = 'Mixed read/write load from several processes on scratch SQLite databases: stock settings vs the configured ones.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=8)
+        parser.add_argument('--seconds', type=float, default=10)
+        parser.add_argument('--writes', type=float, default=0.2, help='fraction of requests that write')
+        parser.add_argument('--profile', choices=('stock', 'configured', 'asgi', 'both', 'all'), default='both',
+                            help='asgi: configured without persistent connections; both: stock and configured')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError('This benchmark compares SQLite settings, the default database is not SQLite.')
+        configured = {key: connection.settings_dict[key] for key in STOCK}
+        # under ASGI every request's sync code runs on a new thread: no connection is reused (CONN_MAX_AGE in lms_backend/settings.py)
+        profiles = {'stock': STOCK, 'configured': configured, 'asgi': {**configured, 'CONN_MAX_AGE': 0}}
+        if options['profile'] == 'both':
+            profiles = {name: profiles[name] for name in ('stock', 'configured')}
+        elif options['profile'] != 'all':
+            profiles = {options['profile']: profiles[options['profile']]}
+        original = dict(connection.settings_dict)
+        with tempfile.TemporaryDirectory() as directory:
+            try:
+                for name, profile in profiles.items():
+                    self.run_profile(name, profile, os.path.join(directory, f'{name}.sqlite3'), options)
+            finally:
+                connections.close_all()
+                connection.settings_dict.update(original)
+
+    def run_profile(self, name, profile, path, options):
+        connections.close_all()
+        connection.settings_dict.update(NAME=path, **profile)
+        self.stdout.write(f'{name}: {profile["OPTIONS"] or "no OPTIONS"}, CONN_MAX_AGE={profile["CONN_MAX_AGE"]}')
+        call_command('migrate', verbosity=0)
+        call_command('seed_lms', stdout=StringIO(), **SEED)
+        connections.close_all()  # a forked child must not share the parent's database connection
+
+        context = multiprocessing.get_context('fork')
+        results = context.Queue()
+        workers = [
+            context.Process(target=run_load, args=(options['seconds'], options['writes'], seed, results))
+            for seed in range(options['processes'])
+        ]
+        for worker in workers:
+            worker.start()
+        timings, errors = {'read': [], 'write': []}, collections.Counter()
+        for _ in workers:
+            worker_timings, worker_errors = results.get()
+            for kind, values in worker_timings.items():
+                timings[kind] += values
+            errors.update(worker_errors)
+        for worker in workers:
+            worker.join()
+
+        for kind, values in timings.items():
+            self.stdout.write(
+                f'  {kind:5}  {len(values) / options["seconds"]:8.1f}/s  p50 {percentile(values, 0.5):7.1f} ms  '
+                f'p99 {percentile(values, 0.99):7.1f} ms  max {percentile(values, 1):7.1f} ms'
+            )
+        failed = sum(errors.values())
+        self.stdout.write(f'  errors {failed}' if failed else self.style.SUCCESS('  errors 0'))
+        for message, count in errors.most_common():
+            self.stdout.write(f'    {count:6}  {message}')
@@ -0,0 +1,66 @@
+# core, management/commands/benchmark_queries.py:
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from core.models import Course, Enrollment, QuestionAnswer, Lesson
+from users.models import User
+
+"""
+python manage.py seed_lms
+python manage.py benchmark_queries               # median ms per hot query + the database's query plan
+python manage.py benchmark_queries --no-plan --repeat 50
+run it before and after a migration to compare
+"""
+
+
+class Command(BaseCommand):
+    help = 'Time the hot lookup queries of the API against the current database (use after seed_lms).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=20)
+        parser.add_argument('--no-plan', action='store_true', help="don't print the query plans")
+
+    def handle(self, *args, **options):
+        course = Course.objects.order_by('id').only('id', 'category_id', 'title').first()
+        enrollment = Enrollment.objects.order_by('id').only('student_id', 'course_id').first()
+        lesson = Lesson.objects.order_by('id').only('id').first()
+        if not (course and enrollment and lesson):
+            self.stderr.write('Database is empty, run: python manage.py seed_lms')
+            return
+
+        middle = Course.objects.select_related('category').order_by('category__title', 'title', 'id')[5000:5001].first() or course
+        queries = {
+            'course catalog, first page': lambda: Course.objects.select_related('category')
+                .order_by('category__title', 'title', 'id')[:20],
+            'course catalog, keyset page': lambda: Course.objects.select_related('category')
+                .filter(category__title=middle.category.title, title__gt=middle.title)
+                .order_by('category__title', 'title', 'id')[:20],
+            'courses of a category by title': lambda: Course.objects.filter(category_id=course.category_id)
+                .order_by('title')[:20],
+            'active courses of a category': lambda: Course.objects.filter(category_id=course.category_id, is_active=True)
+                .order_by('title')[:20],
+            'enrollment exists (student, course)': lambda: Enrollment.objects.filter(
+                student_id=enrollment.student_id_id, course_id=enrollment.course_id_id).values('id')[:1],
+            'active enrollments of a course': lambda: Enrollment.objects.filter(
+                course_id=enrollment.course_id_id, is_active=True).values('id'),
+            'enrollment list, newest page': lambda: Enrollment.objects.order_by('-created_at', '-id')[:20],
+            'questions of a lesson by date': lambda: QuestionAnswer.objects.filter(lesson_id=lesson.pk)
+                .order_by('created_at')[:50],
+            'question list, newest page': lambda: QuestionAnswer.objects.order_by('-created_at', '-id')[:20],
+            'instructors (role=teacher)': lambda: User.objects.filter(role='teacher').values('id'),
+        }
+
+        self.stdout.write(f'{connection.vendor} database, {options["repeat"]} runs per query, median ms')
+        for name, build in queries.items():
+            timings = []
+            for _ in range(options['repeat']):
+                started = time.perf_counter()
+                list(build())
+                timings.append((time.perf_counter() - started) * 1000)
+            self.stdout.write(f'{statistics.median(timings):9.3f} ms  {name}')
+            if not options['no_plan']:
+                for line in build().explain().splitlines():
+                    self.stdout.write(f'              {line}')
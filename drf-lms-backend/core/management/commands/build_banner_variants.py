@@ -0,0 +1,37 @@
+# core, management/commands/build_banner_variants.py:
+import time
+
+from django.core.management.base import BaseCommand
+
+from core.images import build_banner_variants, needs_variants
+from core.models import Course
+
+"""
+python manage.py build_banner_variants            # courses whose banner has no variants yet
+python manage.py build_banner_variants --course 7
+safe to rerun: finished banners are skipped, identical pictures are resized once
+"""
+
+
+class Command(BaseCommand):
+    help = 'Build the thumbnail/WebP variants of course banners that were saved without them.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--course', type=int, action='append', help='only this course id (repeatable)')
+
+    def handle(self, *args, **options):
+        courses = Course.objects.exclude(banner='').exclude(banner__isnull=True).only('id', 'banner', 'banner_variants')
+        if options['course']:
+            courses = courses.filter(pk__in=options['course'])
+        pending = [course.pk for course in courses.iterator() if needs_variants(course)]
+        started = time.perf_counter()
+        failed = 0
+        for course_id in pending:
+            try:
+                build_banner_variants(course_id)
+            except (OSError, ValueError) as exc:  # missing file, not an image
+                failed += 1
+                self.stderr.write(f'course {course_id}: {exc}')
+        self.stdout.write(self.style.SUCCESS(
+            f'Built variants for {len(pending) - failed} banners in {time.perf_counter() - started:.2f}s ({failed} failed)'
+        ))
@@ -0,0 +1,51 @@
+# core, management/commands/dedupe_enrollments.py:
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.db.models import Count
+
+from core.models import Enrollment
+
+"""
+python manage.py dedupe_enrollments              # list the (student, course) pairs enrolled more than once
+python manage.py dedupe_enrollments --delete     # keep one row per pair, delete the others
+migration 0004 adds a unique (student, course) constraint and stops on a table with duplicates: run
+this before it. The row kept got furthest (active, completed, certificate, progress, marks), the
+oldest on a tie; export the table first (export_data enrollments) if the others matter. Deleted
+with plain SQL, the tables that point at enrollments don't exist before 0004's successors.
+"""
+
+KEEP_ORDER = ('-is_active', '-is_completed', '-is_certificate_ready', '-progress', '-total_mark', 'id')
+COLUMNS = ('id', 'student_id', 'course_id')  # only columns of the first migrations, this runs before the rest
+
+
+class Command(BaseCommand):
+    help = 'List, or delete, duplicate enrollments of the same student in the same course.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--delete', action='store_true', help='delete all but the kept row of each pair')
+
+    def handle(self, *args, **options):
+        enrollments = Enrollment.objects.only(*COLUMNS)
+        pairs = list(
+            enrollments.values_list('student_id', 'course_id').annotate(rows=Count('id'))
+            .filter(rows__gt=1).order_by('student_id', 'course_id')
+        )
+        if not pairs:
+            self.stdout.write('No duplicate enrollments')
+            return
+        drop = []
+        for student, course, _ in pairs:
+            keep, *others = enrollments.filter(student_id=student, course_id=course).order_by(*KEEP_ORDER).values_list('id', flat=True)
+            self.stdout.write(f'student {student}, course {course}: keep {keep}, {"delete" if options["delete"] else "extra"} {others}')
+            drop += others
+        if not options['delete']:
+            self.stdout.write(f'{len(pairs)} pairs, {len(drop)} extra rows; --delete removes them')
+            return
+        with transaction.atomic(), connection.cursor() as cursor:
+            for start in range(0, len(drop), 500):
+                chunk = drop[start:start + 500]
+                cursor.execute(
+                    f'DELETE FROM {connection.ops.quote_name(Enrollment._meta.db_table)} WHERE id IN ({", ".join(["%s"] * len(chunk))})',
+                    chunk,
+                )
+        self.stdout.write(self.style.SUCCESS(f'Deleted {len(drop)} duplicate enrollments of {len(pairs)} pairs'))
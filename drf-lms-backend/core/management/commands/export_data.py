@@ -0,0 +1,44 @@
+# core, management/commands/export_data.py:
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.exceptions import ValidationError
+
+from core.export import EXPORTS, OUTPUTS, stream_export
+
+"""
+python manage.py export_data enrollments --output csv --file enrollments.csv
+python manage.py export_data questions --filter course=3 --filter created_after=2025-01-01 > questions.ndjson
+python manage.py export_data users --filter is_active=true
+"""
+
+
+class Command(BaseCommand):
+    help = 'Stream a table (enrollments, questions, users) to NDJSON or CSV with flat memory use.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('name', choices=sorted(EXPORTS))
+        parser.add_argument('--output', choices=sorted(OUTPUTS), default='ndjson')
+        parser.add_argument('--filter', action='append', default=[], metavar='KEY=VALUE',
+                            help='same filters as the API: course, lesson, student, user, created_after, created_before, is_active')
+        parser.add_argument('--file', help='write here instead of stdout')
+
+    def handle(self, *args, **options):
+        params = {}
+        for item in options['filter']:
+            key, sep, value = item.partition('=')
+            if not sep:
+                raise CommandError(f'--filter expects KEY=VALUE, got {item!r}')
+            params[key] = value
+
+        export = EXPORTS[options['name']]
+        try:
+            queryset = export.get_queryset(params)
+        except ValidationError as exc:
+            raise CommandError(exc.detail)
+
+        out = open(options['file'], 'w', newline='', encoding='utf-8') if options['file'] else self.stdout
+        try:
+            for chunk in stream_export(export, queryset, options['output']):
+                out.write(chunk)
+        finally:
+            if options['file']:
+                out.close()
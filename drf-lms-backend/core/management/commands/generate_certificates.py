@@ -0,0 +1,45 @@
+# core, management/commands/generate_certificates.py:
+from django.core.management.base import BaseCommand
+
+from core.certificates import enqueue_certificates, generate_certificates
+
+"""
+python manage.py generate_certificates                       # every eligible enrollment
+python manage.py generate_certificates --course 7 --course 9 --processes 8 --chunk-size 1000
+python manage.py generate_certificates --enqueue             # one job per course, run by manage.py run_workers
+reruns skip enrollments whose certificate is ready
+"""
+
+
+class Command(BaseCommand):
+    help = 'Render certificate PDFs for completed enrollments and mark them is_certificate_ready.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--course', type=int, action='append', help='only this course id (repeatable)')
+        parser.add_argument('--chunk-size', type=int, default=None, help='enrollments per chunk (one UPDATE each)')
+        parser.add_argument('--processes', type=int, default=None, help='render processes (default: CPU count)')
+        parser.add_argument('--enqueue', action='store_true', help='queue one background job per course instead')
+
+    def handle(self, *args, **options):
+        if options['enqueue']:
+            jobs = enqueue_certificates(options['course'])
+            self.stdout.write(self.style.SUCCESS(f'Queued {len(jobs)} certificate jobs') if jobs else 'Nothing to queue')
+            return
+
+        def progress(done, seconds):
+            self.stdout.write(f'{done} certificates, {done / seconds if seconds else 0:.1f}/s')
+
+        report = generate_certificates(
+            options['course'], chunk_size=options['chunk_size'], processes=options['processes'], progress=progress,
+        )
+        if not report['certificates']:
+            self.stdout.write('Nothing to do, every eligible certificate is ready')
+            return
+        self.stdout.write(self.style.SUCCESS(
+            f'Generated {report["certificates"]} certificates in {report["seconds"]:.2f}s '
+            f'({report["per_second"]}/s with {report["processes"]} processes)'
+        ))
+        self.stdout.write(
+            f'latency per certificate: avg {report["latency_avg"] * 1000:.1f} ms, p50 {report["latency_p50"] * 1000:.1f} ms, '
+            f'p95 {report["latency_p95"] * 1000:.1f} ms, max {report["latency_max"] * 1000:.1f} ms'
+        )
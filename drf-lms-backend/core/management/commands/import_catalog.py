@@ -0,0 +1,54 @@
+# core, management/commands/import_catalog.py:
+import time
+
+from django.core.files import File
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.exceptions import ValidationError
+
+from core.imports import IMPORT_CHUNK_SIZE, INPUTS, import_catalog
+
+"""
+python manage.py import_catalog catalog.csv
+python manage.py import_catalog catalog.ndjson --chunk-size 5000
+run the same command again after a failure, it continues after the last committed chunk
+"""
+
+
+class Command(BaseCommand):
+    help = 'Import courses and lessons from a CSV/NDJSON manifest in chunked bulk inserts (resumable).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--input', choices=INPUTS, help='manifest format, default: from the file extension')
+        parser.add_argument('--chunk-size', type=int, default=IMPORT_CHUNK_SIZE, help='manifest rows per transaction')
+
+    def handle(self, *args, **options):
+        if options['chunk_size'] < 1:
+            raise CommandError('--chunk-size must be positive.')
+        started = time.perf_counter()
+
+        def progress(job):
+            self.stdout.write(f'{job.rows_done} rows, {job.courses_created} courses, {job.lessons_created} lessons, '
+                              f'{job.error_count} errors, {time.perf_counter() - started:.1f}s')
+
+        try:
+            with open(options['path'], 'rb') as handle:
+                job, resumed_from, errors = import_catalog(
+                    File(handle, name=options['path']), options['input'], options['chunk_size'], progress,
+                )
+        except OSError as exc:
+            raise CommandError(exc)
+        except ValidationError as exc:
+            raise CommandError(exc.detail)
+
+        if resumed_from and job.rows_done == resumed_from:
+            self.stdout.write(f'Already imported as #{job.pk}, nothing to do.')
+            return
+        if resumed_from:
+            self.stdout.write(f'Resumed import #{job.pk} after row {resumed_from}.')
+        for error in errors:
+            self.stderr.write(f'row {error["row"]}: {error["errors"]}')
+        self.stdout.write(self.style.SUCCESS(
+            f'Import #{job.pk} done: {job.courses_created} courses, {job.lessons_created} lessons, '
+            f'{job.error_count} rows skipped in {time.perf_counter() - started:.1f}s'
+        ))
@@ -0,0 +1,12 @@
+# core, management/commands/prune_uploads.py:
+from django.core.management.base import BaseCommand
+
+from core.uploads import prune_uploads
+
+
+class Command(BaseCommand):
+    help = 'Delete uploads untouched for LMS_UPLOADS["EXPIRE_SECONDS"] and their part files (safe to run from cron).'
+
+    def handle(self, *args, **options):
+        deleted = prune_uploads()
+        self.stdout.write(self.style.SUCCESS(f'Pruned {deleted} stale uploads'))
@@ -0,0 +1,23 @@
+# core, management/commands/rebuild_search_index.py:
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.search import is_available, rebuild_search_index
+
+"""
+python manage.py rebuild_search_index
+not needed in normal operation (triggers keep the index in sync), after restoring a dump or
+writing the tables with triggers disabled; also merges the index into one segment
+"""
+
+
+class Command(BaseCommand):
+    help = 'Repopulate the full-text search index from courses, lessons, materials and questions.'
+
+    def handle(self, *args, **options):
+        if not is_available():
+            raise CommandError('The search index is an SQLite FTS5 table, this database has none.')
+        started = time.perf_counter()
+        entries = rebuild_search_index()
+        self.stdout.write(self.style.SUCCESS(f'Indexed {entries} entries in {time.perf_counter() - started:.2f}s'))
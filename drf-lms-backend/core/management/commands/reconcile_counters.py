@@ -0,0 +1,33 @@
+# core, management/commands/reconcile_counters.py:
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from core.counters import COUNTERS
+
+"""
+python manage.py reconcile_counters             # repair drifted counter columns
+python manage.py reconcile_counters --dry-run   # only report how many rows drifted
+one set-based UPDATE per counter, safe to run while the API is serving (e.g. nightly from cron)
+"""
+
+
+class Command(BaseCommand):
+    help = 'Repair Category.courses_count, Course.enrollment_count/lesson_count and Lesson.question_count.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help="count drifted rows, don't write")
+
+    def handle(self, *args, **options):
+        for name, counter in COUNTERS.items():
+            started = time.perf_counter()
+            if options['dry_run']:
+                rows = counter.drifted().count()
+                verb = 'drifted'
+            else:
+                with transaction.atomic():
+                    rows = counter.reconcile()
+                verb = 'repaired'
+            label = f'{counter.parent._meta.object_name}.{name}'
+            self.stdout.write(f'{label:26} {rows:8} {verb}  {time.perf_counter() - started:.2f}s')
@@ -0,0 +1,92 @@
+# core, management/commands/run_workers.py:
+import multiprocessing
+import signal
+import threading
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from core.cache import check_shared
+from core.jobs import get_setting, job_stats, prune_jobs, run_threads
+from users.revocation import revocations
+
+"""
+python manage.py run_workers                           # LMS_JOBS PROCESSES x THREADS workers, until SIGTERM/Ctrl-C
+python manage.py run_workers --processes 4 --threads 2
+python manage.py run_workers --once                    # run the due jobs in this process, then exit
+python manage.py run_workers --stats                   # per task: jobs, average/max run time, average wait
+a running job is finished before a worker stops; one killed mid-job is retried after its lease
+"""
+
+PRUNE_SECONDS = 60 * 60
+
+
+def run_process(threads, stop, log):
+    # the parent decides when to stop (Ctrl-C reaches the whole process group)
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.SIG_IGN)
+    run_threads(threads, stop, False, log)
+
+
+class Command(BaseCommand):
+    help = 'Run background jobs from the database queue (core/jobs.py).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=None, help='worker processes (default LMS_JOBS PROCESSES)')
+        parser.add_argument('--threads', type=int, default=None, help='threads per process (default LMS_JOBS THREADS)')
+        parser.add_argument('--once', action='store_true', help='exit when no job is due')
+        parser.add_argument('--stats', action='store_true', help='print job timing metrics and exit')
+
+    def handle(self, *args, **options):
+        if options['stats']:
+            return self.print_stats()
+        processes = options['processes'] or get_setting('PROCESSES')
+        threads = options['threads'] or get_setting('THREADS')
+        if processes < 1 or threads < 1:
+            raise CommandError('--processes and --threads must be at least 1.')
+        # the jobs bump cache versions (banner variants, imports): a separate process from the web workers
+        check_shared(2, 'run_workers')
+        if options['once']:
+            return run_threads(threads, threading.Event(), once=True, log=self.log)
+
+        # the handler only sets a threading.Event: setting a multiprocessing.Event from a handler
+        # that interrupted that same event's wait() deadlocks
+        stopping = threading.Event()
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            signal.signal(signum, lambda *_: stopping.set())
+        self.stdout.write(f'Running {processes} processes x {threads} worker threads')
+        connections.close_all()  # a forked child must not share the parent's database socket
+        if processes == 1:
+            stop = stopping
+            workers = [threading.Thread(target=run_threads, args=(threads, stop, False, self.log))]
+        else:
+            context = multiprocessing.get_context('fork')
+            stop = context.Event()
+            workers = [context.Process(target=run_process, args=(threads, stop, self.log)) for _ in range(processes)]
+        for worker in workers:
+            worker.start()
+        # the supervisor only prunes finished jobs and expired revoked tokens, off the request path
+        while not stopping.wait(PRUNE_SECONDS):
+            pruned, expired = prune_jobs(), revocations.prune()
+            connections.close_all()
+            if pruned or expired:
+                self.stdout.write(f'Pruned {pruned} finished jobs, {expired} expired revoked tokens')
+        self.stdout.write('Stopping: waiting for running jobs to finish')
+        stop.set()
+        for worker in workers:
+            worker.join()
+
+    def log(self, job):
+        self.stdout.write(
+            f'{job.name} #{job.pk} {job.status} in {job.run_seconds:.3f}s '
+            f'(waited {job.wait_seconds:.3f}s, attempt {job.attempts}/{job.max_attempts})'
+        )
+        self.stdout.flush()  # a forked worker exits without flushing its buffers
+
+    def print_stats(self):
+        self.stdout.write(f'{"task":24} {"status":8} {"jobs":>8} {"avg run":>9} {"max run":>9} {"avg wait":>9}')
+        for row in job_stats():
+            self.stdout.write(
+                f'{row["name"]:24} {row["status"]:8} {row["count"]:8} {row["avg_run"] or 0:8.3f}s '
+                f'{row["max_run"] or 0:8.3f}s {row["avg_wait"] or 0:8.3f}s'
+            )
@@ -0,0 +1,141 @@
+# core, management/commands/seed_lms.py:
+import random
+import time
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from core.cache import bump_version
+from core.counters import COUNTERS
+from core.models import Category, Course, Lesson, Material, Enrollment, QuestionAnswer
+from users.models import User
+
+"""
+python manage.py seed_lms                      # 50 categories, 10k courses, 500k enrollments, 1M questions
+python manage.py seed_lms --courses 500 --enrollments 20000 --questions 50000   # smaller dataset
+all seeded users have the password: password
+"""
+
+
+class Command(BaseCommand):
+    help = 'Generate a large, realistic LMS dataset with bulk inserts (for benchmarks and query-budget tests).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--categories', type=int, default=50)
+        parser.add_argument('--teachers', type=int, default=500)
+        parser.add_argument('--students', type=int, default=20000)
+        parser.add_argument('--courses', type=int, default=10000)
+        parser.add_argument('--instructors-per-course', type=int, default=2)
+        parser.add_argument('--lessons-per-course', type=int, default=5)
+        parser.add_argument('--materials-per-course', type=int, default=2)
+        parser.add_argument('--enrollments', type=int, default=500000)
+        parser.add_argument('--questions', type=int, default=1000000)
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--seed', type=int, default=42, help='random seed, same seed gives the same dataset')
+
+    def handle(self, *args, **options):
+        self.batch_size = options['batch_size']
+        self.random = random.Random(options['seed'])
+        if options['enrollments'] > options['students'] * options['courses']:
+            raise CommandError('Not enough students x courses for unique enrollments.')
+        if options['categories'] < 1 or options['teachers'] < 1 or options['students'] < 1:
+            raise CommandError('Need at least one category, teacher and student.')
+
+        started = time.perf_counter()
+        password = make_password('password')  # hash once, PBKDF2 per user would dominate the run
+
+        teachers = self.create_users('teacher', options['teachers'], password)
+        students = self.create_users('student', options['students'], password)
+
+        categories = self.bulk(Category, (
+            Category(title=f'Category {i:03d}', description=f'Seeded category {i}')
+            for i in range(options['categories'])
+        ))
+        courses = self.bulk(Course, (
+            Course(
+                title=f'Course {i:05d}',
+                description=f'Seeded course {i}',
+                price=self.random.choice([0, 500, 1000, 1500, 2500]),
+                duration=self.random.randint(5, 60),
+                is_active=self.random.random() > 0.1,
+                category_id=categories[i % len(categories)],
+            )
+            for i in range(options['courses'])
+        ))
+
+        per_course = min(options['instructors_per_course'], len(teachers))
+        Through = Course.instructors.through
+        self.bulk(Through, (
+            Through(course_id=course_id, user_id=teacher_id)
+            for course_id in courses
+            for teacher_id in self.random.sample(teachers, per_course)
+        ), return_ids=False)
+
+        lessons = self.bulk(Lesson, (
+            Lesson(title=f'Lesson {n + 1}', description='Seeded lesson', video='lesson_videos/seed.mp4', course_id_id=course_id)
+            for course_id in courses
+            for n in range(options['lessons_per_course'])
+        ))
+        self.bulk(Material, (
+            Material(title=f'Material {n + 1}', description='Seeded material', file_type='pdf',
+                     file='materials/seed.pdf', course_id_id=course_id)
+            for course_id in courses
+            for n in range(options['materials_per_course'])
+        ), return_ids=False)
+
+        self.bulk(Enrollment, (
+            Enrollment(student_id_id=student_id, course_id_id=course_id, price=0,
+                       progress=self.random.randint(0, 100))
+            for student_id, course_id in self.enrollment_pairs(students, courses, options['enrollments'])
+        ), return_ids=False)
+
+        askers = students + teachers
+        if lessons:
+            self.bulk(QuestionAnswer, (
+                QuestionAnswer(user_id_id=self.random.choice(askers), lesson_id_id=self.random.choice(lessons),
+                               description=f'Seeded question {i}')
+                for i in range(options['questions'])
+            ), return_ids=False)
+
+        for counter in COUNTERS.values():
+            counter.reconcile()  # bulk_create skips save(), fill the counter columns in one pass each
+        bump_version('categories', 'courses')  # bulk_create sends no signals
+        self.stdout.write(self.style.SUCCESS(f'Seeded LMS dataset in {time.perf_counter() - started:.1f}s'))
+
+    def create_users(self, role, count, password):
+        existing = User.objects.filter(role=role).count()  # reruns append new users instead of clashing
+        return self.bulk(User, (
+            User(username=f'{role}{existing + i:06d}', email=f'{role}{existing + i}@example.com',
+                 role=role, password=password)
+            for i in range(count)
+        ))
+
+    def enrollment_pairs(self, students, courses, count):
+        # student k % S gets courses (k // S + offset) % C: unique pairs without keeping a set of 500k tuples
+        offsets = [self.random.randrange(len(courses)) for _ in students]
+        for k in range(count):
+            s = k % len(students)
+            yield students[s], courses[(k // len(students) + offsets[s]) % len(courses)]
+
+    def bulk(self, model, objects, return_ids=True):
+        """bulk_create in batches, one transaction per batch, returns the new ids (or [])."""
+        ids = []
+        total = 0
+        batch = []
+        for obj in objects:
+            batch.append(obj)
+            if len(batch) >= self.batch_size:
+                total += self.flush(model, batch, ids, return_ids)
+                batch = []
+        if batch:
+            total += self.flush(model, batch, ids, return_ids)
+        self.stdout.write(f'  {model._meta.label}: {total} rows')
+        return ids
+
+    def flush(self, model, batch, ids, return_ids):
+        with transaction.atomic():
+            created = model.objects.bulk_create(batch, batch_size=self.batch_size)
+        if return_ids:
+            ids.extend(obj.pk for obj in created)
+        return len(created)
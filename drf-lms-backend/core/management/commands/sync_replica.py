@@ -0,0 +1,36 @@
+# core, management/commands/sync_replica.py:
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.replicas import get_setting, sync_replica
+
+"""
+python manage.py sync_replica                        # copy default into every LMS_REPLICAS ALIASES database
+python manage.py sync_replica --database replica --every 5   # again every 5 seconds: replication lag, locally
+SQLite only: a local stand-in for a replica (core/replicas.py), production replicas replicate themselves
+"""
+
+
+class Command(BaseCommand):
+    help = 'Copy the default SQLite database into the replica databases (online backup).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', action='append', help='replica alias (default: LMS_REPLICAS ALIASES)')
+        parser.add_argument('--every', type=float, default=None, help='keep copying every N seconds')
+
+    def handle(self, *args, **options):
+        aliases = options['database'] or get_setting('ALIASES')
+        if not aliases:
+            raise CommandError('No replica: list aliases in LMS_REPLICAS["ALIASES"] or pass --database.')
+        while True:
+            for alias in aliases:
+                started = time.perf_counter()
+                try:
+                    sync_replica(alias)
+                except ValueError as exc:
+                    raise CommandError(str(exc))
+                self.stdout.write(f'{alias}: copied in {time.perf_counter() - started:.2f}s')
+            if options['every'] is None:
+                return
+            time.sleep(options['every'])
@@ -0,0 +1,170 @@
+# core, media.py:
+import mimetypes
+import os
+import posixpath
+import re
+from datetime import timedelta
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core import signing
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.files.storage import default_storage
+from django.http import FileResponse, Http404, HttpResponse
+from django.utils import timezone
+from django.utils.http import http_date
+from django.views.static import serve
+
+"""
+Protected lesson videos, served with HTTP Range support (206 Partial Content) so seeking
+doesn't restart the download.
+
+GET /api/lessons/<pk>/video/url/         JWT, checks enrollment -> {"url": ".../video/?token=...", "expires_at": ...}
+GET /api/lessons/<pk>/video/?token=...   no JWT and no query: the token is signed and carries the file name
+GET /api/lessons/<pk>/video/             JWT, checks enrollment on every request
+
+LMS_MEDIA['OFFLOAD'] hands the transfer to the front proxy once access is decided:
+    'nginx':  X-Accel-Redirect: /protected-media/lesson_videos/a.mp4
+              location /protected-media/ { internal; alias /path/to/media/; }
+    'apache': X-Sendfile: /path/to/media/lesson_videos/a.mp4   (mod_xsendfile)
+otherwise Django streams the range itself; under gunicorn the file goes through wsgi.file_wrapper,
+which uses os.sendfile for the requested bytes.
+"""
+
+DEFAULTS = {
+    'VIDEO_URL_TTL': 4 * 60 * 60,  # seconds a signed URL stays valid, long enough to watch a lesson
+    'OFFLOAD': '',                 # '', 'nginx' or 'apache'
+    'ACCEL_REDIRECT_PREFIX': '/protected-media/',
+    'PROTECTED_PREFIXES': ('lesson_videos/', 'uploads/', 'certificates/', 'catalog_imports/'),  # MEDIA_ROOT subfolders never served by the public media view
+    'BANNER_WIDTHS': (320, 640, 1280),  # course banner variants, see core/images.py
+    'BANNER_ASPECT': (16, 9),
+}
+TOKEN_SALT = 'core.media.video'
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+STREAM_BLOCK_SIZE = 512 * 1024
+
+
+def get_setting(name):
+    return getattr(settings, 'LMS_MEDIA', {}).get(name, DEFAULTS[name])
+
+
+def sign_video(lesson, user_id):
+    """Returns (token, expires_at) for lesson.video, valid for VIDEO_URL_TTL seconds."""
+    token = signing.dumps({'lesson': lesson.pk, 'user': user_id, 'name': lesson.video.name}, salt=TOKEN_SALT)
+    return token, timezone.now() + timedelta(seconds=get_setting('VIDEO_URL_TTL'))
+
+
+def read_video_token(token, lesson_id):
+    """The signed file name, or None if the token is forged, expired or for another lesson."""
+    try:
+        data = signing.loads(token, salt=TOKEN_SALT, max_age=get_setting('VIDEO_URL_TTL'))
+    except signing.BadSignature:  # SignatureExpired is a subclass
+        return None
+    if data.get('lesson') != lesson_id:
+        return None
+    return data.get('name')
+
+
+def parse_range(header, size):
+    """(start, end) inclusive for a single 'bytes=' range, None to send the whole file, False if unsatisfiable."""
+    match = RANGE_RE.match(header.strip()) if header else None
+    if match is None:
+        return None  # no Range, or a multi-range / other unit: a full 200 is a valid answer
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if not first:  # suffix range: the last N bytes
+        length = int(last)
+        if length == 0:
+            return False
+        return max(size - length, 0), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or end < start:
+        return False
+    return start, end
+
+
+class RangeFile:
+    # file-like view of [start, start + length) of a file; keeps fileno() so a WSGI server's
+    # file_wrapper can still sendfile() it (the server sends Content-Length bytes from the current offset)
+    def __init__(self, file, start, length):
+        self.file = file
+        self.remaining = length
+        file.seek(start)
+
+    def read(self, size=-1):
+        if self.remaining <= 0:
+            return b''
+        if size is None or size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.file.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def fileno(self):
+        return self.file.fileno()
+
+    def close(self):
+        self.file.close()
+
+
+def video_response(request, name):
+    try:
+        path = default_storage.path(name)  # safe_join: a stored name can't reach outside MEDIA_ROOT
+        stat = os.stat(path)
+    except (SuspiciousFileOperation, OSError, ValueError):
+        raise Http404('Video not found')
+    size = stat.st_size
+    etag = f'"{size:x}-{stat.st_mtime_ns:x}"'  # strong: If-Range needs one
+    last_modified = http_date(stat.st_mtime)
+    content_type = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+
+    offload = get_setting('OFFLOAD')
+    if offload:
+        response = HttpResponse(content_type=content_type)
+        if offload == 'nginx':
+            # a URI for nginx: spaces, %, ? and # in the stored name are escaped (nginx decodes them back)
+            response['X-Accel-Redirect'] = get_setting('ACCEL_REDIRECT_PREFIX').rstrip('/') + '/' + quote(name)
+        else:
+            response['X-Sendfile'] = path
+        response['Cache-Control'] = 'private'
+        return response  # the proxy answers Range itself
+
+    byte_range = parse_range(request.headers.get('Range'), size)
+    if_range = request.headers.get('If-Range')
+    if byte_range and if_range and if_range not in (etag, last_modified):
+        byte_range = None  # the client's partial copy is stale, send the whole file
+    if byte_range is False:
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f'bytes */{size}'
+        return response
+
+    file = open(path, 'rb')
+    if byte_range:
+        start, end = byte_range
+        response = FileResponse(RangeFile(file, start, end - start + 1), status=206, content_type=content_type)
+        response['Content-Range'] = f'bytes {start}-{end}/{size}'
+        response['Content-Length'] = str(end - start + 1)
+    else:
+        response = FileResponse(file, content_type=content_type)
+    response.block_size = STREAM_BLOCK_SIZE
+    response['Accept-Ranges'] = 'bytes'
+    response['ETag'] = etag
+    response['Last-Modified'] = last_modified
+    response['Cache-Control'] = 'private, max-age=3600'
+    return response
+
+
+def is_protected(path):
+    # the name serve() will open: it normalizes //, ./ and x/../ away, so the check runs on the same name
+    # (lowercase too, for case-insensitive filesystems)
+    name = posixpath.normpath(path).lstrip('/').lower() + '/'
+    return name.startswith(tuple(prefix.lower() for prefix in get_setting('PROTECTED_PREFIXES')))
+
+
+def serve_public_media(request, path, document_root=None, show_indexes=False):
+    # DEBUG media serving (lms_backend/urls.py) without the protected folders
+    if is_protected(path):
+        raise Http404('Protected media')
+    return serve(request, path, document_root=document_root, show_indexes=show_indexes)
@@ -0,0 +1,81 @@
+# Generated by Django 5.2.1 on 2026-10-18 10:32
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def check_duplicate_enrollments(apps, schema_editor):
+    # the unique (student, course) constraint below fails on a table that already has duplicates; which
+    # row to keep is the operator's call, not a migration's: stop and say which pairs, before any change
+    Enrollment = apps.get_model('core', 'Enrollment')
+    pairs = list(
+        Enrollment.objects.using(schema_editor.connection.alias).values_list('student_id', 'course_id')
+        .annotate(rows=Count('id')).filter(rows__gt=1).order_by('student_id', 'course_id')[:21]
+    )
+    if pairs:
+        listed = ', '.join(f'(student {student}, course {course}: {rows} rows)' for student, course, rows in pairs[:20])
+        raise RuntimeError(
+            f'Duplicate enrollments block the unique (student, course) constraint: {listed}'
+            f'{" and more" if len(pairs) > 20 else ""}. Review them, then remove the extra rows, e.g. with '
+            f'python manage.py dedupe_enrollments --delete, and migrate again.'
+        )
+
+
+def analyze(apps, schema_editor):
+    # refresh the planner statistics, without them SQLite keeps sorting the catalog in a temp b-tree
+    if schema_editor.connection.vendor in ('sqlite', 'postgresql'):
+        schema_editor.execute('ANALYZE')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0003_alter_course_banner'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(check_duplicate_enrollments, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='category',
+            index=models.Index(fields=['title'], name='category_title_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='course',
+            index=models.Index(fields=['category', 'title'], name='course_category_title_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='enrollment',
+            index=models.Index(fields=['course_id', 'is_active'], name='enrollment_course_active_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='enrollment',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['student_id'], name='enrollment_student_active_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='enrollment',
+            index=models.Index(fields=['-created_at', '-id'], name='enrollment_newest_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='lesson',
+            index=models.Index(fields=['-created_at', '-id'], name='lesson_newest_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='material',
+            index=models.Index(fields=['-created_at', '-id'], name='material_newest_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='questionanswer',
+            index=models.Index(fields=['lesson_id', 'created_at'], name='question_lesson_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='questionanswer',
+            index=models.Index(fields=['-created_at', '-id'], name='question_newest_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='enrollment',
+            constraint=models.UniqueConstraint(fields=('student_id', 'course_id'), name='enrollment_student_course_uniq'),
+        ),
+        migrations.RunPython(analyze, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 5.2.1 on 2026-10-18 10:38
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0004_index_pack'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CatalogImport',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('digest', models.CharField(max_length=64, unique=True)),
+                ('name', models.CharField(blank=True, max_length=255)),
+                ('rows_done', models.PositiveIntegerField(default=0)),
+                ('courses_created', models.PositiveIntegerField(default=0)),
+                ('lessons_created', models.PositiveIntegerField(default=0)),
+                ('error_count', models.PositiveIntegerField(default=0)),
+                ('is_finished', models.BooleanField(default=False)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='CatalogImportRef',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('ref', models.CharField(max_length=255)),
+                ('catalog_import', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='refs', to='core.catalogimport')),
+                ('course', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='core.course')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('catalog_import', 'ref'), name='catalog_import_ref_uniq')],
+            },
+        ),
+    ]
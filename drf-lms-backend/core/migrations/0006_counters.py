@@ -0,0 +1,51 @@
+# Generated by Django 5.2.1 on 2026-10-18 10:46
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def fill_counters(apps, schema_editor):
+    # one set-based UPDATE per counter, same as reconcile_counters
+    for parent, child, fk, field in (
+        ('Category', 'Course', 'category_id', 'courses_count'),
+        ('Course', 'Enrollment', 'course_id_id', 'enrollment_count'),
+        ('Course', 'Lesson', 'course_id_id', 'lesson_count'),
+        ('Lesson', 'QuestionAnswer', 'lesson_id_id', 'question_count'),
+    ):
+        counts = (
+            apps.get_model('core', child).objects.filter(**{fk: OuterRef('pk')}).order_by()
+            .values(fk).annotate(n=Count('pk')).values('n')
+        )
+        apps.get_model('core', parent).objects.update(**{field: Coalesce(Subquery(counts), Value(0))})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0005_catalog_import'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='category',
+            name='courses_count',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='course',
+            name='enrollment_count',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='course',
+            name='lesson_count',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='lesson',
+            name='question_count',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,101 @@
+# Full-text search index, see core/search.py. SQLite only: on other databases this is a no-op
+# and /api/search/ answers 503.
+
+from django.db import migrations
+
+# rowid = kind number * 2^40 + object id: a trigger finds a row's entry without an index, and in
+# rowid order courses come first, then lessons, materials and questions, each newest first
+SPAN = 2 ** 40
+SOURCES = {
+    # kind: (number, table, course_id, lesson_id, title, body, when active)
+    'course': (3, 'core_course', '{row}.id', 'NULL', '{row}.title', '{row}.description', '{row}.is_active'),
+    'lesson': (2, 'core_lesson', '{row}.course_id_id', '{row}.id', '{row}.title', '{row}.description', '{row}.is_active'),
+    'material': (1, 'core_material', '{row}.course_id_id', 'NULL', '{row}.title', '{row}.description', '{row}.is_active'),
+    'question': (
+        0, 'core_questionanswer', '(SELECT course_id_id FROM core_lesson WHERE id = {row}.lesson_id_id)',
+        '{row}.lesson_id_id', "''", '{row}.description', '{row}.is_active',
+    ),
+}
+WATCHED = {
+    'course': ('title', 'description', 'is_active'),
+    'lesson': ('title', 'description', 'is_active', 'course_id_id'),
+    'material': ('title', 'description', 'is_active', 'course_id_id'),
+    'question': ('description', 'is_active', 'lesson_id_id'),
+}
+
+# course_id is indexed: a course filter is part of the MATCH expression, not a scan of the hits
+CREATE_TABLE = """
+CREATE VIRTUAL TABLE core_search USING fts5(
+    kind UNINDEXED, object_id UNINDEXED, course_id, lesson_id UNINDEXED, title, body,
+    tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3'
+)
+"""
+# ORDER BY rank: bm25 with a title match worth 4 body matches, course_id doesn't count
+SET_RANK = "INSERT INTO core_search(core_search, rank) VALUES ('rank', 'bm25(0, 0, 0, 0, 4.0, 1.0)')"
+
+
+def entry_select(kind, row):
+    number, table, course_id, lesson_id, title, body, active = SOURCES[kind]
+    columns = [f'{number * SPAN} + {row}.id', f"'{kind}'", f'{row}.id', course_id, lesson_id, title, body]
+    return 'SELECT ' + ', '.join(column.format(row=row) for column in columns), active.format(row=row)
+
+
+def trigger_sql(kind):
+    number, table = SOURCES[kind][:2]
+    insert = 'INSERT INTO core_search(rowid, kind, object_id, course_id, lesson_id, title, body)'
+    select_new, active_new = entry_select(kind, 'new')
+    changed = ' OR '.join(f'old.{column} IS NOT new.{column}' for column in WATCHED[kind])
+    statements = [
+        f'CREATE TRIGGER core_search_{kind}_insert AFTER INSERT ON {table} WHEN {active_new} BEGIN '
+        f'{insert} {select_new}; END',
+        # counter columns, banner_variants, updated_at: no reindexing
+        f'CREATE TRIGGER core_search_{kind}_update AFTER UPDATE ON {table} WHEN {changed} BEGIN '
+        f'DELETE FROM core_search WHERE rowid = {number * SPAN} + old.id; '
+        f'{insert} {select_new} WHERE {active_new}; END',
+        f'CREATE TRIGGER core_search_{kind}_delete AFTER DELETE ON {table} BEGIN '
+        f'DELETE FROM core_search WHERE rowid = {number * SPAN} + old.id; END',
+    ]
+    if kind == 'lesson':
+        # questions are indexed under their lesson's course
+        statements.append(
+            'CREATE TRIGGER core_search_lesson_move AFTER UPDATE OF course_id_id ON core_lesson '
+            'WHEN old.course_id_id IS NOT new.course_id_id BEGIN '
+            "UPDATE core_search SET course_id = new.course_id_id WHERE kind = 'question' AND lesson_id = new.id; END"
+        )
+    return statements
+
+
+def create_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute(CREATE_TABLE)
+    schema_editor.execute(SET_RANK)
+    for kind in SOURCES:
+        for statement in trigger_sql(kind):
+            schema_editor.execute(statement)
+        select, active = entry_select(kind, 'src')
+        schema_editor.execute(
+            f'INSERT INTO core_search(rowid, kind, object_id, course_id, lesson_id, title, body) '
+            f'{select} FROM {SOURCES[kind][1]} AS src WHERE {active}'
+        )
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for kind in SOURCES:
+        for suffix in ('insert', 'update', 'delete'):
+            schema_editor.execute(f'DROP TRIGGER IF EXISTS core_search_{kind}_{suffix}')
+    schema_editor.execute('DROP TRIGGER IF EXISTS core_search_lesson_move')
+    schema_editor.execute('DROP TABLE IF EXISTS core_search')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_lesson_progress'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.1 on 2026-10-18 11:45
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0011_search_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='questionanswer',
+            index=models.Index(fields=['lesson_id', 'id'], name='question_lesson_id_idx'),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.1 on 2026-10-18 12:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0012_question_lesson_id_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='catalogimport',
+            name='errors',
+            field=models.JSONField(blank=True, default=list),
+        ),
+        migrations.AddField(
+            model_name='catalogimport',
+            name='input_format',
+            field=models.CharField(blank=True, max_length=10),
+        ),
+        migrations.AddField(
+            model_name='catalogimport',
+            name='manifest',
+            field=models.FileField(blank=True, upload_to='catalog_imports/'),
+        ),
+    ]
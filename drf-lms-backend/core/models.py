@@ -1,20 +1,66 @@
 # core, moels.py:
+import uuid
+
 from django.db import models
 # from django.contrib.auth.models import User
 from users.models import User
 
 
+class CountedQuerySet(models.QuerySet):
+    # a direct queryset delete (admin bulk action, shell) keeps the parents' counters right, see core/counters.py
+    def delete(self):
+        from .counters import children_deleted, counters_for
+        parent_ids = {
+            counter.fk: set(self.order_by().values_list(counter.fk, flat=True).distinct())
+            for counter in counters_for(self.model)
+        }
+        result = super().delete()
+        children_deleted(self.model, parent_ids)
+        return result
+
+class CountedMixin:
+    # keeps the parent's counter column in step with save()/delete() of this row, see core/counters.py
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        from .counters import counters_for
+        instance = super().from_db(db, field_names, values)
+        tracked = {counter.fk for counter in counters_for(cls)}
+        instance._loaded_parents = {name: value for name, value in zip(field_names, values) if name in tracked}
+        return instance
+
+    def save(self, *args, **kwargs):
+        from .counters import child_created, child_moved
+        adding = self._state.adding
+        super().save(*args, **kwargs)
+        if adding:
+            child_created(self)
+        else:
+            child_moved(self)
+
+    def delete(self, *args, **kwargs):
+        from .counters import child_deleted
+        result = super().delete(*args, **kwargs)
+        child_deleted(self)
+        return result
+
+
 class Category(models.Model):
     title = models.CharField(max_length=255)
     description = models.TextField(blank=True)  # Added description field
     is_active = models.BooleanField(default=True)
+    courses_count = models.IntegerField(default=0, editable=False)  # maintained by core/counters.py
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['title'], name='category_title_idx'),  # course catalog is ordered by category title first
+        ]
+
     def __str__(self):
         return self.title
 
-class Course(models.Model):
+class Course(CountedMixin, models.Model):
     title = models.CharField(max_length=255)
     description = models.TextField()
     banner = models.ImageField(upload_to='course_banners/', blank=True, null=True)  # MEDIA_ROOT/course_banners/ ---- image
@@ -24,21 +70,46 @@ class Course(models.Model):
     category = models.ForeignKey(Category, on_delete=models.CASCADE)  # Changed from category_id
     #instructor_id = models.ForeignKey(User, on_delete=models.CASCADE, limit_choices_to={'role' : 'teacher'})
     instructors = models.ManyToManyField(User, limit_choices_to={'role': 'teacher'}, related_name='courses')  # made m2m field 
+    enrollment_count = models.IntegerField(default=0, editable=False)  # maintained by core/counters.py
+    lesson_count = models.IntegerField(default=0, editable=False)
+    banner_variants = models.JSONField(default=dict, blank=True, editable=False)  # thumbnails/WebP, built by core/images.py
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = CountedQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['category', 'title'], name='course_category_title_idx'),  # catalog ordering
+        ]
+
     def __str__(self):
         return self.title
 
-class Lesson(models.Model):
+    def save(self, *args, **kwargs):
+        from .images import schedule_banner_variants
+        new_banner = bool(self.banner) and not self.banner._committed  # a file uploaded with this save
+        super().save(*args, **kwargs)
+        if new_banner:  # resized by a background job, off the request
+            schedule_banner_variants(self.pk)
+
+class Lesson(CountedMixin, models.Model):
     title = models.CharField(max_length=255)
     description = models.TextField()
     video = models.FileField(upload_to='lesson_videos')
     course_id = models.ForeignKey(Course, on_delete=models.CASCADE)
     is_active = models.BooleanField(default=True)
+    question_count = models.IntegerField(default=0, editable=False)  # maintained by core/counters.py
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = CountedQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['-created_at', '-id'], name='lesson_newest_idx'),  # list pagination
+        ]
+
     def __str__(self):
         return self.title
 
@@ -52,10 +123,15 @@ class Material(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['-created_at', '-id'], name='material_newest_idx'),
+        ]
+
     def __str__(self):
         return self.title
 
-class Enrollment(models.Model):
+class Enrollment(CountedMixin, models.Model):
     student_id = models.ForeignKey(User, on_delete=models.CASCADE, limit_choices_to={'role' : 'student'})
     course_id = models.ForeignKey(Course, on_delete=models.CASCADE)
     is_active = models.BooleanField(default=True)
@@ -67,10 +143,22 @@ class Enrollment(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = CountedQuerySet.as_manager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['student_id', 'course_id'], name='enrollment_student_course_uniq'),  # also the lookup index
+        ]
+        indexes = [
+            models.Index(fields=['course_id', 'is_active'], name='enrollment_course_active_idx'),
+            models.Index(fields=['student_id'], condition=models.Q(is_active=True), name='enrollment_student_active_idx'),
+            models.Index(fields=['-created_at', '-id'], name='enrollment_newest_idx'),
+        ]
+
     def __str__(self):
         return f"{self.student_id.username} - {self.course_id.title}"
 
-class QuestionAnswer(models.Model):
+class QuestionAnswer(CountedMixin, models.Model):
     user_id = models.ForeignKey(User, on_delete=models.CASCADE)
     lesson_id = models.ForeignKey(Lesson, on_delete=models.CASCADE)
     description = models.TextField()
@@ -78,6 +166,129 @@ class QuestionAnswer(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = CountedQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['lesson_id', 'created_at'], name='question_lesson_created_idx'),
+            models.Index(fields=['-created_at', '-id'], name='question_newest_idx'),
+            models.Index(fields=['lesson_id', 'id'], name='question_lesson_id_idx'),  # live Q&A resume (core/feeds.py)
+        ]
+
     def __str__(self):
         return f"{self.user_id.username} --> {self.lesson_id.title} --> {self.description}"
-    
\ No newline at end of file
+    
+class CatalogImport(models.Model):
+    # one row per manifest, keyed by its content hash: uploading the same file again resumes it
+    digest = models.CharField(max_length=64, unique=True)
+    name = models.CharField(max_length=255, blank=True)
+    rows_done = models.PositiveIntegerField(default=0)  # manifest rows covered by committed chunks
+    courses_created = models.PositiveIntegerField(default=0)
+    lessons_created = models.PositiveIntegerField(default=0)
+    error_count = models.PositiveIntegerField(default=0)
+    errors = models.JSONField(default=list, blank=True)  # the first skipped rows and why, capped (core/imports.py)
+    manifest = models.FileField(upload_to='catalog_imports/', blank=True)  # uploaded file, until its import finished
+    input_format = models.CharField(max_length=10, blank=True)
+    is_finished = models.BooleanField(default=False)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.name or self.digest[:12]} ({self.rows_done} rows)"
+
+class CatalogImportRef(models.Model):
+    # manifest course ref -> created course, so lessons in later chunks (or a resumed run) find their course
+    catalog_import = models.ForeignKey(CatalogImport, on_delete=models.CASCADE, related_name='refs')
+    ref = models.CharField(max_length=255)
+    course = models.ForeignKey(Course, on_delete=models.CASCADE)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['catalog_import', 'ref'], name='catalog_import_ref_uniq'),
+        ]
+
+    def __str__(self):
+        return f"{self.ref} -> {self.course_id}"
+
+class Upload(models.Model):
+    # chunked, resumable upload of a lesson video or material file, see core/uploads.py
+    TARGET_CHOICES = (
+        ('lesson_video', 'Lesson video'),
+        ('material_file', 'Material file'),
+    )
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)  # not guessable, it is in the URL
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='uploads')
+    target = models.CharField(max_length=20, choices=TARGET_CHOICES)
+    object_id = models.PositiveIntegerField()  # the Lesson or Material the file is attached to on finalize
+    filename = models.CharField(max_length=255)
+    size = models.PositiveBigIntegerField()
+    sha256 = models.CharField(max_length=64, blank=True)  # of the whole file, checked on finalize when given
+    received = models.PositiveBigIntegerField(default=0)  # acknowledged offset, the client resumes from here
+    locked_until = models.DateTimeField(null=True, blank=True)  # a chunk is being written until then
+    is_complete = models.BooleanField(default=False)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.filename} ({self.received}/{self.size})"
+
+
+class Job(models.Model):
+    # background job, see core/jobs.py; the row is the queue entry, its lease and its metrics
+    QUEUED, RUNNING, DONE, FAILED = 'queued', 'running', 'done', 'failed'
+    STATUS_CHOICES = ((QUEUED, 'Queued'), (RUNNING, 'Running'), (DONE, 'Done'), (FAILED, 'Failed'))
+    name = models.CharField(max_length=100)  # registered task, core/tasks.py
+    payload = models.JSONField(default=dict, blank=True)  # task keyword arguments
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=QUEUED)
+    run_at = models.DateTimeField()  # not before; moved forward by the retry backoff
+    attempts = models.PositiveSmallIntegerField(default=0)
+    max_attempts = models.PositiveSmallIntegerField(default=5)
+    locked_by = models.CharField(max_length=100, blank=True)  # host:pid:thread of the worker running it
+    locked_until = models.DateTimeField(null=True, blank=True)  # lease: past it, the worker is presumed dead
+    last_error = models.TextField(blank=True)
+    wait_seconds = models.FloatField(null=True, blank=True)  # due -> picked up, last attempt
+    run_seconds = models.FloatField(null=True, blank=True)  # last attempt
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['run_at', 'id'], condition=models.Q(status='queued'), name='job_due_idx'),  # the claim query
+            models.Index(fields=['locked_until'], condition=models.Q(status='running'), name='job_lease_idx'),
+            models.Index(fields=['name', 'status'], name='job_name_status_idx'),  # stats, pruning
+        ]
+
+    def __str__(self):
+        return f"{self.name} #{self.pk} ({self.status})"
+
+class JobLock(models.Model):
+    # single row claimers write first on databases without SKIP LOCKED (SQLite), see core/jobs.py
+    name = models.CharField(max_length=50, primary_key=True)
+    locked_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return self.name
+
+class LessonProgress(models.Model):
+    # latest watch position per (student, lesson), written in coalesced batches by core/progress.py
+    student = models.ForeignKey(User, on_delete=models.CASCADE, related_name='lesson_progress')
+    lesson = models.ForeignKey(Lesson, on_delete=models.CASCADE)
+    course = models.ForeignKey(Course, on_delete=models.CASCADE)  # the lesson's, Enrollment.progress is counted without a join
+    position = models.FloatField(default=0)  # seconds
+    duration = models.FloatField(default=0)
+    is_completed = models.BooleanField(default=False)  # sticky: watching again doesn't undo it
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['student', 'lesson'], name='progress_student_lesson_uniq'),  # the upsert key
+        ]
+        indexes = [
+            models.Index(fields=['student', 'course'], condition=models.Q(is_completed=True), name='progress_completed_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.student_id} @ lesson {self.lesson_id}: {self.position:.0f}/{self.duration:.0f}s"
@@ -0,0 +1,141 @@
+# core, pagination.py:
+import base64
+import json
+
+from django.core.exceptions import ValidationError
+from django.db.models import F, Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param, remove_query_param
+
+
+class KeysetPagination(BasePagination):
+    """
+    Opaque-cursor (keyset) pagination keyed on (ordering fields..., id).
+
+    The cursor stores the ordering values of the last row of a page, the next page
+    is fetched with a WHERE on those values instead of OFFSET, so page N costs the same as page 1.
+    """
+    page_size = 20
+    max_page_size = 100
+    page_size_query_param = 'page_size'
+    cursor_query_param = 'cursor'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def __init__(self, ordering=('-created_at',)):
+        ordering = list(ordering)
+        if ordering[-1].lstrip('-') != 'id':
+            # id is the tie-breaker, it follows the direction of the last field
+            ordering.append('-id' if ordering[-1].startswith('-') else 'id')
+        self.ordering = ordering
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        if size <= 0:
+            return self.page_size
+        return min(size, self.max_page_size)  # client-chosen page size is capped
+
+    def encode_cursor(self, values):
+        raw = json.dumps(values, default=str, separators=(',', ':')).encode('utf-8')
+        return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+    def decode_cursor(self, request, model):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            raw = base64.urlsafe_b64decode(encoded + '=' * (-len(encoded) % 4))
+            values = json.loads(raw.decode('utf-8'))
+        except (TypeError, ValueError, UnicodeDecodeError):
+            raise NotFound(self.invalid_cursor_message)
+        if not isinstance(values, list) or len(values) != len(self.ordering):
+            raise NotFound(self.invalid_cursor_message)
+        # a hand-edited cursor must not reach filter() (a 500): each value as its ordering field reads it
+        try:
+            values = [self.get_field(model, field).to_python(value) for field, value in zip(self.ordering, values)]
+        except (ValidationError, ValueError, TypeError):
+            raise NotFound(self.invalid_cursor_message)
+        if any(value is None for value in values):
+            raise NotFound(self.invalid_cursor_message)
+        return values
+
+    def get_field(self, model, field):
+        # the model field behind an ordering path, like category__title
+        *relations, name = field.lstrip('-').split('__')
+        for relation in relations:
+            model = model._meta.get_field(relation).related_model
+        field = model._meta.get_field(name)
+        return field.target_field if field.is_relation else field
+
+    def get_keyset_filter(self, values):
+        # (a, b, id) > (x, y, z)  ==>  a > x OR (a = x AND b > y) OR (a = x AND b = y AND id > z)
+        condition = Q()
+        equal = Q()
+        for field, value in zip(self.ordering, values):
+            name = field.lstrip('-')
+            lookup = '__lt' if field.startswith('-') else '__gt'
+            condition |= equal & Q(**{name + lookup: value})
+            equal &= Q(**{name: value})
+        return condition
+
+    def get_row_values(self, obj):
+        return [getattr(obj, f'keyset_{index}') for index in range(len(self.ordering))]  # see paginate_queryset
+
+    def get_page_queryset(self, queryset, request):
+        self.request = request
+        self.page_size_value = self.get_page_size(request)
+
+        queryset = queryset.order_by(*self.ordering)
+        # the cursor values are selected explicitly, ?fields= may have deferred those columns or relations
+        queryset = queryset.annotate(**{f'keyset_{index}': F(field.lstrip('-')) for index, field in enumerate(self.ordering)})
+        values = self.decode_cursor(request, queryset.model)
+        if values is not None:
+            queryset = queryset.filter(self.get_keyset_filter(values))
+        return queryset[:self.page_size_value + 1]  # one extra row tells us if there is a next page
+
+    def set_page(self, rows):
+        self.has_next = len(rows) > self.page_size_value
+        self.page = rows[:self.page_size_value]
+        return self.page
+
+    def paginate_queryset(self, queryset, request, view=None):
+        return self.set_page(list(self.get_page_queryset(queryset, request)))
+
+    async def apaginate_queryset(self, queryset, request):
+        # async views (core/async_views.py): the page is fetched, prefetches included, off the event loop
+        return self.set_page([row async for row in self.get_page_queryset(queryset, request)])
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        url = self.request.build_absolute_uri()
+        cursor = self.encode_cursor(self.get_row_values(self.page[-1]))
+        return replace_query_param(url, self.cursor_query_param, cursor)
+
+    def get_first_link(self):
+        url = self.request.build_absolute_uri()
+        return remove_query_param(url, self.cursor_query_param)
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'first': self.get_first_link(),
+            'page_size': self.page_size_value,
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'first': {'type': 'string', 'format': 'uri'},
+                'page_size': {'type': 'integer'},
+                'results': schema,
+            },
+        }
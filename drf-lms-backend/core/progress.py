@@ -0,0 +1,235 @@
+# core, progress.py:
+import atexit
+import logging
+import os
+import threading
+import time
+
+from django.conf import settings
+from django.db import close_old_connections, connection, transaction
+from django.db.models import Case, Count, F, OuterRef, Subquery, Value, When
+from django.db.models.functions import Coalesce, Greatest, Least
+from django.db.models.lookups import GreaterThanOrEqual
+from django.utils import timezone
+
+from .models import Course, Enrollment, Lesson, LessonProgress
+
+"""
+Lesson progress heartbeats: the player reports its position every few seconds, the database
+sees one batch every FLUSH_SECONDS instead of one UPDATE per heartbeat.
+
+POST /api/progress/   {"lesson": 12, "position": 95.5, "duration": 600}     -> 202, no query
+                      [{...}, {...}]                                         several at once (offline catch-up)
+GET  /api/progress/?course=3                                                 the student's positions, to resume
+
+- heartbeats are coalesced in memory per (student, lesson), only the latest position is kept
+  (completion is sticky); a worker process buffers its own students
+- a buffer older than FLUSH_SECONDS (or bigger than MAX_BUFFERED) is flushed by the process's
+  flusher thread, started with its first heartbeat: a request that finds the buffer due only wakes
+  it, no heartbeat waits on a flush. A few queries whatever the number of heartbeats - lessons and
+  enrollments are checked in bulk (heartbeats for lessons the student isn't enrolled in are
+  dropped), LessonProgress is upserted
+- a lesson is completed at COMPLETE_RATIO of its duration; only the enrollments that got a newly
+  completed lesson are recounted, Enrollment.progress = completed lessons * 100 / Course.lesson_count,
+  and is_completed is set at 100
+- GET overlays the unflushed positions of this process only: with several worker processes a
+  reload served by another one can lag by up to FLUSH_SECONDS
+- at most FLUSH_SECONDS of positions are lost if a worker is killed, the exit handler flushes on a
+  clean shutdown (a failure there is logged with the number of positions lost)
+"""
+
+DEFAULTS = {
+    'FLUSH_SECONDS': 10,
+    'MAX_BUFFERED': 5000,     # (student, lesson) pairs per process before an early flush
+    'COMPLETE_RATIO': 0.9,    # the credits are not the lesson
+    'BATCH_SIZE': 500,
+    'FLUSH_THREAD': True,     # False: the request that finds the buffer due flushes it
+}
+logger = logging.getLogger(__name__)
+
+
+def get_setting(name):
+    return getattr(settings, 'LMS_PROGRESS', {}).get(name, DEFAULTS[name])
+
+
+class ProgressBuffer:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.entries = {}  # (student_id, lesson_id) -> (position, duration, completed)
+        self.started = None  # monotonic time of the oldest unflushed heartbeat
+
+    def add(self, student_id, lesson_id, position, duration, completed=False):
+        """Keeps the latest position; returns True when the buffer is due for a flush."""
+        key = (student_id, lesson_id)
+        completed = completed or (duration > 0 and position >= duration * get_setting('COMPLETE_RATIO'))
+        with self.lock:
+            previous = self.entries.get(key)
+            self.entries[key] = (position, duration, completed or bool(previous and previous[2]))
+            if self.started is None:
+                self.started = time.monotonic()
+            return self.is_due()
+
+    def is_due(self):
+        return self.started is not None and (
+            len(self.entries) >= get_setting('MAX_BUFFERED') or time.monotonic() - self.started >= get_setting('FLUSH_SECONDS')
+        )
+
+    def take(self):
+        with self.lock:
+            entries, self.entries, self.started = self.entries, {}, None
+        return entries
+
+    def put_back(self, entries):
+        # a failed flush: keep what it had, heartbeats that came in meanwhile are newer
+        with self.lock:
+            for key, value in entries.items():
+                self.entries.setdefault(key, value)
+            if self.entries and self.started is None:
+                self.started = time.monotonic()
+
+    def pending(self, student_id):
+        with self.lock:
+            return {lesson_id: value for (student, lesson_id), value in self.entries.items() if student == student_id}
+
+
+buffer = ProgressBuffer()
+
+
+class Flusher(threading.Thread):
+    # flushes a due buffer that no request comes to flush (the last heartbeats before a quiet spell)
+    def __init__(self):
+        super().__init__(name='progress-flusher', daemon=True)
+        self.pid = os.getpid()  # a forked worker starts its own
+        self.wake = threading.Event()  # set by a request that found the buffer due (MAX_BUFFERED)
+
+    def run(self):
+        while True:
+            self.wake.wait(get_setting('FLUSH_SECONDS') or 1)
+            self.wake.clear()
+            self.tick()
+
+    def tick(self):
+        if not buffer.is_due():
+            return
+        own_connection = not connection.in_atomic_block  # like core/jobs.py work(): a caller's transaction keeps its connection
+        if own_connection:
+            close_old_connections()
+        try:
+            flush_progress()
+        except Exception:
+            logger.exception('Progress flush failed, the positions stay buffered')
+        finally:
+            if own_connection:
+                connection.close()  # this thread's own, it sleeps until the next flush
+
+
+flusher = None
+flusher_lock = threading.Lock()
+
+
+def start_flusher():
+    """This process's flusher thread, started on first use; None when FLUSH_THREAD is off."""
+    global flusher
+    if not get_setting('FLUSH_THREAD'):
+        return None
+    with flusher_lock:
+        if flusher is None or flusher.pid != os.getpid():
+            flusher = Flusher()
+            flusher.start()
+    return flusher
+
+
+def record_heartbeats(student_id, events):
+    """Buffers validated heartbeats, a due buffer is the flusher's. Returns how many were accepted."""
+    current = start_flusher()
+    due = False
+    for event in events:
+        due = buffer.add(student_id, event['lesson'], event['position'], event['duration'], event['completed'])
+    if due:
+        if current is not None:
+            current.wake.set()
+        else:
+            flush_progress()
+    return len(events)
+
+
+def flush_progress():
+    """Writes the buffered positions, returns (rows written, enrollments recounted)."""
+    entries = buffer.take()
+    if not entries:
+        return 0, 0
+    try:
+        return write_progress(entries)
+    except Exception:
+        buffer.put_back(entries)
+        raise
+
+
+def write_progress(entries):
+    student_ids = {student for student, _ in entries}
+    courses = dict(Lesson.objects.filter(pk__in={lesson for _, lesson in entries}).values_list('pk', 'course_id'))
+    enrolled = {
+        (student, course): pk for pk, student, course in Enrollment.objects.filter(
+            student_id__in=student_ids, course_id__in=set(courses.values()), is_active=True,
+        ).values_list('pk', 'student_id', 'course_id')
+    }
+    rows = {
+        key: value for key, value in entries.items()
+        if key[1] in courses and (key[0], courses[key[1]]) in enrolled
+    }
+    if not rows:
+        return 0, 0
+
+    with transaction.atomic():
+        # student IN only: one probe of the partial index per student, a second IN list makes SQLite
+        # probe every (student, lesson) combination (seconds for a few thousand of each)
+        completed_before = set(
+            LessonProgress.objects.filter(student_id__in=student_ids, is_completed=True).values_list('student_id', 'lesson_id')
+        ) & rows.keys()
+        LessonProgress.objects.bulk_create(
+            [
+                LessonProgress(
+                    student_id=student, lesson_id=lesson, course_id=courses[lesson], position=position,
+                    duration=duration, is_completed=completed or (student, lesson) in completed_before,
+                )
+                for (student, lesson), (position, duration, completed) in rows.items()
+            ],
+            batch_size=get_setting('BATCH_SIZE'),
+            update_conflicts=True, unique_fields=['student', 'lesson'],
+            update_fields=['position', 'duration', 'is_completed', 'updated_at'],
+        )
+        # only a newly completed lesson changes Enrollment.progress
+        recount = {
+            enrolled[(student, courses[lesson])]
+            for (student, lesson), (_, _, completed) in rows.items()
+            if completed and (student, lesson) not in completed_before
+        }
+        recount_enrollments(recount)
+    return len(rows), len(recount)
+
+
+def recount_enrollments(enrollment_ids):
+    if not enrollment_ids:
+        return
+    done = (
+        LessonProgress.objects.filter(student_id=OuterRef('student_id'), course_id=OuterRef('course_id'), is_completed=True)
+        .order_by().values('student_id').annotate(n=Count('pk')).values('n')
+    )
+    lessons = Course.objects.filter(pk=OuterRef('course_id')).values('lesson_count')
+    percent = Least(Coalesce(Subquery(done), Value(0)) * 100 / Greatest(Subquery(lessons), Value(1)), Value(100))
+    Enrollment.objects.filter(pk__in=enrollment_ids).update(
+        progress=percent,
+        is_completed=Case(When(GreaterThanOrEqual(percent, 100), then=Value(True)), default=F('is_completed')),
+        updated_at=timezone.now(),
+    )
+
+
+@atexit.register
+def flush_on_exit():
+    if not buffer.entries:
+        return
+    try:
+        connection.close()  # the request's may be gone by now, the flush opens its own
+        flush_progress()
+    except Exception:
+        logger.exception('Progress flush at exit failed, %d buffered positions lost', len(buffer.entries))
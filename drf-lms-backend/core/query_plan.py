@@ -0,0 +1,120 @@
+# core, query_plan.py:
+from django.db.models import Prefetch
+from rest_framework import serializers
+from rest_framework.permissions import SAFE_METHODS
+
+
+class QueryPlanMixin:
+    """
+    Lets a ModelSerializer declare the queryset shape it needs, so list views cost a fixed number of queries.
+
+    Meta.query_plan maps a serializer field name to what that field needs:
+        'category_title': {'select_related': ['category'], 'only': ['category__title']},
+        'instructors_details': {'prefetch_related': ['instructors']},
+        'courses_count': {},  # annotation, needs no columns
+    Plain model fields are added to only() automatically, so serializing fewer fields loads fewer columns.
+    A field that is neither a model field nor in query_plan switches only() off (all columns are loaded).
+
+    On GET the top-level serializer also honors sparse fieldsets and expansion:
+        ?fields=id,title,category_title   only these are serialized, and only their columns are loaded
+        ?expand=category                  a relation in Meta.expandable is nested with its own serializer
+                                          (joined or prefetched) instead of rendered as an id
+    """
+
+    @classmethod
+    def setup_queryset(cls, queryset, context=None, required=()):
+        # required: columns the view itself reads (an ETag's updated_at), kept whatever the fieldset
+        return cls(context=context or {}).plan_queryset(queryset, required)
+
+    def get_readable_fields(self):
+        return {name: field for name, field in self.fields.items() if not field.write_only}
+
+    def get_fields(self):
+        fields = super().get_fields()
+        request = self.context.get('request')
+        if request is None or request.method not in SAFE_METHODS or not self.is_root():
+            return fields
+
+        expandable = getattr(self.Meta, 'expandable', {})
+        expand = parse_names(request, 'expand')
+        unknown = expand - expandable.keys()
+        if unknown:
+            raise serializers.ValidationError({'expand': [f'Cannot expand: {", ".join(sorted(unknown))}.']})
+        opts = self.Meta.model._meta
+        for name in expand:
+            many = opts.get_field(name).many_to_many or opts.get_field(name).one_to_many
+            fields[name] = expandable[name](many=many, read_only=True)
+
+        selected = parse_names(request, 'fields')
+        if not selected:
+            return fields
+        unknown = selected - {name for name, field in fields.items() if not field.write_only}
+        if unknown:
+            raise serializers.ValidationError({'fields': [f'Unknown field: {", ".join(sorted(unknown))}.']})
+        selected |= expand
+        return {name: field for name, field in fields.items() if name in selected or field.write_only}
+
+    def is_root(self):
+        # nested serializers keep their fields, ?fields= is about the top-level object
+        parent = self.parent
+        return parent is None or (isinstance(parent, serializers.ListSerializer) and parent.parent is None)
+
+    def plan_queryset(self, queryset, required=()):
+        select_related, prefetch_related, only, use_only = self.get_plan(queryset.model)
+        only.update(required)
+        if select_related:
+            queryset = queryset.select_related(*select_related)
+        if prefetch_related:
+            queryset = queryset.prefetch_related(*prefetch_related)
+        if use_only:
+            queryset = queryset.only(*only)
+        return queryset
+
+    def get_plan(self, model, prefix=''):
+        plan = getattr(self.Meta, 'query_plan', {})
+        opts = model._meta
+        concrete = {field.name for field in opts.concrete_fields}
+
+        only = {prefix + opts.pk.name}
+        use_only = True
+        select_related = []
+        prefetch_related = []
+
+        for name, field in self.get_readable_fields().items():
+            if name in plan:
+                entry = plan[name]
+                for relation in entry.get('select_related', ()):
+                    select_related.append(prefix + relation)
+                    only.add(prefix + relation.split('__')[0])  # a deferred FK can't be traversed by select_related
+                for relation in entry.get('prefetch_related', ()):
+                    prefetch_related.append(self.get_prefetch(relation, field, opts, prefix))
+                only.update(prefix + column for column in entry.get('only', ()))
+            elif isinstance(field, QueryPlanMixin) and field.source in concrete:
+                # expanded foreign key: joined, the nested serializer plans its own columns and relations
+                related = opts.get_field(field.source).related_model
+                nested = field.get_plan(related, f'{prefix}{field.source}__')
+                select_related += [prefix + field.source] + nested[0]
+                prefetch_related += nested[1]
+                only.add(prefix + field.source)
+                only |= nested[2]
+                use_only = use_only and nested[3]
+            elif isinstance(field, serializers.ListSerializer) and isinstance(field.child, QueryPlanMixin):
+                prefetch_related.append(self.get_prefetch(field.source, field, opts, prefix))
+            elif field.source in concrete:
+                only.add(prefix + field.source)
+            else:
+                use_only = False
+        return select_related, prefetch_related, only, use_only
+
+    def get_prefetch(self, relation, field, opts, prefix=''):
+        # nested serializers plan their own queryset for the prefetch
+        child = field.child if isinstance(field, serializers.ListSerializer) else field
+        if isinstance(relation, str) and isinstance(child, QueryPlanMixin) and field.source == relation:
+            related_model = opts.get_field(relation).related_model
+            return Prefetch(prefix + relation, queryset=child.plan_queryset(related_model._default_manager.all()))
+        return prefix + relation
+
+
+def parse_names(request, param):
+    value = request.query_params.get(param, '')
+    return {name.strip() for name in value.split(',') if name.strip()}
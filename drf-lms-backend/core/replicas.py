@@ -0,0 +1,162 @@
+# core, replicas.py:
+import contextvars
+import random
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+from rest_framework.exceptions import AuthenticationFailed
+
+from users.authentication import StatelessJWTAuthentication
+from .cache import get_cache, is_in_process
+
+"""
+Read replicas: GET/HEAD/OPTIONS requests under /api/ read from a replica, everything else uses
+default (the primary). Off until LMS_REPLICAS['ALIASES'] lists DATABASES aliases.
+
+- ReplicaMiddleware picks one replica per request (at random), ReplicaRouter sends that request's
+  reads there and every write to default - an object read from a replica is saved to default too
+- read-your-writes: a request that wrote (any ORM write through the router) pins its user to default
+  for PIN_SECONDS, keep it above the replicas' lag. The pin is a cache key (core/cache.py): with
+  several worker processes the cache must be shared (Redis, memcached), locmem pins per process
+- reads inside transaction.atomic() stay on default, a read-modify-write sees the rows it updates
+- PRIMARY_MODELS are always read from default (revoked tokens must not lag)
+- raw SQL only follows this when it asks the router (core/search.py does)
+- local replica: DATABASES['replica'] is a second SQLite file, `python manage.py sync_replica`
+  copies default into it (SQLite online backup, a consistent snapshot), --every N keeps doing so
+  as a stand-in for replication lag; in production point the alias at a Postgres standby or an
+  SQLite copy kept by Litestream / LiteFS
+"""
+
+DEFAULTS = {
+    'ALIASES': [],
+    'PIN_SECONDS': 10,
+    'PATHS': ('/api/',),
+    'PRIMARY_MODELS': ('users.revokedtoken',),
+}
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+PIN_KEY = 'lms:primary:%s'
+
+
+def get_setting(name):
+    return getattr(settings, 'LMS_REPLICAS', {}).get(name, DEFAULTS[name])
+
+
+class Routing:
+    # per request, shared by the copies of the context sync_to_async makes
+    def __init__(self, replica):
+        self.replica = replica  # alias the reads go to, None: default
+        self.wrote = False
+
+
+routing = contextvars.ContextVar('lms_routing', default=None)
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        current = routing.get()
+        if current is None or current.replica is None:
+            return DEFAULT_DB_ALIAS
+        if model._meta.label_lower in get_setting('PRIMARY_MODELS') or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        return current.replica
+
+    def db_for_write(self, model, **hints):
+        current = routing.get()
+        if current is not None:
+            current.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # replicas hold the same rows as default
+        databases = {DEFAULT_DB_ALIAS, *get_setting('ALIASES')}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+
+def request_user_id(request):
+    # the JWT's user, without a query; an invalid token is the view's business
+    try:
+        result = StatelessJWTAuthentication().authenticate(request)
+    except AuthenticationFailed:
+        return None
+    return result[0].id if result else None
+
+
+def start_routing(request):
+    """(Routing, user id to pin after a write) for this request, before the pin is looked up."""
+    aliases = get_setting('ALIASES')
+    if not aliases or not request.path.startswith(tuple(get_setting('PATHS'))):
+        return Routing(None), None
+    user_id = request_user_id(request)
+    if request.method not in SAFE_METHODS:
+        return Routing(None), user_id
+    return Routing(random.choice(aliases)), user_id
+
+
+def is_pinned(user_id):
+    return bool(get_cache().get(PIN_KEY % user_id))
+
+
+def pin(user_id):
+    get_cache().set(PIN_KEY % user_id, 1, get_setting('PIN_SECONDS'))
+
+
+# async requests: like core/cache.py, the cache's async API unless it is in-process
+async def ais_pinned(user_id):
+    if is_in_process():
+        return is_pinned(user_id)
+    return bool(await get_cache().aget(PIN_KEY % user_id))
+
+
+async def apin(user_id):
+    if is_in_process():
+        return pin(user_id)
+    await get_cache().aset(PIN_KEY % user_id, 1, get_setting('PIN_SECONDS'))
+
+
+class ReplicaMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        current, user_id = start_routing(request)
+        if current.replica and user_id is not None and is_pinned(user_id):
+            current.replica = None
+        token = routing.set(current)
+        try:
+            return self.get_response(request)
+        finally:
+            routing.reset(token)
+            if current.wrote and user_id is not None:
+                pin(user_id)
+
+    async def __acall__(self, request):
+        current, user_id = start_routing(request)
+        if current.replica and user_id is not None and await ais_pinned(user_id):
+            current.replica = None
+        token = routing.set(current)
+        try:
+            return await self.get_response(request)
+        finally:
+            routing.reset(token)
+            if current.wrote and user_id is not None:
+                await apin(user_id)
+
+
+def sync_replica(alias):
+    """Copies default into the SQLite replica alias with the online backup API (a consistent snapshot)."""
+    source, target = connections[DEFAULT_DB_ALIAS], connections[alias]
+    if source.vendor != 'sqlite' or target.vendor != 'sqlite':
+        raise ValueError(f'{alias}: sync_replica copies SQLite files, other databases replicate themselves.')
+    source.ensure_connection()
+    target.ensure_connection()
+    source.connection.backup(target.connection)
@@ -0,0 +1,165 @@
+# core, search.py:
+import html
+import re
+
+from django.conf import settings
+from django.db import connection, connections, router, transaction
+
+from .models import Course
+
+"""
+Full-text search over course, lesson and material titles/descriptions and Q&A text, in an SQLite
+FTS5 table (core_search, created by migration 0011) instead of the browser filtering /api/courses/.
+
+GET /api/search/?q=django forms                    ranked hits, 20 per page
+GET /api/search/?q=orm&type=lesson,question&course=3&page=2
+
+- kept in sync by triggers on the four tables: save(), delete() and cascades, but also bulk_create
+  (catalog import, seeding) and queryset updates; a save that changes none of the indexed columns
+  (counters, banner variants) doesn't touch the index
+- only active rows are indexed; hits from an inactive course are filtered out at query time
+- every word must match, the last one as a prefix ("djan" finds django) for search-as-you-type
+- ranked by bm25 (a title match weighs 4 body matches); its cost grows with the number of matches,
+  so it is bounded: words found in more than COMMON_MATCHES entries are dropped like stopwords
+  (a query of only such words lists courses, lessons, materials then questions, newest first, score
+  null) and only the first RANK_WINDOW matches in that order are ranked
+- title and snippet are HTML-escaped, matches are wrapped in <mark>
+- python manage.py rebuild_search_index repopulates it (restored dump, triggers disabled) and merges
+  its segments
+"""
+
+DEFAULTS = {
+    'PAGE_SIZE': 20,
+    'MAX_PAGE_SIZE': 50,
+    'MAX_RESULTS': 1000,    # deepest hit a client can page to, OFFSET is not free
+    'MAX_TERMS': 10,
+    'SNIPPET_TOKENS': 16,
+    'COMMON_MATCHES': 50_000,  # a word in more entries is dropped from the query (all common: newest first)
+    'RANK_WINDOW': 5_000,      # matches bm25 ranks, about 2.5 ms per 1000 (courses first, newest first)
+}
+# rowid = number * SPAN + object id (migration 0011): courses have the highest rowids
+KINDS = {'course': 3, 'lesson': 2, 'material': 1, 'question': 0}
+SPAN = 2 ** 40
+TABLE = 'core_search'
+WORD = re.compile(r'\w+', re.UNICODE)
+PREFIX_LENGTHS = (2, 3)  # the table's prefix indexes (migration 0011)
+OPEN, CLOSE = '\x02', '\x03'  # placeholders around matches, replaced after escaping the text
+
+# same entries as the migration's triggers, for rebuild_search_index
+REBUILD = {
+    'course': "SELECT %s + id, 'course', id, id, NULL, title, description FROM core_course WHERE is_active",
+    'lesson': "SELECT %s + id, 'lesson', id, course_id_id, id, title, description FROM core_lesson WHERE is_active",
+    'material': "SELECT %s + id, 'material', id, course_id_id, NULL, title, description FROM core_material WHERE is_active",
+    'question': (
+        "SELECT %s + q.id, 'question', q.id, l.course_id_id, q.lesson_id_id, '', q.description "
+        "FROM core_questionanswer q JOIN core_lesson l ON l.id = q.lesson_id_id WHERE q.is_active"
+    ),
+}
+
+
+def get_setting(name):
+    return getattr(settings, 'LMS_SEARCH', {}).get(name, DEFAULTS[name])
+
+
+def is_available():
+    return connection.vendor == 'sqlite'  # the migration creates the table there and nowhere else
+
+
+def match_terms(query):
+    """User input -> FTS5 phrases: every word quoted (no operator injection), the last one a prefix."""
+    words = WORD.findall(query)[:get_setting('MAX_TERMS')]
+    terms = [f'"{word}"' for word in words]
+    if terms and len(words[-1]) > 1 and not query[-1:].isspace():  # still typing the last word
+        terms[-1] += '*'
+    return terms
+
+
+def cheap_form(term):
+    # a prefix longer than the prefix indexes is a merge of every term it starts, before the first
+    # row: take the whole word instead (in a frequent word, the prefix only adds more of the same)
+    word = term.strip('"*')
+    return term if term.endswith('*') and len(word) in PREFIX_LENGTHS else f'"{word}"'
+
+
+def match_expression(terms, course_id=None):
+    expression = '{title body} : (%s)' % ' '.join(terms)
+    if course_id is not None:
+        expression += f' AND course_id : "{int(course_id)}"'
+    return expression
+
+
+def common_terms(cursor, terms):
+    """Which terms are in more than COMMON_MATCHES entries, one statement of capped counts."""
+    limit = get_setting('COMMON_MATCHES')
+    count = f'(SELECT COUNT(*) FROM (SELECT 1 FROM {TABLE} WHERE {TABLE} MATCH %s LIMIT %s))'
+    cursor.execute('SELECT ' + ', '.join([count] * len(terms)), [
+        value for term in terms for value in (match_expression([cheap_form(term)]), limit + 1)
+    ])
+    return [matches > limit for matches in cursor.fetchone()]
+
+
+def marked(text):
+    return html.escape(text).replace(OPEN, '<mark>').replace(CLOSE, '</mark>')
+
+
+def search(query, kinds=None, course_id=None, limit=None, offset=0):
+    """Hits for query: [{type, id, course, lesson, title, snippet, score}], best first (score None: not ranked)."""
+    terms = match_terms(query)
+    if not terms:
+        return []
+    limit = limit or get_setting('PAGE_SIZE')
+    with connections[router.db_for_read(Course)].cursor() as cursor:  # a replica in a GET (core/replicas.py)
+        # bm25 first counts every entry holding each term, a word in most entries costs more than
+        # the rest of the query and weighs nothing in the ranking: leave those out, like stopwords
+        common = common_terms(cursor, terms)
+        ranked = not all(common)
+        if ranked:
+            terms = [term for term, is_common in zip(terms, common) if not is_common]
+        else:
+            terms = [cheap_form(term) for term in terms]
+        conditions, params = [f'{TABLE} MATCH %s'], [match_expression(terms, course_id)]
+        if kinds:
+            # a type is a rowid range, FTS5 skips the others without reading them
+            numbers = sorted(KINDS[kind] for kind in kinds)
+            conditions.append('s.rowid >= %s AND s.rowid < %s')
+            params += [numbers[0] * SPAN, (numbers[-1] + 1) * SPAN]
+            if len(numbers) != numbers[-1] - numbers[0] + 1:  # not adjacent: lesson and question
+                conditions.append(f's.rowid / {SPAN} IN ({", ".join(["%s"] * len(numbers))})')
+                params += numbers
+        if ranked:
+            # rank the first RANK_WINDOW matches in rowid order (courses, then lessons.., newest first):
+            # scoring is per match and a broad query has millions
+            cursor.execute(
+                f"SELECT s.rowid FROM {TABLE} s WHERE {' AND '.join(conditions)} ORDER BY s.rowid DESC LIMIT 1 OFFSET %s",
+                params + [get_setting('RANK_WINDOW') - 1],
+            )
+            floor = cursor.fetchone()
+            if floor:
+                conditions.append('s.rowid >= %s')
+                params.append(floor[0])
+        cursor.execute(
+            f"SELECT s.kind, s.object_id, s.course_id, s.lesson_id, highlight({TABLE}, 4, %s, %s), "
+            f"snippet({TABLE}, 5, %s, %s, '…', %s), {'s.rank' if ranked else 'NULL'} "
+            f"FROM {TABLE} s JOIN core_course c ON c.id = s.course_id "
+            f"WHERE {' AND '.join(conditions)} AND c.is_active "
+            f"ORDER BY {'s.rank' if ranked else 's.rowid DESC'} LIMIT %s OFFSET %s",
+            [OPEN, CLOSE, OPEN, CLOSE, get_setting('SNIPPET_TOKENS')] + params + [limit, offset],
+        )
+        rows = cursor.fetchall()
+    return [
+        {'type': kind, 'id': object_id, 'course': course, 'lesson': lesson, 'title': marked(title),
+         'snippet': marked(snippet), 'score': None if rank is None else round(-rank, 4)}
+        for kind, object_id, course, lesson, title, snippet, rank in rows
+    ]
+
+
+def rebuild_search_index():
+    """Repopulates core_search from the tables, returns the number of entries."""
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {TABLE}')
+        for kind in KINDS:
+            cursor.execute(f'INSERT INTO {TABLE}(rowid, kind, object_id, course_id, lesson_id, title, body) {REBUILD[kind]}',
+                           [KINDS[kind] * SPAN])
+        cursor.execute(f"INSERT INTO {TABLE}({TABLE}) VALUES ('optimize')")
+        cursor.execute(f'SELECT COUNT(*) FROM {TABLE}')
+        return cursor.fetchone()[0]
@@ -1,20 +1,30 @@
+import posixpath
+
+from django.core.files.storage import default_storage
 from rest_framework import serializers
-from .models import Course, Category, Lesson, Material, Enrollment, QuestionAnswer
+from .models import Course, Category, Lesson, Material, Enrollment, QuestionAnswer, CatalogImport, Upload, LessonProgress
 from users.models import User
+from .query_plan import QueryPlanMixin
+from .images import banner_srcset
 
-class CategorySerializer(serializers.ModelSerializer):
-    courses_count = serializers.IntegerField(read_only=True)
+class CategorySerializer(QueryPlanMixin, serializers.ModelSerializer):
     class Meta:
         model = Category
-        fields = '__all__'
+        fields = '__all__'  # courses_count is a maintained column (core/counters.py), read-only
 
-class InstructorSerializer(serializers.ModelSerializer):
+class InstructorSerializer(QueryPlanMixin, serializers.ModelSerializer):
     class Meta:
         model = User
         fields = ('id', 'username', 'first_name', 'last_name', 'role', 'mobile_no')
 
+# another user as any authenticated user may see them: no name or phone number
+class PublicUserSerializer(QueryPlanMixin, serializers.ModelSerializer):
+    class Meta:
+        model = User
+        fields = ('id', 'username', 'role')
+
 # option to set instructors when creating/updating a course
-class CourseSerializer(serializers.ModelSerializer):
+class CourseSerializer(QueryPlanMixin, serializers.ModelSerializer):
     # Read side: show full instructor details
     instructors_details = InstructorSerializer(source='instructors', many=True, read_only=True)
     # Write side: accept list of instructor IDs
@@ -27,14 +37,25 @@ class CourseSerializer(serializers.ModelSerializer):
     category_title = serializers.CharField(source='category.title', read_only=True)
     # Image handling
     banner_url = serializers.ImageField(source='banner', read_only=True)
+    banner_srcset = serializers.SerializerMethodField()  # resized JPEG/WebP variants, null until built
     
     class Meta:
         model = Course
         fields = '__all__'
+        query_plan = {
+            'instructors_details': {'prefetch_related': ['instructors']},
+            'category_title': {'select_related': ['category'], 'only': ['category__title']},
+            'banner_url': {'only': ['banner']},
+            'banner_srcset': {'only': ['banner', 'banner_variants']},
+        }
+        expandable = {'category': CategorySerializer}  # ?expand=category
         # Or specify fields explicitly:
         # fields = ('id', 'title', 'description', 'banner', 'price', 'duration', 
         #           'is_active', 'category', 'instructors', 'category_title', 'created_at', 'updated_at')                 
 
+    def get_banner_srcset(self, course):
+        return banner_srcset(course, self.context.get('request'))
+
     def create(self, validated_data):
         instructors_data = validated_data.pop('instructors', [])
         course = Course.objects.create(**validated_data)
@@ -73,29 +94,156 @@ axios.post('/api/courses/', formData, {
 display image: <img src={course.banner_url} alt={course.title} />
 """	
 
-class LessonSerializer(serializers.ModelSerializer):
+class LessonSerializer(QueryPlanMixin, serializers.ModelSerializer):
     class Meta:
         model = Lesson
         fields = '__all__'
+        extra_kwargs = {'video': {'required': False}}  # large videos are attached afterwards via /api/uploads/
 
-class MaterialSerializer(serializers.ModelSerializer):
+class MaterialSerializer(QueryPlanMixin, serializers.ModelSerializer):
     class Meta:
         model = Material
         fields = '__all__'
+        extra_kwargs = {'file': {'required': False}}  # same, via /api/uploads/
 
-class EnrollmentSerializer(serializers.ModelSerializer):
+class EnrollmentSerializer(QueryPlanMixin, serializers.ModelSerializer):
     student_name = serializers.CharField(source='student_id.username', read_only=True)
     course_title = serializers.CharField(source='course_id.title', read_only=True)
     
     class Meta:
         model = Enrollment
         fields = '__all__'
+        query_plan = {
+            'student_name': {'select_related': ['student_id'], 'only': ['student_id__username']},
+            'course_title': {'select_related': ['course_id'], 'only': ['course_id__title']},
+        }
+        expandable = {'student_id': PublicUserSerializer, 'course_id': CourseSerializer}
 
-class QuestionAnswerSerializer(serializers.ModelSerializer):
+class QuestionAnswerSerializer(QueryPlanMixin, serializers.ModelSerializer):
     user_name = serializers.CharField(source='user_id.username', read_only=True)
     lesson_title = serializers.CharField(source='lesson_id.title', read_only=True)
     
     class Meta:
         model = QuestionAnswer
         fields = '__all__'
+        query_plan = {
+            'user_name': {'select_related': ['user_id'], 'only': ['user_id__username']},
+            'lesson_title': {'select_related': ['lesson_id'], 'only': ['lesson_id__title']},
+        }
+        expandable = {'user_id': PublicUserSerializer, 'lesson_id': LessonSerializer}
+
+
+# bulk enrollment: validated per row without queries, the lookups are done set-based in core/bulk.py
+class BulkEnrollmentRowSerializer(serializers.Serializer):
+    student_id = serializers.IntegerField()
+    course_id = serializers.IntegerField()
+    price = serializers.FloatField(min_value=0, default=0)
+
+class BulkEnrollmentSerializer(serializers.Serializer):
+    MAX_ROWS = 10000
+
+    # either a list of rows ...
+    enrollments = serializers.ListField(child=serializers.DictField(), required=False, max_length=MAX_ROWS)
+    # ... or one course plus a list of students
+    course_id = serializers.IntegerField(required=False)
+    students = serializers.ListField(child=serializers.IntegerField(), required=False, max_length=MAX_ROWS)
+    price = serializers.FloatField(required=False, min_value=0, default=0)
+
+    def validate(self, attrs):
+        has_rows = 'enrollments' in attrs
+        has_course = 'course_id' in attrs or 'students' in attrs
+        if has_rows == has_course:
+            raise serializers.ValidationError('Send either "enrollments", or "course_id" with "students".')
+        if has_course and not ('course_id' in attrs and 'students' in attrs):
+            raise serializers.ValidationError('"course_id" and "students" go together.')
+        return attrs
+
+    def get_rows(self):
+        data = self.validated_data
+        if 'enrollments' in data:
+            return data['enrollments']
+        return [{'student_id': student, 'course_id': data['course_id'], 'price': data['price']} for student in data['students']]
+
+
+# catalog import manifest rows, see core/imports.py. Names (category title, instructor usernames,
+# course ref) are resolved through in-memory maps there, so validating a row costs no query.
+class DelimitedListField(serializers.ListField):
+    # CSV cells carry lists as "a|b|c", NDJSON can send a real list
+    def to_internal_value(self, data):
+        if isinstance(data, str):
+            data = [item.strip() for item in data.split('|') if item.strip()]
+        return super().to_internal_value(data)
+
+class CourseImportRowSerializer(serializers.Serializer):
+    ref = serializers.CharField(max_length=255)
+    title = serializers.CharField(max_length=255)
+    description = serializers.CharField()
+    price = serializers.FloatField(min_value=0)
+    duration = serializers.FloatField(min_value=0)
+    is_active = serializers.BooleanField(default=True)
+    category = serializers.CharField(max_length=255)
+    instructors = DelimitedListField(child=serializers.CharField(), default=list)
+
+class LessonImportRowSerializer(serializers.Serializer):
+    course = serializers.CharField(max_length=255)  # ref of a course row of the same manifest
+    title = serializers.CharField(max_length=255)
+    description = serializers.CharField()
+    video = serializers.CharField(max_length=100, default='')  # path under MEDIA_ROOT, the file is not copied
+    is_active = serializers.BooleanField(default=True)
+
+    def validate_video(self, value):
+        # served by the protected video view (core/media.py): only a file that is already in lesson_videos/,
+        # as a plain relative name - no ../, ./, // or absolute path reaching other folders
+        if not value:
+            return value
+        folder = Lesson._meta.get_field('video').upload_to + '/'
+        if value != posixpath.normpath(value) or '\\' in value or not value.startswith(folder):
+            raise serializers.ValidationError(f'Give a relative path under {folder}, like {folder}intro.mp4.')
+        if not default_storage.exists(value):
+            raise serializers.ValidationError('No such file in media storage, upload the video first.')
+        return value
+
+class CatalogImportSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = CatalogImport
+        exclude = ('manifest',)  # protected media, only the import job reads it
+
+
+# chunked uploads, see core/uploads.py
+class UploadSerializer(serializers.ModelSerializer):
+    sha256 = serializers.RegexField(r'^[0-9a-f]{64}$', required=False, allow_blank=True)
+
+    class Meta:
+        model = Upload
+        fields = '__all__'
+        read_only_fields = ('user', 'received', 'locked_until', 'is_complete', 'created_at', 'updated_at')
+
+    def validate_filename(self, value):
+        value = value.replace('\\', '/').rsplit('/', 1)[-1]  # a name, not a path
+        if not value.strip('.'):
+            raise serializers.ValidationError('Give the file name.')
+        return value
+
+    def validate_size(self, value):
+        from .uploads import get_setting
+        if value < 1 or value > get_setting('MAX_SIZE'):
+            raise serializers.ValidationError(f'Size must be 1 to {get_setting("MAX_SIZE")} bytes.')
+        return value
+
 
+# lesson progress heartbeats, see core/progress.py
+class ProgressEventSerializer(serializers.Serializer):
+    lesson = serializers.IntegerField(min_value=1)
+    position = serializers.FloatField(min_value=0)  # seconds
+    duration = serializers.FloatField(min_value=0)
+    completed = serializers.BooleanField(default=False)  # the player saw the end
+
+    def validate(self, attrs):
+        if attrs['duration'] and attrs['position'] > attrs['duration']:
+            attrs['position'] = attrs['duration']
+        return attrs
+
+class LessonProgressSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = LessonProgress
+        fields = ('lesson', 'course', 'position', 'duration', 'is_completed', 'updated_at')
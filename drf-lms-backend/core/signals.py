@@ -0,0 +1,54 @@
+# core, signals.py:
+from django.db.models.signals import post_save, post_delete, pre_delete, m2m_changed
+from django.db import transaction
+from django.dispatch import receiver
+
+from users.models import User
+from .cache import bump_version
+from .counters import user_deleted
+from .feeds import publish_question
+from .models import Category, Course, QuestionAnswer
+
+# category list shows courses_count, course list shows category_title and instructor details,
+# so a change on any of these models makes both cached listings stale
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+@receiver(post_save, sender=Course)
+@receiver(post_delete, sender=Course)
+def bump_catalog_version(sender, **kwargs):
+    bump_version('categories', 'courses')
+
+
+@receiver(m2m_changed, sender=Course.instructors.through)
+def bump_catalog_version_on_instructors(sender, action, **kwargs):
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        bump_version('courses')
+
+
+@receiver(post_save, sender=User)
+def bump_catalog_version_on_instructor(sender, instance, created, **kwargs):
+    # instructors_details embeds teacher rows, students signing up don't touch the catalog;
+    # a former teacher still linked to courses (role changed) also counts
+    if instance.role == 'teacher' or (not created and instance.courses.exists()):
+        bump_version('courses')
+
+
+@receiver(post_delete, sender=User)
+def bump_catalog_version_on_instructor_delete(sender, instance, **kwargs):
+    if instance.role == 'teacher':
+        bump_version('courses')
+
+
+@receiver(pre_delete, sender=User)
+def release_user_counters(sender, instance, **kwargs):
+    # sent inside the delete transaction, before the cascade removes the user's enrollments and questions
+    user_deleted(instance)
+
+
+@receiver(post_save, sender=QuestionAnswer)
+def push_new_question(sender, instance, created, **kwargs):
+    # to the lesson's live streams (core/feeds.py), once the row is visible to their reads
+    if created:
+        transaction.on_commit(lambda: publish_question(instance))
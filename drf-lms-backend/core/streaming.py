@@ -0,0 +1,48 @@
+# core, streaming.py:
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+
+"""
+Streamed bodies under ASGI: Django's ASGI handler reads a synchronous StreamingHttpResponse (or
+FileResponse) with sync_to_async(list), the whole body in memory before the first byte is sent -
+an export of every enrollment, a video. AsyncStreamingMiddleware (first in MIDDLEWARE) swaps that
+iterator for an async one that pulls a chunk at a time on the request's thread:
+
+- the views stay synchronous and build the same responses under WSGI, where nothing changes (and
+  FileResponse keeps the server's sendfile)
+- a chunk is what the view yields: EXPORT_CHUNK_SIZE rows (core/export.py), STREAM_BLOCK_SIZE
+  bytes of a file (core/media.py), so one thread hop per chunk, not per row
+- the thread is the request's own (thread_sensitive), the one that opened the export's database
+  connection; the connection is closed with the response, as under WSGI
+"""
+
+
+async def aiterate(iterator):
+    next_chunk = sync_to_async(next, thread_sensitive=True)
+    done = object()
+    while True:
+        chunk = await next_chunk(iterator, done)
+        if chunk is done:
+            return
+        yield chunk
+
+
+class AsyncStreamingMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        return self.get_response(request)  # WSGI: the server iterates the body itself
+
+    async def __acall__(self, request):
+        response = await self.get_response(request)
+        if response.streaming and not response.is_async:
+            # the sync iterator (a FileResponse keeps closing its file with the response)
+            response.streaming_content = aiterate(iter(response.streaming_content))
+        return response
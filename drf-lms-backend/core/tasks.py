@@ -0,0 +1,27 @@
+# core, tasks.py:
+from .certificates import generate_certificates
+from .images import build_banner_variants
+from .imports import run_import
+from .jobs import renew_lease, task
+
+# background tasks run by manage.py run_workers, see core/jobs.py; imported in CoreConfig.ready()
+# so the registry is the same in web and worker processes
+
+
+@task('banner_variants')
+def banner_variants(course_id):
+    build_banner_variants(course_id)
+
+
+@task('generate_certificates', max_attempts=3)
+def certificates(course_id):
+    # one course per job (enqueue_certificates); in-process: forking a pool from a threaded worker
+    # isn't safe, the command uses the pool. The lease is renewed after every chunk, a large
+    # course doesn't outrun it and get claimed (and rendered) a second time
+    generate_certificates([course_id], processes=1, progress=lambda done, seconds: renew_lease())
+
+
+@task('catalog_import', max_attempts=3)
+def catalog_import(import_id):
+    # a retry resumes after the last committed chunk; the lease is renewed after every chunk
+    run_import(import_id, progress=lambda job: renew_lease())
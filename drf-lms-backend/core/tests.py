@@ -1,3 +1,1565 @@
-from django.test import TestCase
+import asyncio
+import csv
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import time
+from datetime import timedelta
+from io import BytesIO, StringIO
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import async_to_sync, iscoroutinefunction, sync_to_async
+
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection, router, transaction
+from django.http import Http404
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import resolve
+from django.utils import timezone
+from rest_framework.request import Request
+from rest_framework.test import APIClient, APITestCase, APIRequestFactory
+
+from users.models import RevokedToken, User
+from users.serializers import LMSTokenObtainPairSerializer
+from .models import Category, Course, Lesson, Material, Enrollment, QuestionAnswer, CatalogImport, Upload, Job, LessonProgress
+from .bulk import bulk_enroll
+from .cache import check_shared, check_web_workers, get_version
+from .imports import import_catalog
+from .counters import COUNTERS
+from .media import serve_public_media
+from .images import build_banner_variants
+from .certificates import course_template, generate_certificates
+from .pagination import KeysetPagination
+from .progress import Flusher, buffer as progress_buffer, flush_on_exit, flush_progress
+from .search import search
+from .feeds import hub, publish_question, question_stream
+from .replicas import Routing, routing, sync_replica
+from .jobs import TASKS, LeaseLost, claim, enqueue, renew_lease, run_job, task
+from .uploads import part_path
+from .serializers import CourseSerializer
+from .async_views import ais_course_instructor, read_async
+from . import views
+from .views import IsAdminOrInstructor, is_course_instructor
+
+# query budgets are ceilings: a serializer or permission N+1 pushes the count past them
+MAX_SECONDS = 1.0
+
+TEST_MEDIA_ROOT = tempfile.mkdtemp()
+
+
+@override_settings(MEDIA_ROOT=TEST_MEDIA_ROOT)
+class QueryBudgetTestCase(APITestCase):
+    """Seeds a small dataset with seed_lms and gives helpers to assert per-request query/time budgets."""
+
+    @classmethod
+    def setUpTestData(cls):
+        call_command(
+            'seed_lms', categories=5, teachers=10, students=60, courses=40, lessons_per_course=3,
+            materials_per_course=2, enrollments=600, questions=800, batch_size=500, stdout=StringIO(),
+        )
+        cls.admin = User.objects.create_user('admin', 'admin@example.com', 'password', role='admin')
+        cls.student = User.objects.filter(role='student').first()
+        cls.course = Course.objects.first()
+        cls.teacher = cls.course.instructors.first()
+        cls.outsider = User.objects.filter(role='teacher').exclude(courses=cls.course).first()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEST_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()  # budgets below are for a cold response cache
+
+    def login(self, user):
+        token = LMSTokenObtainPairSerializer.get_token(user).access_token
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+
+    def assertBudget(self, method, url, queries, status=200, data=None, format=None, seconds=MAX_SECONDS):
+        with CaptureQueriesContext(connection) as ctx:
+            started = time.perf_counter()
+            response = getattr(self.client, method)(url, data, format=format)
+            elapsed = time.perf_counter() - started
+        self.assertEqual(response.status_code, status, getattr(response, 'data', None))
+        sql = '\n'.join(query['sql'] for query in ctx.captured_queries)
+        self.assertLessEqual(len(ctx), queries, f'{method.upper()} {url} ran {len(ctx)} queries:\n{sql}')
+        self.assertLess(elapsed, seconds, f'{method.upper()} {url} took {elapsed:.3f}s')
+        return response
+
+    def assertConstantQueries(self, url, small=5, large=30):
+        # the same endpoint must not run more queries for a bigger page
+        counts = []
+        for page_size in (small, large):
+            with CaptureQueriesContext(connection) as ctx:
+                response = self.client.get(url, {'page_size': page_size})
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(len(response.data['results']), page_size)
+            counts.append(len(ctx))
+        self.assertEqual(counts[0], counts[1], f'{url} query count grows with page size: {counts}')
+
+
+class CategoryQueryBudgetTests(QueryBudgetTestCase):
+    def test_list(self):
+        self.login(self.student)
+        response = self.assertBudget('get', '/api/categories/', queries=1)
+        self.assertEqual(len(response.data), 5)
+
+    def test_create(self):
+        self.login(self.admin)
+        self.assertBudget('post', '/api/categories/', queries=1, status=201, data={'title': 'New'})
+
+    def test_detail(self):
+        category = Category.objects.first()
+        self.login(self.student)
+        self.assertBudget('get', f'/api/categories/{category.pk}/', queries=1)
+
+    def test_update(self):
+        category = Category.objects.first()
+        self.login(self.admin)
+        self.assertBudget('put', f'/api/categories/{category.pk}/', queries=2, data={'title': 'Renamed'})
+
+    def test_delete(self):
+        category = Category.objects.create(title='Empty')
+        self.login(self.admin)
+        self.assertBudget('delete', f'/api/categories/{category.pk}/', queries=4, status=204)
+
+
+class CourseQueryBudgetTests(QueryBudgetTestCase):
+    def test_list(self):
+        self.login(self.student)
+        self.assertBudget('get', '/api/courses/', queries=2)
+        self.assertConstantQueries('/api/courses/')
+
+    def test_list_next_page(self):
+        self.login(self.student)
+        response = self.client.get('/api/courses/', {'page_size': 10})
+        self.assertBudget('get', response.data['next'], queries=2)
+
+    def test_tampered_cursor_is_404(self):
+        self.login(self.admin)
+        encode = KeysetPagination().encode_cursor
+        for url, values in (
+            ('/api/courses/', ['x', 'abc', 'y']), ('/api/courses/', [None, 'abc', 1]),
+            ('/api/courses/', ['x', 'abc', {'a': 1}]), ('/api/lessons/', ['soon', 1]),
+            ('/api/enrollments/', ['x', 1]), ('/api/enrollments/', [[1], 1]),
+        ):
+            response = self.client.get(url, {'cursor': encode(values)})
+            self.assertEqual((response.status_code, response.data), (404, {'detail': 'Invalid cursor'}), msg=(url, values))
+
+    def test_create(self):
+        self.login(self.teacher)
+        data = {
+            'title': 'New course', 'description': 'd', 'price': 10, 'duration': 5, 'is_active': True,
+            'category': self.course.category_id, 'instructors': [self.teacher.pk],
+        }
+        self.assertBudget('post', '/api/courses/', queries=8, status=201, data=data)  # + category courses_count
+
+    def test_detail(self):
+        self.login(self.teacher)
+        self.assertBudget('get', f'/api/courses/{self.course.pk}/', queries=2)
+
+    def test_detail_forbidden(self):
+        self.login(self.outsider)
+        self.assertBudget('get', f'/api/courses/{self.course.pk}/', queries=2, status=403)
+
+    def test_update(self):
+        self.login(self.teacher)
+        data = {
+            'title': 'Renamed', 'description': 'd', 'price': 10, 'duration': 5, 'is_active': True,
+            'category': self.course.category_id, 'instructors': [self.teacher.pk],
+        }
+        self.assertBudget('put', f'/api/courses/{self.course.pk}/', queries=8, data=data)
+
+    def test_delete(self):
+        self.login(self.admin)
+        # cascades: lessons -> questions/progress, instructors, materials, enrollments, catalog import refs, progress;
+        # category courses_count
+        self.assertBudget('delete', f'/api/courses/{self.course.pk}/', queries=12, status=204)
+
+
+class LessonMaterialQueryBudgetTests(QueryBudgetTestCase):
+    def test_lesson_list(self):
+        self.login(self.student)
+        self.assertBudget('get', '/api/lessons/', queries=2)  # MAX/COUNT validators + page
+        self.assertConstantQueries('/api/lessons/')
+
+    def test_lesson_create(self):
+        self.login(self.teacher)
+        data = {
+            'title': 'L', 'description': 'd', 'course_id': self.course.pk,
+            'video': SimpleUploadedFile('intro.mp4', b'0' * 64, content_type='video/mp4'),
+        }
+        self.assertBudget('post', '/api/lessons/', queries=3, status=201, data=data, format='multipart')  # + course lesson_count
+
+    def test_material_list(self):
+        self.login(self.student)
+        self.assertBudget('get', '/api/materials/', queries=1)
+        self.assertConstantQueries('/api/materials/')
+
+    def test_material_create(self):
+        self.login(self.teacher)
+        data = {
+            'title': 'M', 'description': 'd', 'file_type': 'pdf', 'course_id': self.course.pk,
+            'file': SimpleUploadedFile('notes.pdf', b'%PDF-1.4', content_type='application/pdf'),
+        }
+        self.assertBudget('post', '/api/materials/', queries=2, status=201, data=data, format='multipart')
+
+
+class EnrollmentQuestionQueryBudgetTests(QueryBudgetTestCase):
+    def test_enrollment_list(self):
+        self.login(self.admin)
+        self.assertBudget('get', '/api/enrollments/', queries=1)
+        self.assertConstantQueries('/api/enrollments/')
+
+    def test_enrollment_create(self):
+        course = Course.objects.exclude(enrollment__student_id=self.student).first()
+        self.login(self.student)
+        data = {'student_id': self.student.pk, 'course_id': course.pk, 'price': 0}
+        self.assertBudget('post', '/api/enrollments/', queries=5, status=201, data=data)  # + unique (student, course) check, enrollment_count
+
+    def test_question_list(self):
+        self.login(self.student)
+        self.assertBudget('get', '/api/questions/', queries=1)
+        self.assertConstantQueries('/api/questions/')
+
+    def test_question_create(self):
+        lesson = Lesson.objects.first()
+        self.login(self.student)
+        data = {'user_id': self.student.pk, 'lesson_id': lesson.pk, 'description': 'Why?'}
+        self.assertBudget('post', '/api/questions/', queries=4, status=201, data=data)  # + lesson question_count
+
+    def test_duplicate_enrollment(self):
+        enrollment = Enrollment.objects.first()
+        self.login(self.admin)
+        data = {'student_id': enrollment.student_id_id, 'course_id': enrollment.course_id_id, 'price': 0}
+        self.assertBudget('post', '/api/enrollments/', queries=3, status=400, data=data)
+
+    def test_seeded_dataset(self):
+        self.assertEqual(Enrollment.objects.count(), 600)
+        self.assertEqual(QuestionAnswer.objects.count(), 800)
+        self.assertEqual(Enrollment.objects.values('student_id', 'course_id').distinct().count(), 600)
+        out = StringIO()
+        call_command('dedupe_enrollments', stdout=out)  # what migration 0004 asks for on a table with duplicates
+        self.assertIn('No duplicate enrollments', out.getvalue())
+
+
+class CatalogCacheTests(QueryBudgetTestCase):
+    def test_category_list_is_cached(self):
+        self.login(self.student)
+        first = self.assertBudget('get', '/api/categories/', queries=1)
+        second = self.assertBudget('get', '/api/categories/', queries=0)  # served from the cache, the JWT carries the user
+        self.assertEqual(first.data, second.data)
+
+    def test_course_list_is_cached_per_page(self):
+        self.login(self.student)
+        self.assertBudget('get', '/api/courses/', queries=2)
+        self.assertBudget('get', '/api/courses/', queries=0)
+        self.assertBudget('get', '/api/courses/', queries=2, data={'page_size': 7})
+
+    def test_course_save_invalidates(self):
+        self.login(self.student)
+        self.client.get('/api/courses/', {'page_size': 100})
+        self.client.get('/api/categories/')
+        Course.objects.create(title='Fresh', description='d', price=0, duration=1, is_active=True,
+                              category=self.course.category)
+        courses = self.client.get('/api/courses/', {'page_size': 100}).data['results']
+        self.assertIn('Fresh', [row['title'] for row in courses])
+        categories = {row['id']: row['courses_count'] for row in self.client.get('/api/categories/').data}
+        self.assertEqual(categories[self.course.category_id], Course.objects.filter(category=self.course.category).count())
+
+    def test_category_rename_invalidates_courses(self):
+        self.login(self.student)
+        self.client.get('/api/courses/', {'page_size': 100})
+        category = self.course.category
+        category.title = 'Renamed category'
+        category.save()
+        courses = self.client.get('/api/courses/', {'page_size': 100}).data['results']
+        self.assertIn('Renamed category', [row['category_title'] for row in courses])
+
+    def test_instructor_change_invalidates(self):
+        self.login(self.student)
+        self.client.get('/api/courses/', {'page_size': 100})
+        self.course.instructors.add(self.outsider)
+        courses = self.client.get('/api/courses/', {'page_size': 100}).data['results']
+        row = next(row for row in courses if row['id'] == self.course.pk)
+        self.assertIn(self.outsider.pk, [instructor['id'] for instructor in row['instructors_details']])
+
+    @override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+    def test_per_process_cache_is_refused_for_several_processes(self):
+        check_shared(1, 'runserver')
+        with self.assertRaises(ImproperlyConfigured), mock.patch.dict(os.environ, {'WEB_CONCURRENCY': '4'}):
+            check_web_workers()
+        with self.assertRaises(ImproperlyConfigured):
+            call_command('run_workers', once=True, threads=1, stdout=StringIO())
+
+
+class ConditionalGetTests(QueryBudgetTestCase):
+    def assertNotModified(self, url, queries):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        validators = {'HTTP_IF_NONE_MATCH': response['ETag']}
+        if 'Last-Modified' in response:
+            validators = {'HTTP_IF_MODIFIED_SINCE': response['Last-Modified']}
+        with CaptureQueriesContext(connection) as ctx:
+            cached = self.client.get(url, **validators)
+        self.assertEqual(cached.status_code, 304)
+        self.assertEqual(cached.content, b'')
+        self.assertLessEqual(len(ctx), queries)
+        return response
+
+    def test_category_list(self):
+        self.login(self.student)
+        self.assertNotModified('/api/categories/', queries=0)
+
+    def test_category_detail(self):
+        self.login(self.student)
+        self.assertNotModified(f'/api/categories/{self.course.category_id}/', queries=1)
+
+    def test_course_list(self):
+        self.login(self.student)
+        self.assertNotModified('/api/courses/', queries=0)
+
+    def test_course_detail(self):
+        self.login(self.teacher)
+        self.assertNotModified(f'/api/courses/{self.course.pk}/', queries=2)
+
+    def test_lesson_list(self):
+        self.login(self.student)
+        self.assertNotModified('/api/lessons/', queries=1)
+
+    def test_etag_changes_after_write(self):
+        self.login(self.teacher)
+        url = f'/api/courses/{self.course.pk}/'
+        etag = self.client.get(url)['ETag']
+        self.course.instructors.add(self.outsider)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_lesson_list_changes_after_delete(self):
+        self.login(self.student)
+        etag = self.client.get('/api/lessons/')['ETag']
+        Lesson.objects.filter(pk=Lesson.objects.order_by('created_at').first().pk).delete()
+        self.assertEqual(self.client.get('/api/lessons/', HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_forbidden_before_not_modified(self):
+        self.login(self.teacher)
+        url = f'/api/courses/{self.course.pk}/'
+        etag = self.client.get(url)['ETag']
+        self.login(self.outsider)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 403)
+
+
+class InstructorMembershipTests(QueryBudgetTestCase):
+    def make_request(self, user):
+        request = Request(APIRequestFactory().get('/'))
+        request.user = user
+        return request
+
+    def test_lookup_is_shared_per_request(self):
+        request = self.make_request(self.teacher)
+        course = Course.objects.get(pk=self.course.pk)
+        with self.assertNumQueries(1):
+            self.assertTrue(IsAdminOrInstructor().has_object_permission(request, None, course))
+            self.assertTrue(is_course_instructor(request, course))
+            self.assertTrue(is_course_instructor(request, course))
+
+    def test_prefetched_instructors_need_no_query(self):
+        request = self.make_request(self.outsider)
+        course = Course.objects.prefetch_related('instructors').get(pk=self.course.pk)
+        with self.assertNumQueries(0):
+            self.assertFalse(is_course_instructor(request, course))
+
+    def test_delete_by_outsider(self):
+        self.login(self.outsider)
+        self.assertBudget('delete', f'/api/courses/{self.course.pk}/', queries=2, status=403)
+
+
+class AsyncReadTests(QueryBudgetTestCase):
+    def test_reads_are_async_writes_are_not(self):
+        view = resolve('/api/categories/').func
+        self.assertTrue(iscoroutinefunction(view))
+        self.assertIs(view.cls, views.category_list_create.cls)  # the API schema still documents the DRF view
+        self.login(self.student)
+        response = self.client.post('/api/categories/', {'title': 'New'}, format='json')
+        self.assertEqual(response.status_code, 403)  # DRF view: only admins create categories
+        with override_settings(LMS_ASYNC_READS=False):
+            self.assertIs(read_async(views.category_list_create, None), views.category_list_create)
+
+    def test_same_response_as_drf_view(self):
+        self.login(self.student)
+        urls = {
+            '/api/categories/': (views.category_list_create, {}),
+            f'/api/categories/{self.course.category_id}/': (views.category_detail, {'pk': self.course.category_id}),
+            '/api/courses/': (views.course_list_create, {}),
+            f'/api/courses/{self.course.pk}/': (views.course_detail, {'pk': self.course.pk}),
+            '/api/lessons/': (views.lesson_list_create, {}),
+            '/api/questions/': (views.questionanswer_list_create, {}),
+        }
+        for url, (view, kwargs) in urls.items():
+            response = self.client.get(url)
+            request = APIRequestFactory().get(url, HTTP_AUTHORIZATION=response.wsgi_request.META['HTTP_AUTHORIZATION'])
+            self.assertEqual(response.get('ETag'), view(request, **kwargs).get('ETag'), url)
+            cache.clear()  # data computed by each view, not read back from the response cache
+            expected = view(request, **kwargs)
+            self.assertEqual(response.status_code, expected.status_code, url)
+            self.assertEqual(json.loads(response.content), json.loads(expected.render().content), url)
+
+    def test_authentication_errors(self):
+        response = self.client.get('/api/courses/')
+        self.assertEqual((response.status_code, response['WWW-Authenticate']), (401, 'Bearer realm="api"'))
+        self.client.credentials(HTTP_AUTHORIZATION='Bearer nonsense')
+        response = self.client.get('/api/courses/')
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(response.json()['code'], 'token_not_valid')
+
+    def test_instructor_check(self):
+        self.login(self.outsider)
+        self.assertBudget('get', f'/api/courses/{self.course.pk}/', queries=3, status=403)
+        self.login(self.teacher)
+        self.assertBudget('get', f'/api/courses/{self.course.pk}/', queries=3)
+        request = Request(APIRequestFactory().get('/'))
+        request.user = self.outsider
+        course = Course.objects.prefetch_related('instructors').get(pk=self.course.pk)
+        with self.assertNumQueries(0):
+            self.assertFalse(async_to_sync(ais_course_instructor)(request, course))
+
+
+class BulkEnrollmentTests(QueryBudgetTestCase):
+    def test_course_with_students(self):
+        course = Course.objects.create(title='Launch', description='d', price=0, duration=1, is_active=True,
+                                       category=self.course.category)
+        students = list(User.objects.filter(role='student').values_list('pk', flat=True))
+        self.login(self.admin)
+        data = {'course_id': course.pk, 'students': students, 'price': 100}
+        # roles, courses, existing enrollments, then counts around the insert and the enrollment_count recount in a transaction
+        response = self.assertBudget('post', '/api/enrollments/bulk/', queries=9, status=201, data=data, format='json')
+        self.assertEqual(response.data, {'created': len(students), 'errors': []})
+        self.assertEqual(Enrollment.objects.filter(course_id=course, price=100).count(), len(students))
+
+    def test_rows_with_errors(self):
+        enrolled = Enrollment.objects.first()
+        free = Course.objects.exclude(enrollment__student_id=self.student).first()
+        rows = [
+            {'student_id': self.student.pk, 'course_id': free.pk, 'price': 10},
+            {'student_id': enrolled.student_id_id, 'course_id': enrolled.course_id_id},
+            {'student_id': self.teacher.pk, 'course_id': free.pk},
+            {'student_id': 999999, 'course_id': 999999},
+            {'student_id': self.student.pk, 'course_id': free.pk},
+            {'student_id': 'x', 'course_id': free.pk, 'price': -1},
+        ]
+        self.login(self.admin)
+        response = self.client.post('/api/enrollments/bulk/', {'enrollments': rows}, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['created'], 1)
+        self.assertEqual([error['index'] for error in response.data['errors']], [1, 2, 3, 4, 5])
+        self.assertEqual(set(response.data['errors'][2]['errors']), {'student_id', 'course_id'})
+        self.assertTrue(Enrollment.objects.filter(student_id=self.student, course_id=free, price=10).exists())
+
+    def test_chunked_insert(self):
+        course = Course.objects.create(title='Chunks', description='d', price=0, duration=1, is_active=True,
+                                       category=self.course.category)
+        rows = [{'student_id': pk, 'course_id': course.pk} for pk in User.objects.filter(role='student').values_list('pk', flat=True)]
+        created, errors = bulk_enroll(rows, chunk_size=7)
+        self.assertEqual((created, errors), (len(rows), []))
+        self.assertEqual(Enrollment.objects.filter(course_id=course).count(), len(rows))
+
+    def test_concurrent_enrollment_is_not_counted(self):
+        course = Course.objects.create(title='Race', description='d', price=0, duration=1, is_active=True,
+                                       category=self.course.category)
+        students = list(User.objects.filter(role='student').values_list('pk', flat=True)[:3])
+        atomic = transaction.atomic
+        raced = []
+
+        def after_another_request(*args, **kwargs):
+            # another request enrolls the first student between the checks and bulk_enroll's transaction
+            if not raced:
+                raced.append(Enrollment.objects.create(student_id_id=students[0], course_id=course, price=0))
+            return atomic(*args, **kwargs)
+
+        with mock.patch('core.bulk.transaction.atomic', after_another_request):
+            created, errors = bulk_enroll([{'student_id': pk, 'course_id': course.pk} for pk in students])
+        self.assertEqual((created, errors), (2, []))
+        self.assertEqual(Enrollment.objects.filter(course_id=course).count(), 3)
+
+    def test_invalid_payload(self):
+        self.login(self.admin)
+        response = self.client.post('/api/enrollments/bulk/', {'course_id': self.course.pk}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_admin_only(self):
+        self.login(self.teacher)
+        data = {'course_id': self.course.pk, 'students': [self.student.pk]}
+        self.assertEqual(self.client.post('/api/enrollments/bulk/', data, format='json').status_code, 403)
+
+
+class ExportTests(QueryBudgetTestCase):
+    def read(self, response):
+        self.assertEqual(response.status_code, 200)
+        return b''.join(response.streaming_content).decode('utf-8')
+
+    def test_enrollments_ndjson(self):
+        self.login(self.admin)
+        with self.assertNumQueries(1):
+            rows = [json.loads(line) for line in self.read(self.client.get('/api/enrollments/export/')).splitlines()]
+        self.assertEqual(len(rows), Enrollment.objects.count())
+        first = Enrollment.objects.order_by('pk').select_related('student_id').first()
+        self.assertEqual(rows[0]['student_name'], first.student_id.username)
+
+    def test_enrollments_csv_filtered(self):
+        self.login(self.admin)
+        params = {'output': 'csv', 'course': self.course.pk, 'is_active': 'true', 'created_after': '2000-01-01'}
+        rows = list(csv.DictReader(StringIO(self.read(self.client.get('/api/enrollments/export/', params)))))
+        self.assertEqual(len(rows), Enrollment.objects.filter(course_id=self.course, is_active=True).count())
+        self.assertEqual({row['course_id'] for row in rows}, {str(self.course.pk)})
+
+    def test_teacher_gets_own_courses_only(self):
+        self.login(self.teacher)
+        rows = self.read(self.client.get('/api/questions/export/')).splitlines()
+        self.assertEqual(len(rows), QuestionAnswer.objects.filter(lesson_id__course_id__instructors=self.teacher).count())
+
+    def test_bad_filter(self):
+        self.login(self.admin)
+        self.assertEqual(self.client.get('/api/enrollments/export/', {'course': 'x'}).status_code, 400)
+        self.assertEqual(self.client.get('/api/enrollments/export/', {'output': 'xml'}).status_code, 400)
+        self.assertEqual(self.client.get('/api/enrollments/export/', {'created_after': 'soon'}).status_code, 400)
+
+    def test_students_cannot_export(self):
+        self.login(self.student)
+        self.assertEqual(self.client.get('/api/enrollments/export/').status_code, 403)
+
+    def test_users_export(self):
+        self.login(self.admin)
+        rows = [json.loads(line) for line in self.read(self.client.get('/api/user/export/', {'role': 'teacher'})).splitlines()]
+        self.assertEqual(len(rows), 10)
+        self.assertNotIn('password', rows[0])
+
+    async def test_streamed_a_chunk_at_a_time_under_asgi(self):
+        token = LMSTokenObtainPairSerializer.get_token(self.admin).access_token
+        with mock.patch('core.export.EXPORT_CHUNK_SIZE', 50):
+            response = await self.async_client.get('/api/enrollments/export/', headers={'Authorization': f'Bearer {token}'})
+            self.assertTrue(response.is_async)  # not read into a list by the ASGI handler
+            chunks = [chunk async for chunk in response.streaming_content]
+        self.assertGreater(len(chunks), 1)
+        lines = b''.join(chunks).decode('utf-8').splitlines()
+        self.assertEqual(len(lines), await Enrollment.objects.acount())
+
+    def test_command(self):
+        out = StringIO()
+        call_command('export_data', 'questions', '--output', 'csv', '--filter', f'lesson={Lesson.objects.first().pk}', stdout=out)
+        rows = list(csv.DictReader(StringIO(out.getvalue())))
+        self.assertEqual(len(rows), QuestionAnswer.objects.filter(lesson_id=Lesson.objects.first()).count())
+
+
+class CatalogImportTests(QueryBudgetTestCase):
+    def setUp(self):
+        super().setUp()
+        # lesson videos are referenced, not copied: the files must be in MEDIA_ROOT
+        for i in range(60):
+            for j in range(2):
+                if not default_storage.exists(f'lesson_videos/{i}-{j}.mp4'):
+                    default_storage.save(f'lesson_videos/{i}-{j}.mp4', BytesIO(b'video'))
+
+    def manifest(self, courses=5, lessons=2, teachers=('teacher000000', 'teacher000001')):
+        rows = ['kind,ref,title,description,price,duration,is_active,category,instructors,course,video']
+        for i in range(courses):
+            rows.append(f'course,c{i},Imported {i},About {i},100,5,true,Partner,{"|".join(teachers)},,')
+            rows += [f'lesson,,Lesson {i}.{j},Part {j},,,,,,c{i},lesson_videos/{i}-{j}.mp4' for j in range(lessons)]
+        return ('\n'.join(rows) + '\n').encode('utf-8')
+
+    def test_endpoint(self):
+        self.login(self.admin)
+        upload = SimpleUploadedFile('catalog.csv', self.manifest(), content_type='text/csv')
+        response = self.client.post('/api/courses/import/', {'manifest': upload}, format='multipart')
+        self.assertEqual(response.status_code, 202)  # queued, nothing imported in the request
+        self.assertEqual((response.data['import']['rows_done'], response.data['import']['is_finished']), (0, False))
+        self.assertNotIn('manifest', response.data['import'])
+        self.assertFalse(Course.objects.filter(title__startswith='Imported').exists())
+        status_url = response.data['status_url']
+        self.assertEqual(response['Location'], status_url)
+        upload = SimpleUploadedFile('catalog.csv', self.manifest(), content_type='text/csv')
+        self.client.post('/api/courses/import/', {'manifest': upload}, format='multipart')
+        self.assertEqual(Job.objects.filter(name='catalog_import').count(), 1)  # already queued
+
+        call_command('run_workers', once=True, threads=1, stdout=StringIO())
+        response = self.client.get(status_url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['import']['courses_created'], 5)
+        self.assertEqual(response.data['import']['lessons_created'], 10)
+        self.assertTrue(response.data['import']['is_finished'])
+        self.assertFalse(CatalogImport.objects.get().manifest)  # the stored file is deleted once imported
+        course = Course.objects.get(title='Imported 3')
+        self.assertEqual(course.category.title, 'Partner')
+        self.assertEqual(sorted(course.instructors.values_list('username', flat=True)), ['teacher000000', 'teacher000001'])
+        self.assertEqual(course.lesson_set.count(), 2)
+        # same file again: nothing left to do
+        upload = SimpleUploadedFile('catalog.csv', self.manifest(), content_type='text/csv')
+        response = self.client.post('/api/courses/import/', {'manifest': upload}, format='multipart')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(Job.objects.filter(name='catalog_import').count(), 1)
+        self.assertEqual(Course.objects.filter(title__startswith='Imported').count(), 5)
+
+    def test_query_count_does_not_grow_with_rows(self):
+        Category.objects.create(title='Partner')
+
+        def run(courses):
+            with CaptureQueriesContext(connection) as queries:
+                import_catalog(File(BytesIO(self.manifest(courses=courses)), name=f'{courses}.csv'), chunk_size=1000)
+            return len(queries)
+        self.assertEqual(run(3), run(60))
+
+    def test_resume_after_failed_chunk(self):
+        data = self.manifest(courses=6, lessons=2)  # 18 rows, chunks of 6 rows = 2 courses each
+        original = Lesson.objects.bulk_create
+        calls = []
+
+        def failing(*args, **kwargs):
+            calls.append(1)
+            if len(calls) == 2:
+                raise RuntimeError('disk full')
+            return original(*args, **kwargs)
+
+        with mock.patch.object(Lesson.objects, 'bulk_create', side_effect=failing):
+            with self.assertRaises(RuntimeError):
+                import_catalog(File(BytesIO(data), name='catalog.csv'), chunk_size=6)
+        job = CatalogImport.objects.get()
+        self.assertEqual((job.rows_done, job.courses_created, job.is_finished), (6, 2, False))
+        self.assertEqual(Course.objects.filter(title__startswith='Imported').count(), 2)  # second chunk rolled back
+
+        job, resumed_from, errors = import_catalog(File(BytesIO(data), name='catalog.csv'), chunk_size=6)
+        self.assertEqual((resumed_from, job.rows_done, job.is_finished, errors), (6, 18, True, []))
+        self.assertEqual(Course.objects.filter(title__startswith='Imported').count(), 6)
+        self.assertEqual(Lesson.objects.filter(course_id__title__startswith='Imported').count(), 12)
+
+    def test_invalid_rows_are_reported(self):
+        lines = [
+            '{"kind": "course", "ref": "a", "title": "A", "description": "d", "price": 1, "duration": 1, "category": "Partner"}',
+            '{"kind": "course", "ref": "a", "title": "Again", "description": "d", "price": 1, "duration": 1, "category": "Partner"}',
+            '{"kind": "course", "ref": "b", "title": "B", "description": "d", "price": -1, "duration": 1, "category": "Partner"}',
+            '{"kind": "course", "ref": "c", "title": "C", "description": "d", "price": 1, "duration": 1, "category": "Partner", "instructors": ["nobody"]}',
+            '{"kind": "lesson", "course": "zzz", "title": "L", "description": "d"}',
+            '{"kind": "lesson", "course": "a", "title": "L", "description": "d"}',
+            'not json',
+        ]
+        data = '\n'.join(lines).encode() + b'\n{"kind": "lesson", "course": "a", "title": "caf\xe9", "description": "d"}\n'  # Latin-1
+        job, _, errors = import_catalog(File(BytesIO(data), name='catalog.ndjson'))
+        self.assertEqual((job.courses_created, job.lessons_created, job.error_count), (1, 1, 6))
+        self.assertEqual([error['row'] for error in errors], [2, 3, 4, 5, 7, 8])
+        self.assertIn('UTF-8', str(errors[-1]['errors']))
+        self.assertEqual(CatalogImport.objects.get().errors, errors)  # kept for the status endpoint
+
+    def test_undecodable_csv_row_is_reported(self):
+        data = self.manifest(courses=2, lessons=0).replace(b'About 1', b'Caf\xe9 1')
+        job, _, errors = import_catalog(File(BytesIO(data), name='catalog.csv'))
+        self.assertEqual((job.courses_created, [error['row'] for error in errors]), (1, [2]))
+
+    def test_video_paths_are_checked(self):
+        Lesson.objects.create(course_id=self.course, title='Taken', description='d', video='lesson_videos/0-1.mp4')
+        videos = [
+            'lesson_videos/0-0.mp4', '../db.sqlite3', '/etc/passwd', 'lesson_videos/../uploads/x', './lesson_videos/0-0.mp4',
+            'lesson_videos//0-0.mp4', 'certificates/1.pdf', 'lesson_videos/missing.mp4', 'lesson_videos/0-1.mp4',
+        ]
+        lines = ['{"kind": "course", "ref": "a", "title": "A", "description": "d", "price": 1, "duration": 1, "category": "Partner"}']
+        lines += [json.dumps({'kind': 'lesson', 'course': 'a', 'title': 'L', 'description': 'd', 'video': video}) for video in videos]
+        job, _, errors = import_catalog(File(BytesIO('\n'.join(lines).encode()), name='catalog.ndjson'))
+        self.assertEqual((job.lessons_created, job.error_count), (1, len(videos) - 1))
+        self.assertEqual([error['row'] for error in errors], list(range(3, len(videos) + 2)))
+        self.assertIn('another course', str(errors[-1]['errors']['video']))
+
+    def test_command(self):
+        with tempfile.NamedTemporaryFile(suffix='.csv') as handle:
+            handle.write(self.manifest(courses=2))
+            handle.flush()
+            out = StringIO()
+            call_command('import_catalog', handle.name, stdout=out, stderr=StringIO())
+        self.assertIn('2 courses, 4 lessons', out.getvalue())
+
+    def test_admin_only(self):
+        self.login(self.teacher)
+        upload = SimpleUploadedFile('catalog.csv', self.manifest(), content_type='text/csv')
+        self.assertEqual(self.client.post('/api/courses/import/', {'manifest': upload}, format='multipart').status_code, 403)
+        job = CatalogImport.objects.create(digest='0' * 64)
+        self.assertEqual(self.client.get(f'/api/courses/import/{job.pk}/').status_code, 403)
+
+
+class SparseFieldsetTests(QueryBudgetTestCase):
+    def test_course_fields(self):
+        self.login(self.admin)
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.assertBudget('get', '/api/courses/?fields=id,title', queries=1)  # no instructors prefetch
+        self.assertEqual(set(response.data['results'][0]), {'id', 'title'})
+        self.assertNotIn('description', ctx.captured_queries[0]['sql'])
+        # the cursor still works when the ordering columns are not serialized
+        second = self.client.get(response.data['next'])
+        self.assertEqual(second.status_code, 200)
+        self.assertNotEqual(second.data['results'][0]['id'], response.data['results'][0]['id'])
+
+    def test_course_expand(self):
+        self.login(self.admin)
+        response = self.assertBudget('get', '/api/courses/?fields=id,title&expand=category', queries=1)
+        row = response.data['results'][0]
+        self.assertEqual(set(row), {'id', 'title', 'category'})
+        self.assertEqual(row['category']['title'], Course.objects.get(pk=row['id']).category.title)
+
+    def test_course_detail_fields(self):
+        self.login(self.admin)
+        response = self.assertBudget('get', f'/api/courses/{self.course.pk}/?fields=id,instructors_details', queries=2)
+        self.assertEqual(set(response.data), {'id', 'instructors_details'})
+
+    def test_enrollment_expand(self):
+        self.login(self.admin)
+        # course_id is joined, its instructors come from one prefetch
+        response = self.assertBudget('get', '/api/enrollments/?expand=course_id,student_id', queries=2)
+        self.assertIn('instructors_details', response.data['results'][0]['course_id'])
+        self.assertEqual(set(response.data['results'][0]['student_id']), {'id', 'username', 'role'})
+
+    def test_expanded_users_are_public(self):
+        # any authenticated user lists questions: other students' names and phone numbers stay out
+        self.login(self.student)
+        response = self.client.get('/api/questions/', {'expand': 'user_id'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(set(response.data['results'][0]['user_id']), {'id', 'username', 'role'})
+
+    def test_question_fields(self):
+        self.login(self.admin)
+        response = self.assertBudget('get', '/api/questions/?fields=id,lesson_title', queries=1)
+        self.assertEqual(set(response.data['results'][0]), {'id', 'lesson_title'})
+
+    def test_unknown_names(self):
+        self.login(self.admin)
+        self.assertEqual(self.client.get('/api/courses/?fields=id,nope').status_code, 400)
+        self.assertEqual(self.client.get('/api/courses/?expand=title').status_code, 400)
+
+    def test_writes_ignore_fields(self):
+        self.login(self.admin)
+        data = {
+            'title': 'Sparse', 'description': 'd', 'price': 1, 'duration': 1, 'is_active': True,
+            'category': self.course.category_id, 'instructors': [self.teacher.pk],
+        }
+        response = self.client.post('/api/courses/?fields=id', data, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertIn('title', response.data)
+
+
+class CounterTests(QueryBudgetTestCase):
+    def assertCountersExact(self):
+        for name, counter in COUNTERS.items():
+            self.assertEqual(counter.drifted().count(), 0, name)
+
+    def test_seeded_counters(self):
+        self.assertCountersExact()
+        self.course.refresh_from_db()
+        self.assertEqual(self.course.enrollment_count, Enrollment.objects.filter(course_id=self.course).count())
+
+    def test_category_list_reads_the_column(self):
+        self.login(self.admin)
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get('/api/categories/')
+        self.assertNotIn('COUNT(', ctx.captured_queries[0]['sql'].upper())
+        self.assertNotIn('JOIN', ctx.captured_queries[0]['sql'].upper())
+        row = next(row for row in response.data if row['id'] == self.course.category_id)
+        self.assertEqual(row['courses_count'], Course.objects.filter(category_id=self.course.category_id).count())
+
+    def test_api_writes(self):
+        free = Course.objects.exclude(enrollment__student_id=self.student).first()
+        lesson = Lesson.objects.filter(course_id=free).first()
+        self.login(self.student)
+        self.client.post('/api/enrollments/', {'student_id': self.student.pk, 'course_id': free.pk, 'price': 0})
+        self.client.post('/api/questions/', {'user_id': self.student.pk, 'lesson_id': lesson.pk, 'description': 'q'})
+        self.login(self.admin)
+        other = Category.objects.exclude(pk=self.course.category_id).first()
+        data = {
+            'title': self.course.title, 'description': 'd', 'price': 1, 'duration': 1, 'is_active': True,
+            'category': other.pk, 'instructors': [self.teacher.pk],
+        }
+        self.assertEqual(self.client.put(f'/api/courses/{self.course.pk}/', data, format='json').status_code, 200)
+        self.assertEqual(self.client.delete(f'/api/courses/{free.pk}/').status_code, 204)
+        self.assertCountersExact()
+
+    def test_counters_are_read_only(self):
+        self.login(self.admin)
+        response = self.client.put(f'/api/categories/{self.course.category_id}/', {'title': 'T', 'courses_count': 999})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response.data['courses_count'], 999)
+
+    def test_deletes(self):
+        Enrollment.objects.filter(course_id=self.course).first().delete()
+        QuestionAnswer.objects.filter(pk__in=QuestionAnswer.objects.order_by('pk').values('pk')[:25]).delete()
+        Lesson.objects.filter(course_id=self.course).first().delete()
+        User.objects.filter(role='student').exclude(pk=self.student.pk).first().delete()
+        self.assertCountersExact()
+
+    def test_bulk_enroll(self):
+        course = Course.objects.create(title='Bulk', description='d', price=0, duration=1, is_active=True,
+                                       category=self.course.category)
+        bulk_enroll([{'student_id': pk, 'course_id': course.pk} for pk in User.objects.filter(role='student').values_list('pk', flat=True)])
+        self.assertCountersExact()
+
+    def test_counter_change_keeps_the_catalog_cache(self):
+        self.login(self.student)
+        free = Course.objects.exclude(enrollment__student_id=self.student).first()
+        version, updated_at, count = get_version('courses'), free.updated_at, free.enrollment_count
+        with mock.patch('core.async_views.counts_period', return_value=1):
+            first = self.client.get('/api/courses/', {'page_size': 100})
+            Enrollment.objects.create(student_id=self.student, course_id=free, price=0)
+            self.assertEqual(get_version('courses'), version)
+            free.refresh_from_db()
+            self.assertEqual((free.updated_at, free.enrollment_count), (updated_at, count + 1))
+            again = self.assertBudget('get', '/api/courses/', queries=0, data={'page_size': 100})
+            self.assertEqual(again['ETag'], first['ETag'])  # counts may lag by one period
+        with mock.patch('core.async_views.counts_period', return_value=2):
+            later = self.assertBudget('get', '/api/courses/', queries=1, data={'page_size': 100})  # the counts only
+        self.assertNotEqual(later['ETag'], first['ETag'])
+        row = next(row for row in later.data['results'] if row['id'] == free.pk)
+        self.assertEqual(row['enrollment_count'], count + 1)
+
+    def test_counter_change_changes_detail_etags(self):
+        self.login(self.admin)
+        url = f'/api/courses/{self.course.pk}/'
+        course_etag, lessons_etag = self.client.get(url)['ETag'], self.client.get('/api/lessons/')['ETag']
+        Enrollment.objects.create(student_id=User.objects.create_user('late', role='student'), course_id=self.course, price=0)
+        QuestionAnswer.objects.create(user_id=self.student, lesson_id=Lesson.objects.first(), description='q')
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=course_etag).status_code, 200)
+        self.assertEqual(self.client.get('/api/lessons/', HTTP_IF_NONE_MATCH=lessons_etag).status_code, 200)
+
+    def test_reconcile(self):
+        Course.objects.filter(pk=self.course.pk).update(enrollment_count=12345)
+        Lesson.objects.update(question_count=0)
+        out = StringIO()
+        call_command('reconcile_counters', '--dry-run', stdout=out)
+        self.assertRegex(out.getvalue(), r'Course.enrollment_count +1 drifted')
+        call_command('reconcile_counters', stdout=StringIO())
+        self.assertCountersExact()
+
+
+class LessonVideoTests(QueryBudgetTestCase):
+    VIDEO = bytes(range(256)) * 400  # 102400 bytes
+
+    def setUp(self):
+        super().setUp()
+        os.makedirs(os.path.join(TEST_MEDIA_ROOT, 'lesson_videos'), exist_ok=True)
+        with open(os.path.join(TEST_MEDIA_ROOT, 'lesson_videos', 'seed.mp4'), 'wb') as handle:
+            handle.write(self.VIDEO)
+        self.enrollment = Enrollment.objects.filter(is_active=True).select_related('student_id').first()
+        self.lesson = Lesson.objects.filter(course_id=self.enrollment.course_id_id).first()
+
+    def read(self, response):
+        try:
+            return b''.join(response.streaming_content)
+        finally:
+            response.close()
+
+    def signed_url(self, user):
+        self.login(user)
+        response = self.client.get(f'/api/lessons/{self.lesson.pk}/video/url/')
+        self.assertEqual(response.status_code, 200)
+        self.client.credentials()  # the signed URL works without the JWT, like a <video src>
+        return response.data['url']
+
+    def test_signed_range_without_queries(self):
+        url = self.signed_url(self.enrollment.student_id)
+        with self.assertNumQueries(0):
+            response = self.client.get(url, HTTP_RANGE='bytes=1000-1999')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], f'bytes 1000-1999/{len(self.VIDEO)}')
+        self.assertEqual(response['Content-Length'], '1000')
+        self.assertEqual(self.read(response), self.VIDEO[1000:2000])
+
+    def test_range_forms(self):
+        url = self.signed_url(self.enrollment.student_id)
+        response = self.client.get(url, HTTP_RANGE='bytes=-100')
+        self.assertEqual(self.read(response), self.VIDEO[-100:])
+        response = self.client.get(url, HTTP_RANGE='bytes=102000-')
+        self.assertEqual(self.read(response), self.VIDEO[102000:])
+        response = self.client.get(url)
+        self.assertEqual((response.status_code, response['Accept-Ranges']), (200, 'bytes'))
+        self.assertEqual(self.read(response), self.VIDEO)
+        response = self.client.get(url, HTTP_RANGE='bytes=999999-')
+        self.assertEqual((response.status_code, response['Content-Range']), (416, f'bytes */{len(self.VIDEO)}'))
+        # a stale If-Range gets the whole file
+        response = self.client.get(url, HTTP_RANGE='bytes=0-9', HTTP_IF_RANGE='"stale"')
+        self.assertEqual(response.status_code, 200)
+        response.close()
+
+    def test_bad_tokens(self):
+        url = self.signed_url(self.enrollment.student_id)
+        self.assertEqual(self.client.get(url + 'x').status_code, 403)
+        other = Lesson.objects.exclude(pk=self.lesson.pk).first()
+        token = url.split('token=')[1]
+        self.assertEqual(self.client.get(f'/api/lessons/{other.pk}/video/?token={token}').status_code, 403)
+        with override_settings(LMS_MEDIA={'VIDEO_URL_TTL': -1}):
+            self.assertEqual(self.client.get(url).status_code, 403)
+
+    def test_access_rules(self):
+        stranger = User.objects.filter(role='student').exclude(enrollment__course_id=self.enrollment.course_id_id).first()
+        self.login(stranger)
+        self.assertEqual(self.client.get(f'/api/lessons/{self.lesson.pk}/video/url/').status_code, 403)
+        self.assertEqual(self.client.get(f'/api/lessons/{self.lesson.pk}/video/').status_code, 403)
+        self.login(self.enrollment.course_id.instructors.first())
+        response = self.client.get(f'/api/lessons/{self.lesson.pk}/video/', HTTP_RANGE='bytes=0-0')
+        self.assertEqual(self.read(response), self.VIDEO[:1])
+        self.client.credentials()
+        self.assertEqual(self.client.get(f'/api/lessons/{self.lesson.pk}/video/').status_code, 401)
+
+    def test_stored_name_stays_in_media_root(self):
+        outside = os.path.relpath(__file__, TEST_MEDIA_ROOT)  # a real file, outside MEDIA_ROOT
+        Lesson.objects.filter(pk=self.lesson.pk).update(video=outside)
+        self.login(self.enrollment.student_id)
+        self.assertEqual(self.client.get(f'/api/lessons/{self.lesson.pk}/video/').status_code, 404)
+
+    @override_settings(LMS_MEDIA={'OFFLOAD': 'nginx'})
+    def test_nginx_offload(self):
+        self.login(self.enrollment.student_id)
+        response = self.client.get(f'/api/lessons/{self.lesson.pk}/video/', HTTP_RANGE='bytes=0-99')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['X-Accel-Redirect'], '/protected-media/lesson_videos/seed.mp4')
+        self.assertEqual(response.content, b'')
+        default_storage.save('lesson_videos/week 1 #2?100%.mp4', BytesIO(self.VIDEO))
+        Lesson.objects.filter(pk=self.lesson.pk).update(video='lesson_videos/week 1 #2?100%.mp4')
+        response = self.client.get(f'/api/lessons/{self.lesson.pk}/video/')
+        self.assertEqual(response['X-Accel-Redirect'], '/protected-media/lesson_videos/week%201%20%232%3F100%25.mp4')
+
+    def test_public_media_skips_videos(self):
+        request = RequestFactory().get('/media/lesson_videos/seed.mp4')
+        for path in ('lesson_videos/seed.mp4', '/lesson_videos/seed.mp4', './lesson_videos/seed.mp4',
+                     'x/../lesson_videos/seed.mp4', 'lesson_videos//seed.mp4', 'LESSON_VIDEOS/seed.mp4', 'lesson_videos'):
+            with self.assertRaises(Http404, msg=path):
+                serve_public_media(request, path, document_root=TEST_MEDIA_ROOT)
+        with open(os.path.join(TEST_MEDIA_ROOT, 'banner.txt'), 'w') as handle:
+            handle.write('ok')
+        response = serve_public_media(request, 'banner.txt', document_root=TEST_MEDIA_ROOT)
+        self.assertEqual(response.status_code, 200)
+        response.close()
+
+
+class UploadTests(QueryBudgetTestCase):
+    DATA = os.urandom(250_000)
+
+    def setUp(self):
+        super().setUp()
+        self.lesson = Lesson.objects.filter(course_id=self.course).first()
+        self.login(self.teacher)
+
+    def start(self, **extra):
+        data = {'target': 'lesson_video', 'object_id': self.lesson.pk, 'filename': 'C:\\videos\\intro.mp4',
+                'size': len(self.DATA), 'sha256': hashlib.sha256(self.DATA).hexdigest(), **extra}
+        response = self.client.post('/api/uploads/', data, format='json')
+        self.assertEqual(response.status_code, 201, response.data)
+        return response.data
+
+    def put(self, upload_id, offset, chunk, checksum=None):
+        checksum = checksum or hashlib.sha256(chunk).hexdigest()
+        return self.client.put(
+            f'/api/uploads/{upload_id}/', chunk, content_type='application/offset+octet-stream',
+            HTTP_UPLOAD_OFFSET=str(offset), HTTP_UPLOAD_CHECKSUM=f'sha256 {checksum}',
+        )
+
+    def test_chunked_upload_with_resume(self):
+        upload = self.start()
+        self.assertEqual((upload['filename'], upload['received']), ('intro.mp4', 0))
+        self.assertEqual(self.put(upload['id'], 0, self.DATA[:100_000]).data['received'], 100_000)
+        # a corrupted chunk is rejected and cut off, the acknowledged offset stays
+        response = self.put(upload['id'], 100_000, self.DATA[100_000:200_000], checksum='0' * 64)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(os.path.getsize(part_path(Upload(pk=upload['id']))), 100_000)
+        response = self.client.get(f'/api/uploads/{upload["id"]}/')
+        self.assertEqual(response['Upload-Offset'], '100000')
+        # a chunk at the wrong offset gets 409 with where to resume
+        response = self.put(upload['id'], 50_000, self.DATA[50_000:60_000])
+        self.assertEqual(response.status_code, 409)
+        self.assertIn('100000', response.data['detail'])
+        # finalizing early is refused
+        self.assertEqual(self.client.post(f'/api/uploads/{upload["id"]}/finalize/').status_code, 400)
+
+        self.put(upload['id'], 100_000, self.DATA[100_000:200_000])
+        self.assertEqual(self.put(upload['id'], 200_000, self.DATA[200_000:]).data['received'], len(self.DATA))
+        response = self.client.post(f'/api/uploads/{upload["id"]}/finalize/')
+        self.assertEqual(response.status_code, 200, response.data)
+        self.lesson.refresh_from_db()
+        self.assertTrue(self.lesson.video.name.startswith('lesson_videos/intro'))
+        with open(os.path.join(TEST_MEDIA_ROOT, self.lesson.video.name), 'rb') as handle:
+            self.assertEqual(handle.read(), self.DATA)
+        self.assertFalse(os.path.exists(part_path(Upload(pk=upload['id']))))
+        self.assertEqual(self.client.post(f'/api/uploads/{upload["id"]}/finalize/').status_code, 409)
+
+    def test_checksum_of_whole_file(self):
+        upload = self.start(target='material_file', object_id=Material.objects.filter(course_id=self.course).first().pk,
+                            sha256='f' * 64)
+        self.put(upload['id'], 0, self.DATA)
+        response = self.client.post(f'/api/uploads/{upload["id"]}/finalize/')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('sha256', response.data)
+
+    def test_claimed_upload_conflicts(self):
+        upload = self.start()
+        Upload.objects.filter(pk=upload['id']).update(locked_until=timezone.now() + timedelta(minutes=1))
+        self.assertEqual(self.put(upload['id'], 0, self.DATA[:10]).status_code, 409)
+
+    def test_permissions(self):
+        self.login(self.outsider)
+        response = self.client.post('/api/uploads/', {'target': 'lesson_video', 'object_id': self.lesson.pk,
+                                                      'filename': 'a.mp4', 'size': 10}, format='json')
+        self.assertEqual(response.status_code, 403)
+        self.login(self.teacher)
+        upload = self.start()
+        self.login(self.outsider)
+        self.assertEqual(self.client.get(f'/api/uploads/{upload["id"]}/').status_code, 404)
+        self.login(self.student)
+        self.assertEqual(self.client.get(f'/api/uploads/{upload["id"]}/').status_code, 403)
+        self.login(self.admin)
+        self.assertEqual(self.client.delete(f'/api/uploads/{upload["id"]}/').status_code, 204)
+        self.assertFalse(Upload.objects.filter(pk=upload['id']).exists())
+
+    def test_prune(self):
+        upload = self.start()
+        Upload.objects.filter(pk=upload['id']).update(updated_at=timezone.now() - timedelta(days=2))
+        out = StringIO()
+        call_command('prune_uploads', stdout=out)
+        self.assertIn('Pruned 1', out.getvalue())
+        self.assertFalse(os.path.exists(part_path(Upload(pk=upload['id']))))
+
+
+class BannerVariantTests(QueryBudgetTestCase):
+    @staticmethod
+    def photo(width=2400, height=1600, color=(200, 40, 40)):
+        from PIL import Image
+        buffer = BytesIO()
+        Image.new('RGB', (width, height), color).save(buffer, 'JPEG', quality=95)
+        return SimpleUploadedFile('photo.jpg', buffer.getvalue(), content_type='image/jpeg')
+
+    def test_built_after_commit_not_in_request(self):
+        self.login(self.admin)
+        data = {'title': 'Banner course', 'description': 'd', 'price': 10, 'duration': 2, 'is_active': True,
+                'category': self.course.category_id, 'instructors': [self.teacher.pk], 'banner': self.photo()}
+        response = self.client.post('/api/courses/', data, format='multipart')
+        self.assertEqual(response.status_code, 201, response.data)
+        self.assertIsNone(response.data['banner_srcset'])  # the request didn't wait for resizing
+        course_id = response.data['id']
+        job = Job.objects.get(name='banner_variants')
+        self.assertEqual((job.status, job.payload), (Job.QUEUED, {'course_id': course_id}))
+
+        call_command('run_workers', once=True, threads=1, stdout=StringIO())
+        self.assertEqual(Job.objects.get(pk=job.pk).status, Job.DONE)
+        variants = Course.objects.get(pk=course_id).banner_variants
+        self.assertEqual(variants['widths'], [320, 640, 1280])
+        response = self.client.get(f'/api/courses/{course_id}/')
+        srcset = response.data['banner_srcset']
+        self.assertIn(f'/media/course_banners/variants/{variants["sha256"]}/320.webp 320w', srcset['webp'])
+        self.assertTrue(srcset['thumbnail'].endswith('/320.jpg'))
+        from PIL import Image
+        with Image.open(os.path.join(TEST_MEDIA_ROOT, 'course_banners', 'variants', variants['sha256'], '640.webp')) as image:
+            self.assertEqual(image.size, (640, 360))
+
+    def test_same_picture_is_resized_once(self):
+        photo = self.photo(color=(10, 120, 200))
+        first = Course.objects.create(title='a', description='d', price=1, duration=1, is_active=True,
+                                      category_id=self.course.category_id, banner=photo)
+        build_banner_variants(first.pk)
+        photo.seek(0)
+        second = Course.objects.create(title='b', description='d', price=1, duration=1, is_active=True,
+                                       category_id=self.course.category_id, banner=photo)
+        with mock.patch('core.images.render_variants') as render:
+            variants = build_banner_variants(second.pk)
+        render.assert_not_called()
+        self.assertEqual(variants['sha256'], Course.objects.get(pk=first.pk).banner_variants['sha256'])
+        self.assertNotEqual(variants['name'], Course.objects.get(pk=first.pk).banner_variants['name'])
+
+    def test_small_banner_is_not_upscaled(self):
+        course = Course.objects.create(title='c', description='d', price=1, duration=1, is_active=True,
+                                       category_id=self.course.category_id, banner=self.photo(700, 500, (0, 90, 0)))
+        self.assertEqual(build_banner_variants(course.pk)['widths'], [320, 640])
+        # a replaced banner makes the old variants stale until the command catches up
+        course.banner = self.photo(400, 300, (90, 0, 0))
+        course.save()
+        self.assertIsNone(CourseSerializer(Course.objects.get(pk=course.pk)).data['banner_srcset'])
+        out = StringIO()
+        call_command('build_banner_variants', course=[course.pk], stdout=out)
+        self.assertIn('Built variants for 1 banners', out.getvalue())
+        self.assertEqual(Course.objects.get(pk=course.pk).banner_variants['widths'], [320])
+
+
+@task('test_renewing')
+def renewing_task(steps):
+    # a long task: renews its lease between steps, then sees if another worker could take it over
+    for _ in range(steps):
+        renew_lease()
+    if claim('worker-b') is not None:
+        raise RuntimeError('claimed twice')
+
+
+@task('test_flaky')
+def flaky_task(fail_times):
+    # fails while the job is on one of its first fail_times attempts
+    if Job.objects.filter(name='test_flaky', attempts__lte=fail_times).exists():
+        raise RuntimeError('flaky')
+
+
+class JobQueueTests(QueryBudgetTestCase):
+    def run_once(self):
+        out = StringIO()
+        call_command('run_workers', once=True, threads=1, stdout=out)
+        return out.getvalue()
+
+    def test_retry_with_backoff_then_done(self):
+        job = enqueue('test_flaky', fail_times=1)
+        self.assertIn('test_flaky', TASKS)
+        out = self.run_once()
+        self.assertIn(f'test_flaky #{job.pk} queued', out)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (Job.QUEUED, 1))
+        self.assertIn('RuntimeError: flaky', job.last_error)
+        self.assertGreater(job.run_at, timezone.now() + timedelta(seconds=4))  # backoff, not due yet
+        self.assertEqual(self.run_once(), '')
+        Job.objects.filter(pk=job.pk).update(run_at=timezone.now())
+        self.assertIn('done', self.run_once())
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts, job.last_error), (Job.DONE, 2, ''))
+        self.assertIsNotNone(job.run_seconds)
+
+    def test_gives_up_after_max_attempts(self):
+        job = enqueue('test_flaky', fail_times=10)
+        for _ in range(job.max_attempts):
+            Job.objects.filter(pk=job.pk).update(run_at=timezone.now())
+            run_job(claim('test'))
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (Job.FAILED, job.max_attempts))
+        self.assertIsNone(claim('test'))
+
+    def test_lost_lease_is_claimed_again(self):
+        job = enqueue('test_flaky', fail_times=0)
+        first = claim('worker-a')
+        self.assertEqual(first.pk, job.pk)
+        self.assertIsNone(claim('worker-b'))  # leased
+        Job.objects.filter(pk=job.pk).update(locked_until=timezone.now() - timedelta(seconds=1))
+        second = claim('worker-b')
+        self.assertEqual((second.pk, second.attempts), (job.pk, 2))
+        run_job(first)  # the lost worker finishing late doesn't overwrite the new lease
+        self.assertEqual(Job.objects.get(pk=job.pk).locked_by, 'worker-b')
+        run_job(second)
+        self.assertEqual(Job.objects.get(pk=job.pk).status, Job.DONE)
+
+    def test_long_task_renews_its_lease(self):
+        job = enqueue('test_renewing', steps=2)
+        claimed = claim('worker-a')
+        Job.objects.filter(pk=job.pk).update(locked_until=timezone.now() - timedelta(seconds=1))  # ran out meanwhile
+        run_job(claimed)
+        self.assertEqual((claimed.status, claimed.last_error), (Job.DONE, ''))
+        renew_lease()  # outside a worker: nothing to renew
+
+    def test_lost_lease_stops_a_long_task(self):
+        job = enqueue('test_renewing', steps=2)
+        claimed = claim('worker-a')
+        Job.objects.filter(pk=job.pk).update(locked_by='worker-b', attempts=2)  # taken over
+        run_job(claimed)
+        self.assertIn(LeaseLost.__name__, claimed.last_error)
+        self.assertEqual(Job.objects.get(pk=job.pk).locked_by, 'worker-b')
+
+    def test_unknown_task_and_stats(self):
+        with self.assertRaises(KeyError):
+            enqueue('no_such_task')
+        Job.objects.create(name='removed_task', run_at=timezone.now())
+        enqueue('test_flaky', fail_times=0)
+        self.run_once()
+        self.assertEqual(Job.objects.get(name='removed_task').status, Job.FAILED)
+        out = StringIO()
+        call_command('run_workers', stats=True, stdout=out)
+        self.assertRegex(out.getvalue(), r'test_flaky\s+done\s+1 ')
+        self.assertRegex(out.getvalue(), r'removed_task\s+failed\s+1 ')
+
+
+class CertificateTests(QueryBudgetTestCase):
+    def setUp(self):
+        super().setUp()
+        self.completed = list(Enrollment.objects.filter(course_id=self.course, is_active=True).order_by('pk')[:5])
+        Enrollment.objects.filter(pk__in=[e.pk for e in self.completed]).update(is_completed=True, total_mark=87.5)
+
+    def test_chunks_and_rerun(self):
+        course_template.cache_clear()
+        # per chunk of 2: one read, one UPDATE; plus the read that finds nothing left
+        with self.assertNumQueries(7):
+            report = generate_certificates([self.course.pk], chunk_size=2, processes=1)
+        self.assertEqual(report['certificates'], 5)
+        self.assertIn('latency_p95', report)
+        self.assertEqual(course_template.cache_info().misses, 1)  # one template for the course
+        self.assertEqual(Enrollment.objects.filter(course_id=self.course, is_certificate_ready=True).count(), 5)
+        path = os.path.join(TEST_MEDIA_ROOT, 'certificates', str(self.course.pk), f'{self.completed[0].pk}.pdf')
+        with open(path, 'rb') as handle:
+            self.assertEqual(handle.read(5), b'%PDF-')
+        out = StringIO()
+        call_command('generate_certificates', course=[self.course.pk], processes=1, stdout=out)
+        self.assertIn('Nothing to do', out.getvalue())
+
+    def test_one_job_per_course(self):
+        other = Enrollment.objects.exclude(course_id=self.course).filter(is_active=True).first()
+        Enrollment.objects.filter(pk=other.pk).update(is_completed=True)
+        out = StringIO()
+        call_command('generate_certificates', enqueue=True, stdout=out)
+        self.assertIn('Queued 2 certificate jobs', out.getvalue())
+        self.assertEqual(
+            sorted(Job.objects.filter(name='generate_certificates').values_list('payload__course_id', flat=True)),
+            sorted([self.course.pk, other.course_id_id]),
+        )
+        call_command('generate_certificates', enqueue=True, stdout=out)  # already pending
+        self.assertIn('Nothing to queue', out.getvalue())
+        call_command('run_workers', once=True, threads=1, stdout=StringIO())
+        self.assertEqual(set(Job.objects.filter(name='generate_certificates').values_list('status', flat=True)), {Job.DONE})
+        self.assertEqual(Enrollment.objects.filter(is_certificate_ready=True).count(), 6)
+
+    def test_download(self):
+        generate_certificates([self.course.pk], processes=1)
+        enrollment = self.completed[0]
+        self.login(enrollment.student_id)
+        response = self.client.get(f'/api/enrollments/{enrollment.pk}/certificate/')
+        self.assertEqual((response.status_code, response['Content-Type']), (200, 'application/pdf'))
+        self.assertEqual(b''.join(response.streaming_content)[:5], b'%PDF-')
+        response.close()
+        self.login(self.completed[1].student_id)
+        self.assertEqual(self.client.get(f'/api/enrollments/{enrollment.pk}/certificate/').status_code, 404)
+        Enrollment.objects.filter(pk=enrollment.pk).update(is_certificate_ready=False)
+        self.login(enrollment.student_id)
+        self.assertEqual(self.client.get(f'/api/enrollments/{enrollment.pk}/certificate/').status_code, 404)
+
+
+class QuestionStreamTests(QueryBudgetTestCase):
+    def setUp(self):
+        super().setUp()
+        self.enrollment = Enrollment.objects.filter(is_active=True).select_related('student_id').first()
+        self.lesson = Lesson.objects.filter(course_id=self.enrollment.course_id_id).first()
+        self.login(self.enrollment.student_id)
+        self.url = self.client.get(f'/api/lessons/{self.lesson.pk}/questions/stream/url/').data['url']
+        self.client.credentials()  # EventSource: the signed URL only
+        self.questions = [
+            QuestionAnswer.objects.create(user_id=self.enrollment.student_id, lesson_id=self.lesson, description=f'q{n}')
+            for n in range(5)
+        ]
+
+    async def read(self, response):
+        return [chunk.decode() async for chunk in response.streaming_content]
+
+    def event_ids(self, **headers):
+        # MAX_SECONDS=0: the stream ends once it has caught up
+        with override_settings(LMS_FEEDS={'BACKLOG': 2, 'MAX_SECONDS': 0}):
+            response = self.client.get(self.url, **headers)
+            self.assertEqual(response['Content-Type'], 'text/event-stream')
+            body = ''.join(async_to_sync(self.read)(response))
+        return [int(line[4:]) for line in body.splitlines() if line.startswith('id: ')]
+
+    def test_access(self):
+        self.login(self.outsider)
+        self.assertEqual(self.client.get(f'/api/lessons/{self.lesson.pk}/questions/stream/url/').status_code, 403)
+        self.client.credentials()
+        self.assertEqual(self.client.get(f'/api/lessons/{self.lesson.pk}/questions/stream/?token=forged').status_code, 403)
+        other = Lesson.objects.exclude(pk=self.lesson.pk).first()
+        self.assertEqual(self.client.get(self.url.replace(f'/lessons/{self.lesson.pk}/', f'/lessons/{other.pk}/')).status_code, 403)
+
+    def test_access_is_checked_on_every_connect(self):
+        with override_settings(LMS_FEEDS={'MAX_SECONDS': 0}):
+            with self.assertNumQueries(2):  # the access check, the backlog
+                response = self.client.get(self.url)
+                self.assertEqual(response.status_code, 200)
+                async_to_sync(self.read)(response)
+            Enrollment.objects.filter(pk=self.enrollment.pk).update(is_active=False)
+            self.assertEqual(self.client.get(self.url).status_code, 403)  # the token is still valid
+            teacher = self.lesson.course_id.instructors.first()
+            self.login(teacher)
+            url = self.client.get(f'/api/lessons/{self.lesson.pk}/questions/stream/url/').data['url']
+            self.client.credentials()
+            self.assertEqual(self.client.get(url).status_code, 200)
+            self.lesson.course_id.instructors.remove(teacher)
+            self.assertEqual(self.client.get(url).status_code, 403)
+
+    def test_backlog_and_resume(self):
+        ids = QuestionAnswer.objects.filter(lesson_id=self.lesson, is_active=True).order_by('id').values_list('id', flat=True)
+        self.assertEqual(self.event_ids(), list(ids)[-2:])  # a new stream: the latest BACKLOG
+        cursor = self.questions[0].pk
+        self.assertEqual(self.event_ids(HTTP_LAST_EVENT_ID=str(cursor)), [pk for pk in ids if pk > cursor])  # in BACKLOG steps
+        self.assertEqual(self.client.get(self.url, HTTP_LAST_EVENT_ID='abc').status_code, 400)
+
+    def test_new_question_is_published_after_commit(self):
+        with mock.patch('core.signals.publish_question') as publish, self.captureOnCommitCallbacks(execute=True):
+            question = QuestionAnswer.objects.create(user_id=self.enrollment.student_id, lesson_id=self.lesson, description='new')
+        publish.assert_called_once_with(question)
+
+    def test_push_does_not_hide_a_lower_id_from_another_process(self):
+        last = self.questions[-1].pk
+
+        def commit():
+            # `pushed` from this process, `elsewhere` committed by another one (no publish) with a lower id
+            pushed = QuestionAnswer.objects.create(id=last + 10, user_id=self.enrollment.student_id, lesson_id=self.lesson, description='pushed')
+            QuestionAnswer.objects.create(id=last + 5, user_id=self.enrollment.student_id, lesson_id=self.lesson, description='elsewhere')
+            publish_question(QuestionAnswer.objects.select_related('user_id', 'lesson_id').get(pk=pushed.pk))
+
+        async def scenario():
+            stream = question_stream(self.lesson.pk, last)
+            frames = [await anext(stream)]  # retry: subscribed
+            waiting = asyncio.ensure_future(anext(stream))
+            await asyncio.sleep(0)  # its backlog read is queued before commit()
+            await sync_to_async(commit)()
+            frames.append(await waiting)
+            while 'elsewhere' not in frames[-1]:
+                frames.append(await anext(stream))
+            await stream.aclose()
+            return [int(frame.split('\n')[0][4:]) for frame in frames if frame.startswith('id: ')]
+
+        with override_settings(LMS_FEEDS={'POLL_SECONDS': 0.2, 'MAX_SECONDS': 5}):
+            self.assertEqual(async_to_sync(scenario)(), [last + 10, last + 5])  # the push, then the next index read
+
+    def test_fan_out_drops_the_slowest(self):
+        question = QuestionAnswer.objects.select_related('user_id', 'lesson_id').get(pk=self.questions[-1].pk)
+
+        async def scenario():
+            fast, slow = hub.subscribe(self.lesson.pk), hub.subscribe(self.lesson.pk)
+            try:
+                received = []
+                for _ in range(3):
+                    self.assertEqual(publish_question(question), 2)  # serialized once, no query: select_related
+                    await asyncio.sleep(0)  # the loop delivers
+                    received.append(await fast.queue.get())
+                return received, slow.dropped, slow.queue.qsize()
+            finally:
+                hub.unsubscribe(self.lesson.pk, fast)
+                hub.unsubscribe(self.lesson.pk, slow)
+
+        with override_settings(LMS_FEEDS={'QUEUE_SIZE': 2}):
+            received, dropped, pending = asyncio.run(scenario())
+        self.assertEqual([question_id for question_id, _ in received], [question.pk] * 3)
+        self.assertIn('"description": "q4"', received[0][1])
+        self.assertTrue(dropped)
+        self.assertEqual(pending, 1)  # only the DROPPED marker: its stream ends, the client resumes with Last-Event-ID
+        self.assertFalse(hub.has_subscribers(self.lesson.pk))
+
+
+@override_settings(LMS_PROGRESS={'FLUSH_THREAD': False})  # flushes happen where the tests call them
+class LessonProgressTests(QueryBudgetTestCase):
+    def setUp(self):
+        super().setUp()
+        progress_buffer.take()  # the buffer is per process, start empty
+        self.enrollment = Enrollment.objects.filter(is_active=True).select_related('student_id').first()
+        self.lessons = list(Lesson.objects.filter(course_id=self.enrollment.course_id_id).order_by('pk'))
+        self.login(self.enrollment.student_id)
+
+    def beat(self, lesson, position, duration=600, **extra):
+        return self.client.post('/api/progress/', {'lesson': lesson.pk, 'position': position, 'duration': duration, **extra},
+                                format='json')
+
+    def test_heartbeats_are_buffered_and_coalesced(self):
+        with self.assertNumQueries(0):
+            for position in range(0, 300, 5):
+                self.assertEqual(self.beat(self.lessons[0], position).status_code, 202)
+        self.assertFalse(LessonProgress.objects.exists())
+        response = self.client.get('/api/progress/', {'lesson': self.lessons[0].pk})
+        self.assertEqual(response.data[0]['position'], 295)  # unflushed, from the buffer
+        self.assertEqual(flush_progress(), (1, 0))
+        row = LessonProgress.objects.get()
+        self.assertEqual((row.position, row.is_completed, row.course_id), (295, False, self.enrollment.course_id_id))
+
+    def test_flush_is_batched(self):
+        students = list(Enrollment.objects.filter(course_id=self.enrollment.course_id_id, is_active=True)
+                        .values_list('student_id', flat=True)[:10])
+        for student in students:
+            for lesson in self.lessons:
+                progress_buffer.add(student, lesson.pk, 590, 600)
+        other = Lesson.objects.exclude(course_id__enrollment__student_id=students[0]).first()
+        progress_buffer.add(students[0], other.pk, 10, 600)
+        # lessons, enrollments, completed before, upsert, recount; + the savepoint pair of atomic()
+        with self.assertNumQueries(7):
+            written, recounted = flush_progress()
+        self.assertEqual((written, recounted), (len(students) * len(self.lessons), len(students)))  # not enrolled: dropped
+        enrollment = Enrollment.objects.get(student_id=students[0], course_id=self.enrollment.course_id_id)
+        self.assertEqual((enrollment.progress, enrollment.is_completed), (100, True))
+
+    def test_completion_is_sticky_and_incremental(self):
+        self.beat(self.lessons[0], 0, completed=True)
+        flush_progress()
+        self.enrollment.refresh_from_db()
+        self.assertEqual((self.enrollment.progress, self.enrollment.is_completed), (100 // len(self.lessons), False))
+        self.beat(self.lessons[0], 10)  # watching it again
+        self.assertEqual(flush_progress(), (1, 0))  # no recount: nothing newly completed
+        self.assertTrue(LessonProgress.objects.get(lesson=self.lessons[0]).is_completed)
+
+    def test_due_buffer_is_flushed_without_a_request(self):
+        self.beat(self.lessons[0], 30)
+        flusher = Flusher()
+        flusher.tick()  # not due yet
+        self.assertFalse(LessonProgress.objects.exists())
+        with override_settings(LMS_PROGRESS={'FLUSH_SECONDS': 0, 'FLUSH_THREAD': False}):
+            flusher.tick()
+        self.assertEqual(LessonProgress.objects.get().position, 30)
+        flusher.tick()  # nothing buffered
+
+    @override_settings(LMS_PROGRESS={'FLUSH_SECONDS': 0})
+    def test_due_buffer_wakes_the_flusher(self):
+        flusher = mock.Mock()
+        with mock.patch('core.progress.start_flusher', return_value=flusher), self.assertNumQueries(0):
+            self.assertEqual(self.beat(self.lessons[0], 30).status_code, 202)  # the request doesn't pay for the flush
+        flusher.wake.set.assert_called_once_with()
+        self.assertEqual(flush_progress(), (1, 0))
+
+    def test_exit_flush_failure_is_logged(self):
+        self.beat(self.lessons[0], 30)
+        with mock.patch('core.progress.write_progress', side_effect=RuntimeError('gone')), \
+                mock.patch('core.progress.connection'), self.assertLogs('core.progress', 'ERROR') as logs:
+            flush_on_exit()
+        self.assertIn('1 buffered positions lost', logs.output[0])
+
+    @override_settings(LMS_PROGRESS={'FLUSH_SECONDS': 0, 'FLUSH_THREAD': False})
+    def test_due_buffer_is_flushed_by_the_request(self):
+        response = self.client.post('/api/progress/', [
+            {'lesson': self.lessons[0].pk, 'position': 30, 'duration': 600},
+            {'lesson': self.lessons[1].pk, 'position': 900, 'duration': 600},  # clamped to the duration
+        ], format='json')
+        self.assertEqual(response.data, {'accepted': 2})
+        self.assertEqual(LessonProgress.objects.get(lesson=self.lessons[1]).position, 600)
+        self.assertEqual(self.client.post('/api/progress/', {'lesson': 0, 'position': -1}, format='json').status_code, 400)
+
+
+class SearchTests(QueryBudgetTestCase):
+    def setUp(self):
+        super().setUp()
+        self.login(self.student)
+        self.quantum = Course.objects.create(
+            title='Quantum <Basketweaving>', description='Weaving baskets.', price=10, duration=5,
+            is_active=True, category=self.course.category,
+        )
+        self.other = Course.objects.create(
+            title='Physics', description='A little quantum mechanics.', price=10, duration=5,
+            is_active=True, category=self.course.category,
+        )
+
+    def test_ranked_hits_with_escaped_highlights(self):
+        response = self.assertBudget('get', '/api/search/?q=quantum', queries=3)  # common words, rank window, hits
+        hits = response.data['results']
+        self.assertEqual([(hit['type'], hit['id']) for hit in hits], [('course', self.quantum.pk), ('course', self.other.pk)])
+        self.assertEqual(hits[0]['title'], '<mark>Quantum</mark> &lt;Basketweaving&gt;')  # a title match ranks first
+        self.assertIn('<mark>quantum</mark>', hits[1]['snippet'])
+        self.assertEqual(self.client.get('/api/search/?q=quan').data['results'][0]['id'], self.quantum.pk)  # prefix
+        self.assertEqual(self.client.get('/api/search/', {'q': 'quan '}).data['results'], [])  # a finished word
+        self.assertEqual(search('("quantum^'), search('quantum'))  # FTS5 syntax in the input is dropped, not an error
+
+    def test_index_follows_writes(self):
+        lesson = Lesson.objects.create(title='Entanglement', description='Spooky.', course_id=self.other, video='v.mp4')
+        QuestionAnswer.objects.bulk_create([QuestionAnswer(user_id=self.student, lesson_id=lesson, description='Is entanglement faster than light?')])
+        self.assertEqual({(hit['type'], hit['course']) for hit in search('entanglement')},
+                         {('lesson', self.other.pk), ('question', self.other.pk)})
+        self.assertEqual([hit['type'] for hit in search('entanglement', ['course', 'question'])], ['question'])
+        lesson.title = 'Superposition'
+        lesson.save()
+        self.assertEqual([hit['type'] for hit in search('entanglement')], ['question'])
+        Course.objects.filter(pk=self.other.pk).update(is_active=False)  # hides what is under the course too
+        self.assertEqual(search('superposition'), [])
+        self.assertEqual(search('mechanics'), [])
+        self.other.delete()
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT COUNT(*) FROM core_search WHERE course_id = %s', [self.other.pk])
+            self.assertEqual(cursor.fetchone()[0], 0)  # cascaded lessons and questions left the index
+        out = StringIO()
+        call_command('rebuild_search_index', stdout=out)
+        self.assertEqual(search('quantum')[0]['id'], self.quantum.pk)
+
+    def test_filters_and_pages(self):
+        Lesson.objects.create(title='Quantum lesson', description='', course_id=self.quantum, video='v.mp4')
+        response = self.client.get('/api/search/', {'q': 'quantum', 'type': 'lesson'})
+        self.assertEqual([hit['type'] for hit in response.data['results']], ['lesson'])
+        response = self.client.get('/api/search/', {'q': 'quantum', 'course': self.quantum.pk, 'page_size': 1})
+        self.assertEqual(len(response.data['results']), 1)
+        second = self.client.get(response.data['next'])
+        self.assertEqual(len(second.data['results']), 1)
+        self.assertIsNone(second.data['next'])
+        self.assertNotEqual(response.data['results'][0], second.data['results'][0])
+        for params in ({'q': ' '}, {'q': 'x', 'type': 'user'}, {'q': 'x', 'course': 'all'}, {'q': 'x', 'page': '0'}, {'q': 'x', 'page': '1000'}):
+            self.assertEqual(self.client.get('/api/search/', params).status_code, 400, params)
+
+    def test_broad_queries_are_bounded(self):
+        with override_settings(LMS_SEARCH={'COMMON_MATCHES': 1}):
+            # only common words: newest first, unranked
+            self.assertEqual([(hit['id'], hit['score']) for hit in search('quantum')], [(self.other.pk, None), (self.quantum.pk, None)])
+            # a common word is dropped when there is something more selective to rank on
+            hits = search('quantum weaving ')
+            self.assertEqual([hit['id'] for hit in hits], [self.quantum.pk])
+            self.assertIsNotNone(hits[0]['score'])
+        with override_settings(LMS_SEARCH={'RANK_WINDOW': 1}):
+            self.assertEqual([hit['id'] for hit in search('quantum')], [self.other.pk])  # the newest match only
+
+
+class SQLiteSettingsTests(TestCase):
+    def test_connection_setup(self):
+        if connection.vendor != 'sqlite':
+            self.skipTest('SQLite settings')
+        with connection.cursor() as cursor:
+            pragmas = {}
+            for name in ('synchronous', 'temp_store', 'cache_size', 'busy_timeout'):
+                cursor.execute(f'PRAGMA {name}')
+                pragmas[name] = cursor.fetchone()[0]
+        self.assertEqual(pragmas, {'synchronous': 1, 'temp_store': 2, 'cache_size': -20000, 'busy_timeout': 20000})
+        self.assertEqual(connection.transaction_mode, 'IMMEDIATE')  # atomic() takes the write lock at BEGIN
+
+
+@override_settings(LMS_REPLICAS={'ALIASES': ['replica'], 'PIN_SECONDS': 60})
+class ReplicaTests(TransactionTestCase):
+    # a second SQLite database, synced from default by the fixture: a replica that lags until sync_replica()
+    databases = {'default', 'replica'}
+    client_class = APIClient
+
+    def setUp(self):
+        cache.clear()
+        category = Category.objects.create(title='Synced', description='d')
+        course = Course.objects.create(title='Course', description='d', price=0, duration=1, is_active=True, category=category)
+        self.lesson = Lesson.objects.create(title='Lesson', description='d', course_id=course, video='v.mp4')
+        self.writer = User.objects.create_user('writer', 'writer@example.com', 'password', role='student')
+        self.reader = User.objects.create_user('reader', 'reader@example.com', 'password', role='student')
+        sync_replica('replica')
+
+    def login(self, user):
+        token = LMSTokenObtainPairSerializer.get_token(user).access_token
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+
+    def question_texts(self):
+        return [row['description'] for row in self.client.get('/api/questions/').data['results']]
+
+    def test_reads_from_replica_until_synced(self):
+        self.login(self.reader)
+        Category.objects.create(title='Fresh', description='d')
+        self.assertEqual([row['title'] for row in self.client.get('/api/categories/').data], ['Synced'])
+        sync_replica('replica')
+        cache.clear()
+        self.assertEqual(sorted(row['title'] for row in self.client.get('/api/categories/').data), ['Fresh', 'Synced'])
+
+    def test_writer_reads_own_writes(self):
+        self.login(self.writer)
+        response = self.client.post('/api/questions/', {'user_id': self.writer.pk, 'lesson_id': self.lesson.pk, 'description': 'mine'}, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(self.question_texts(), ['mine'])  # pinned to default
+        self.login(self.reader)
+        self.assertEqual(self.question_texts(), [])  # the replica lags
+        sync_replica('replica')
+        self.assertEqual(self.question_texts(), ['mine'])
+
+    def test_request_without_write_does_not_pin(self):
+        self.login(self.writer)
+        response = self.client.post('/api/questions/', {'lesson_id': self.lesson.pk}, format='json')
+        self.assertEqual(response.status_code, 400)
+        QuestionAnswer.objects.create(user_id=self.reader, lesson_id=self.lesson, description='elsewhere')
+        self.assertEqual(self.question_texts(), [])
+
+    def test_writes_and_transactions_use_default(self):
+        token = routing.set(Routing('replica'))
+        try:
+            category = Category.objects.get(title='Synced')
+            self.assertEqual(category._state.db, 'replica')
+            self.assertEqual(router.db_for_write(Category, instance=category), 'default')
+            category.title = 'Renamed'
+            category.save()
+            self.assertEqual(Category.objects.using('default').get(pk=category.pk).title, 'Renamed')
+            with transaction.atomic():
+                self.assertEqual(Category.objects.get(pk=category.pk).title, 'Renamed')  # read-modify-write on default
+            self.assertEqual(router.db_for_read(RevokedToken), 'default')  # PRIMARY_MODELS
+        finally:
+            routing.reset(token)
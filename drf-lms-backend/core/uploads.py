@@ -0,0 +1,199 @@
+# core, uploads.py:
+import hashlib
+import os
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+from django.db.models import Q
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.exceptions import APIException, ValidationError
+
+from .models import Lesson, Material, Upload
+
+"""
+Chunked, resumable uploads for Lesson.video and Material.file. Chunks are streamed from the
+request body straight into MEDIA_ROOT/uploads/<id>.part, never held in memory.
+
+POST   /api/uploads/                     {"target": "lesson_video", "object_id": 7, "filename": "intro.mp4",
+                                          "size": 4294967296, "sha256": "<optional, whole file>"}
+PUT    /api/uploads/<id>/                body = raw bytes, headers: Upload-Offset: <offset>
+                                                                     Upload-Checksum: sha256 <hex of this chunk>
+GET    /api/uploads/<id>/                {"received": ...} + Upload-Offset header, where to resume after a network error
+POST   /api/uploads/<id>/finalize/       moves the file into storage and sets lesson.video / material.file
+DELETE /api/uploads/<id>/                abandon
+
+- a chunk is acknowledged (received moves) only after its checksum matched and it was fsync'ed;
+  a failed or short chunk is cut off again, so the client just resends from the acknowledged offset
+- one chunk at a time per upload: the writer claims the upload with a conditional UPDATE
+  (received = offset and not locked), a second writer gets 409 with the current offset
+- python manage.py prune_uploads removes abandoned uploads
+"""
+
+DEFAULTS = {
+    'CHUNK_SIZE': 8 * 1024 * 1024,        # suggested to the client
+    'MAX_CHUNK_SIZE': 64 * 1024 * 1024,
+    'MAX_SIZE': 20 * 1024 * 1024 * 1024,  # 20 GB per file
+    'LOCK_SECONDS': 10 * 60,              # a chunk claim older than this was abandoned (client gone, worker killed)
+    'EXPIRE_SECONDS': 24 * 60 * 60,       # incomplete uploads untouched for this long are pruned
+}
+TARGETS = {
+    'lesson_video': (Lesson, 'video'),
+    'material_file': (Material, 'file'),
+}
+BLOCK_SIZE = 1024 * 1024
+
+
+def get_setting(name):
+    return getattr(settings, 'LMS_UPLOADS', {}).get(name, DEFAULTS[name])
+
+
+class UploadConflict(APIException):
+    status_code = status.HTTP_409_CONFLICT
+    default_detail = 'Another chunk is being written, or the offset is not the acknowledged one.'
+    default_code = 'upload_conflict'
+
+
+def part_path(upload):
+    return os.path.join(settings.MEDIA_ROOT, 'uploads', f'{upload.pk}.part')
+
+
+def get_target(upload):
+    model, field_name = TARGETS[upload.target]
+    return model.objects.filter(pk=upload.object_id).first(), field_name
+
+
+def start_upload(upload):
+    path = part_path(upload)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    open(path, 'wb').close()
+
+
+def claim(upload, **conditions):
+    # one conditional UPDATE: whoever matches the row first owns the upload until locked_until
+    now = timezone.now()
+    claimed = Upload.objects.filter(pk=upload.pk, is_complete=False, **conditions).filter(
+        Q(locked_until__isnull=True) | Q(locked_until__lt=now)
+    ).update(locked_until=now + timedelta(seconds=get_setting('LOCK_SECONDS')))
+    if not claimed:
+        upload.refresh_from_db(fields=['received'])
+        raise UploadConflict(f'Resume from offset {upload.received}.')
+
+
+def release(upload):
+    Upload.objects.filter(pk=upload.pk).update(locked_until=None)
+
+
+def write_chunk(upload, offset, stream, length, checksum):
+    """Appends length bytes of stream at offset, returns the new acknowledged offset."""
+    if upload.is_complete:
+        raise UploadConflict('Upload is already finalized.')
+    if length <= 0 or length > get_setting('MAX_CHUNK_SIZE'):
+        raise ValidationError({'Content-Length': [f'A chunk is 1 to {get_setting("MAX_CHUNK_SIZE")} bytes.']})
+    if offset + length > upload.size:
+        raise ValidationError({'Upload-Offset': ['Chunk goes past the declared size.']})
+
+    claim(upload, received=offset)
+    try:
+        digest = hashlib.sha256()
+        with open(part_path(upload), 'r+b') as part:
+            part.truncate(offset)  # leftovers of an earlier failed chunk
+            part.seek(offset)
+            remaining = length
+            while remaining:
+                block = stream.read(min(BLOCK_SIZE, remaining))
+                if not block:
+                    break
+                digest.update(block)
+                part.write(block)
+                remaining -= len(block)
+            if remaining or digest.hexdigest() != checksum:
+                part.truncate(offset)
+                raise ValidationError({'Upload-Checksum': ['Chunk is incomplete or its checksum does not match, resend it.']})
+            part.flush()
+            os.fsync(part.fileno())
+    except BaseException:
+        release(upload)
+        raise
+    Upload.objects.filter(pk=upload.pk).update(received=offset + length, locked_until=None, updated_at=timezone.now())
+    upload.received = offset + length
+    return upload.received
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as handle:
+        for block in iter(lambda: handle.read(BLOCK_SIZE), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def finalize_upload(upload):
+    """Moves the assembled file into the target's storage and attaches it, returns the Lesson/Material."""
+    if upload.is_complete:
+        raise UploadConflict('Upload is already finalized.')
+    if upload.received != upload.size:
+        raise ValidationError({'received': [f'{upload.received} of {upload.size} bytes received, upload the rest first.']})
+    claim(upload, received=upload.size)
+    try:
+        obj = attach(upload)
+    except BaseException:
+        release(upload)
+        raise
+    upload.is_complete = True
+    upload.locked_until = None
+    upload.save(update_fields=['is_complete', 'locked_until', 'updated_at'])
+    return obj
+
+
+def attach(upload):
+    path = part_path(upload)
+    if upload.sha256 and file_sha256(path) != upload.sha256:
+        raise ValidationError({'sha256': ['The assembled file does not match the declared checksum.']})
+    obj, field_name = get_target(upload)
+    if obj is None:
+        raise ValidationError({'object_id': ['The lesson or material no longer exists.']})
+
+    field = obj._meta.get_field(field_name)
+    storage = field.storage
+    name = field.generate_filename(obj, upload.filename)
+    if isinstance(storage, FileSystemStorage):
+        # same disk: a rename, not a multi-GB copy
+        name = storage.get_available_name(name, max_length=field.max_length)
+        os.makedirs(os.path.dirname(storage.path(name)), exist_ok=True)
+        os.replace(path, storage.path(name))
+    else:
+        with open(path, 'rb') as handle:
+            name = storage.save(name, File(handle), max_length=field.max_length)
+        os.remove(path)
+
+    setattr(obj, field_name, name)
+    obj.save(update_fields=[field_name, 'updated_at'])
+    return obj
+
+
+def discard_upload(upload):
+    try:
+        os.remove(part_path(upload))
+    except FileNotFoundError:
+        pass
+    upload.delete()
+
+
+def prune_uploads():
+    """Deletes uploads untouched for EXPIRE_SECONDS: abandoned ones with their part file, finished ones' rows."""
+    cutoff = timezone.now() - timedelta(seconds=get_setting('EXPIRE_SECONDS'))
+    stale = list(Upload.objects.filter(updated_at__lt=cutoff))
+    for upload in stale:
+        discard_upload(upload)
+    # part files whose row went with a cascade (a deleted user)
+    folder = os.path.join(settings.MEDIA_ROOT, 'uploads')
+    if os.path.isdir(folder):
+        known = {str(pk) for pk in Upload.objects.values_list('pk', flat=True)}
+        for entry in os.scandir(folder):
+            if (entry.name.endswith('.part') and entry.name[:-5] not in known
+                    and entry.stat().st_mtime < cutoff.timestamp()):
+                os.remove(entry.path)
+    return len(stale)
@@ -1,14 +1,31 @@
 from django.urls import path
-from .views import category_list_create, course_list_create, course_detail, lesson_list_create, material_list_create, enrollment_list_create, questionanswer_list_create, category_detail
+from . import async_views
+from .async_views import read_async
+from .views import category_list_create, course_list_create, course_detail, lesson_list_create, material_list_create, enrollment_list_create, enrollment_bulk_create, questionanswer_list_create, category_detail, enrollment_export, questionanswer_export, course_import, course_import_status, lesson_video, lesson_video_url, upload_create, upload_detail, upload_finalize, enrollment_certificate, lesson_progress, search_view, lesson_question_stream_url
 
 urlpatterns = [
-    path('categories/', category_list_create, name='category_list_create'),  # http://127.0.0.1:8000/api/categories/  + token
-	path('categories/<int:pk>/', category_detail, name='category_detail'), 
-    path('courses/', course_list_create, name='course_list_create'),  # http://127.0.0.1:8000/api/courses/
-    path('courses/<int:pk>/', course_detail, name='course_detail'),
-    path('lessons/', lesson_list_create, name='lesson_list_create'),
+    path('categories/', read_async(category_list_create, async_views.category_list), name='category_list_create'),  # http://127.0.0.1:8000/api/categories/  + token
+	path('categories/<int:pk>/', read_async(category_detail, async_views.category_detail), name='category_detail'), 
+    path('courses/', read_async(course_list_create, async_views.course_list), name='course_list_create'),  # http://127.0.0.1:8000/api/courses/
+    path('courses/<int:pk>/', read_async(course_detail, async_views.course_detail), name='course_detail'),
+    path('courses/import/', course_import, name='course_import'),  # POST multipart manifest=<catalog.csv|.ndjson>, 202
+    path('courses/import/<int:pk>/', course_import_status, name='course_import_status'),  # its progress
+    path('lessons/', read_async(lesson_list_create, async_views.lesson_list), name='lesson_list_create'),
+    path('lessons/<int:pk>/video/', lesson_video, name='lesson_video'),  # Range requests, ?token= from video/url/
+    path('lessons/<int:pk>/video/url/', lesson_video_url, name='lesson_video_url'),
+    path('lessons/<int:pk>/questions/stream/', async_views.lesson_question_stream, name='lesson_question_stream'),  # SSE, ?token= from stream/url/
+    path('lessons/<int:pk>/questions/stream/url/', lesson_question_stream_url, name='lesson_question_stream_url'),
+    path('progress/', lesson_progress, name='lesson_progress'),  # POST player heartbeats {"lesson", "position", "duration"}
+    path('search/', search_view, name='search'),  # ?q=django orm&type=course,lesson&course=3&page=2
     path('materials/', material_list_create, name='material_list_create'),
     path('enrollments/', enrollment_list_create, name='enrollment_list_create'),
-    path('questions/', questionanswer_list_create, name='questionanswer_list_create'),
+    path('enrollments/<int:pk>/certificate/', enrollment_certificate, name='enrollment_certificate'),  # PDF once generated
+    path('enrollments/bulk/', enrollment_bulk_create, name='enrollment_bulk_create'),  # POST {"course_id": 1, "students": [..]} or {"enrollments": [..]}
+    path('enrollments/export/', enrollment_export, name='enrollment_export'),  # ?output=csv&course=1&created_after=2025-01-01&is_active=true
+    path('questions/', read_async(questionanswer_list_create, async_views.questionanswer_list), name='questionanswer_list_create'),
+    path('questions/export/', questionanswer_export, name='questionanswer_export'),
+    path('uploads/', upload_create, name='upload_create'),  # POST {"target": "lesson_video", "object_id": 1, "filename": .., "size": ..}
+    path('uploads/<uuid:pk>/', upload_detail, name='upload_detail'),  # PUT a chunk: Upload-Offset + Upload-Checksum headers
+    path('uploads/<uuid:pk>/finalize/', upload_finalize, name='upload_finalize'),
 ]
 
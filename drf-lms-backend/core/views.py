@@ -3,12 +3,30 @@ from rest_framework.response import Response
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import IsAuthenticated, AllowAny, IsAdminUser, IsAuthenticatedOrReadOnly
 from rest_framework import status
-from .models import Category, Course, Lesson, Material, Enrollment, QuestionAnswer
+from .models import Category, Course, Lesson, Material, Enrollment, QuestionAnswer, Upload, LessonProgress, CatalogImport
 from .serializers import (
     CategorySerializer, CourseSerializer, LessonSerializer, MaterialSerializer,
-    EnrollmentSerializer, QuestionAnswerSerializer
+    EnrollmentSerializer, QuestionAnswerSerializer, BulkEnrollmentSerializer, CatalogImportSerializer,
+    UploadSerializer, ProgressEventSerializer, LessonProgressSerializer
 )
-from django.db.models import Count
+from .pagination import KeysetPagination
+from .bulk import bulk_enroll
+from .export import export_response
+from .imports import start_import
+from .media import sign_video, read_video_token, video_response
+from .feeds import sign_stream
+from .certificates import certificate_name
+from .progress import buffer as progress_buffer, record_heartbeats
+from .search import KINDS as SEARCH_KINDS, get_setting as get_search_setting, is_available as search_available, search
+from .uploads import get_setting as get_upload_setting, get_target, start_upload, write_chunk, finalize_upload, discard_upload
+from .cache import get_version, response_cache_key, get_cached_response, set_cached_response
+from .counters import counts_period, fresh_counts
+from .conditional import make_etag, table_validators, check_not_modified, set_validators
+from django.core.files.storage import default_storage
+from django.http import FileResponse
+from django.urls import reverse
+from django.utils.http import urlencode
+from rest_framework.utils.urls import replace_query_param
 from drf_yasg.utils import swagger_auto_schema
 from rest_framework import permissions
 
@@ -20,11 +38,25 @@ class IsAdminOrTeacher(permissions.BasePermission):
     def has_permission(self, request, view):
         return request.user.is_authenticated and request.user.role in ['admin', 'teacher']
 
+def is_course_instructor(request, course):
+    # One membership lookup per (request, course), shared by IsAdminOrInstructor and course_detail.
+    # Uses the prefetched instructors when the view loaded them, else an exists() on the through table.
+    memo = getattr(request, '_instructor_of', None)
+    if memo is None:
+        memo = request._instructor_of = {}
+    if course.pk not in memo:
+        prefetched = getattr(course, '_prefetched_objects_cache', {}).get('instructors')
+        if prefetched is not None:
+            memo[course.pk] = any(user.pk == request.user.pk for user in prefetched)
+        else:
+            memo[course.pk] = Course.instructors.through.objects.filter(course_id=course.pk, user_id=request.user.pk).exists()
+    return memo[course.pk]
+
 class IsAdminOrInstructor(permissions.BasePermission):
     def has_object_permission(self, request, view, obj):
         if request.user.role == 'admin':
             return True
-        return request.user in obj.instructors.all()
+        return is_course_instructor(request, obj)
 
 class IsAuthenticatedForGetOrAdminTeacherForPost(permissions.BasePermission):
     def has_permission(self, request, view):
@@ -43,10 +75,18 @@ class IsAuthenticatedForGetOrAdminTeacherForPost(permissions.BasePermission):
 @permission_classes([IsAuthenticated])
 def category_list_create(request):
     if request.method == 'GET':
-        #categories = Category.objects.all()
-        categories = Category.objects.annotate(courses_count=Count('course'))
-        serializer = CategorySerializer(categories, many=True, context={'request': request})
-        return Response(serializer.data)
+        etag = make_etag('categories', get_version('categories'))
+        not_modified = check_not_modified(request, etag=etag)
+        if not_modified:
+            return not_modified
+        cache_key = response_cache_key('categories', request)
+        data = get_cached_response(cache_key)
+        if data is None:
+            #categories = Category.objects.all()
+            categories = CategorySerializer.setup_queryset(Category.objects.all(), context={'request': request})
+            data = CategorySerializer(categories, many=True, context={'request': request}).data
+            set_cached_response(cache_key, data)
+        return set_validators(Response(data), etag=etag)
     elif request.method == 'POST':
         if request.user.role != 'admin':
             return Response({"detail": "Only admin can create categories."}, status=status.HTTP_403_FORBIDDEN)
@@ -68,8 +108,13 @@ def category_detail(request, pk):
         return Response({'detail': 'Category not found'}, status=404)
     
     if request.method == 'GET':
+        # courses_count doesn't move updated_at (core/counters.py): ETag only
+        etag = make_etag('category', category.pk, category.updated_at, category.courses_count)
+        not_modified = check_not_modified(request, etag=etag)
+        if not_modified:
+            return not_modified
         serializer = CategorySerializer(category, context={'request': request})
-        return Response(serializer.data)
+        return set_validators(Response(serializer.data), etag=etag)
     
     elif request.method == 'PUT':
         if request.user.role != 'admin':
@@ -100,10 +145,24 @@ def category_detail(request, pk):
 @permission_classes([IsAuthenticatedForGetOrAdminTeacherForPost])  # Fixed permission class
 def course_list_create(request):
     if request.method == 'GET':
-        # All authenticated users can see the course list        
-        courses = Course.objects.all().order_by('category__title', 'title')  # Sort by category title, then course title
-        serializer = CourseSerializer(courses, many=True, context={'request': request})
-        return Response(serializer.data)
+        # All authenticated users can see the course list, so one cached page serves everybody;
+        # its enrollment and lesson counts are refreshed separately, once per counts period
+        period = counts_period()
+        etag = make_etag('courses', get_version('courses'), period)
+        not_modified = check_not_modified(request, etag=etag)
+        if not_modified:
+            return not_modified
+        cache_key = response_cache_key('courses', request)
+        data = get_cached_response(cache_key)
+        built = data is None
+        if built:
+            courses = CourseSerializer.setup_queryset(Course.objects.all(), context={'request': request})
+            paginator = KeysetPagination(ordering=('category__title', 'title'))  # Sort by category title, then course title
+            page = paginator.paginate_queryset(courses, request)
+            serializer = CourseSerializer(page, many=True, context={'request': request})
+            data = paginator.get_paginated_response(serializer.data).data
+            set_cached_response(cache_key, data)
+        return set_validators(Response(fresh_counts('courses', request, data, period, built)), etag=etag)
     
     elif request.method == 'POST':
         # Only admins and teachers can create courses
@@ -123,8 +182,13 @@ def course_list_create(request):
 @api_view(['GET', 'PUT', 'DELETE'])
 @permission_classes([IsAuthenticated, IsAdminOrInstructor])
 def course_detail(request, pk):
+    courses = Course.objects.all()
+    if request.method == 'GET':
+        courses = CourseSerializer.setup_queryset(
+            courses, context={'request': request}, required=('updated_at', 'enrollment_count', 'lesson_count'),
+        )
     try:
-        course = Course.objects.get(pk=pk)
+        course = courses.get(pk=pk)
     except Course.DoesNotExist:
         return Response({'detail': 'Course not found'}, status=404)
     
@@ -134,7 +198,7 @@ def course_detail(request, pk):
             pass
         # Teacher can view only courses they're instructing
         elif request.user.role == 'teacher':
-            if request.user not in course.instructors.all():
+            if not is_course_instructor(request, course):
                 return Response({'detail': 'Permission denied'}, status=403)
         # Student can view any course
         elif request.user.role == 'student':
@@ -142,8 +206,16 @@ def course_detail(request, pk):
         else:
             return Response({'detail': 'Unauthorized role'}, status=403)
         
+        # instructors and category title are embedded, the catalog version covers their changes;
+        # the counters don't move updated_at
+        etag = make_etag(
+            'course', course.pk, course.updated_at, course.enrollment_count, course.lesson_count, get_version('courses'),
+        )
+        not_modified = check_not_modified(request, etag=etag)
+        if not_modified:
+            return not_modified
         serializer = CourseSerializer(course, context={'request': request})
-        return Response(serializer.data)
+        return set_validators(Response(serializer.data), etag=etag)
     
     elif request.method == 'PUT':
         # Admin can update any course
@@ -151,7 +223,7 @@ def course_detail(request, pk):
             pass
         # Teacher can update only courses they're instructing
         elif request.user.role == 'teacher':
-            if request.user not in course.instructors.all():
+            if not is_course_instructor(request, course):
                 return Response({'detail': 'Only instructors of this course can update it.'}, status=403)
         else:
             return Response({'detail': 'Unauthorized role'}, status=403)
@@ -167,7 +239,7 @@ def course_detail(request, pk):
             pass
         # Teacher can delete only courses they're instructing
         elif request.user.role == 'teacher':
-            if request.user not in course.instructors.all():
+            if not is_course_instructor(request, course):
                 return Response({'detail': 'Only instructors of this course can delete it.'}, status=403)
         else:
             return Response({'detail': 'Unauthorized role'}, status=403)
@@ -181,9 +253,15 @@ def course_detail(request, pk):
 @permission_classes([IsAuthenticated])  # Added authentication requirement
 def lesson_list_create(request):
     if request.method == 'GET':
-        lessons = Lesson.objects.all()
-        serializer = LessonSerializer(lessons, many=True, context={'request': request})
-        return Response(serializer.data)
+        etag, last_modified = table_validators(Lesson.objects.all(), 'lessons', counters=('question_count',))
+        not_modified = check_not_modified(request, etag=etag, last_modified=last_modified)
+        if not_modified:
+            return not_modified
+        lessons = LessonSerializer.setup_queryset(Lesson.objects.all(), context={'request': request})
+        paginator = KeysetPagination(ordering=('-created_at',))  # newest first
+        page = paginator.paginate_queryset(lessons, request)
+        serializer = LessonSerializer(page, many=True, context={'request': request})
+        return set_validators(paginator.get_paginated_response(serializer.data), etag=etag, last_modified=last_modified)
     elif request.method == 'POST':
         serializer = LessonSerializer(data=request.data, context={'request': request})
         if serializer.is_valid():
@@ -197,9 +275,11 @@ def lesson_list_create(request):
 @permission_classes([IsAuthenticated])  # Added authentication requirement
 def material_list_create(request):
     if request.method == 'GET':
-        materials = Material.objects.all()
-        serializer = MaterialSerializer(materials, many=True, context={'request': request})
-        return Response(serializer.data)
+        materials = MaterialSerializer.setup_queryset(Material.objects.all(), context={'request': request})
+        paginator = KeysetPagination(ordering=('-created_at',))  # newest first
+        page = paginator.paginate_queryset(materials, request)
+        serializer = MaterialSerializer(page, many=True, context={'request': request})
+        return paginator.get_paginated_response(serializer.data)
     elif request.method == 'POST':
         serializer = MaterialSerializer(data=request.data, context={'request': request})
         if serializer.is_valid():
@@ -213,9 +293,11 @@ def material_list_create(request):
 @permission_classes([IsAuthenticated])  # Added authentication requirement
 def enrollment_list_create(request):
     if request.method == 'GET':
-        enrollments = Enrollment.objects.all()
-        serializer = EnrollmentSerializer(enrollments, many=True, context={'request': request})
-        return Response(serializer.data)
+        enrollments = EnrollmentSerializer.setup_queryset(Enrollment.objects.all(), context={'request': request})
+        paginator = KeysetPagination(ordering=('-created_at',))  # newest first
+        page = paginator.paginate_queryset(enrollments, request)
+        serializer = EnrollmentSerializer(page, many=True, context={'request': request})
+        return paginator.get_paginated_response(serializer.data)
     elif request.method == 'POST':
         serializer = EnrollmentSerializer(data=request.data, context={'request': request})
         if serializer.is_valid():
@@ -223,18 +305,294 @@ def enrollment_list_create(request):
             return Response(serializer.data, status=status.HTTP_201_CREATED)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
+@swagger_auto_schema(method='post', request_body=BulkEnrollmentSerializer, responses={201: 'created count and per-row errors'})
+@api_view(['POST'])
+@permission_classes([IsAdmin])  # course launches / corporate onboarding
+def enrollment_bulk_create(request):
+    serializer = BulkEnrollmentSerializer(data=request.data)
+    if not serializer.is_valid():
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+    created, errors = bulk_enroll(serializer.get_rows())
+    # rows are independent: valid ones are enrolled even when others fail
+    response_status = status.HTTP_201_CREATED if created or not errors else status.HTTP_400_BAD_REQUEST
+    return Response({'created': created, 'errors': errors}, status=response_status)
+
 @swagger_auto_schema(method='get', responses={200: QuestionAnswerSerializer(many=True)})
 @swagger_auto_schema(method='post', request_body=QuestionAnswerSerializer, responses={201: QuestionAnswerSerializer})
 @api_view(['GET', 'POST'])
 @permission_classes([IsAuthenticated])  # Added authentication requirement
 def questionanswer_list_create(request):
     if request.method == 'GET':
-        questions = QuestionAnswer.objects.all()
-        serializer = QuestionAnswerSerializer(questions, many=True, context={'request': request})
-        return Response(serializer.data)
+        questions = QuestionAnswerSerializer.setup_queryset(QuestionAnswer.objects.all(), context={'request': request})
+        paginator = KeysetPagination(ordering=('-created_at',))  # newest first
+        page = paginator.paginate_queryset(questions, request)
+        serializer = QuestionAnswerSerializer(page, many=True, context={'request': request})
+        return paginator.get_paginated_response(serializer.data)
     elif request.method == 'POST':
         serializer = QuestionAnswerSerializer(data=request.data, context={'request': request})
         if serializer.is_valid():
             serializer.save()
             return Response(serializer.data, status=status.HTTP_201_CREATED)
-        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
\ No newline at end of file
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+# certificate PDFs are rendered in bulk by manage.py generate_certificates, see core/certificates.py
+@swagger_auto_schema(method='get', responses={200: 'certificate PDF', 404: 'not generated yet'})
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def enrollment_certificate(request, pk):
+    enrollment = Enrollment.objects.filter(pk=pk).only('id', 'student_id', 'course_id', 'is_certificate_ready').first()
+    if enrollment is None:
+        return Response({'detail': 'Enrollment not found'}, status=status.HTTP_404_NOT_FOUND)
+    allowed = (
+        enrollment.student_id_id == request.user.pk or request.user.role == 'admin'
+        or (request.user.role == 'teacher' and is_course_instructor(request, Course(pk=enrollment.course_id_id)))
+    )
+    if not allowed:
+        return Response({'detail': 'Enrollment not found'}, status=status.HTTP_404_NOT_FOUND)
+    name = certificate_name(enrollment.course_id_id, enrollment.pk)
+    if not enrollment.is_certificate_ready or not default_storage.exists(name):
+        return Response({'detail': 'The certificate is not ready yet.'}, status=status.HTTP_404_NOT_FOUND)
+    return FileResponse(
+        default_storage.open(name, 'rb'), as_attachment=True, filename=f'certificate-{enrollment.pk}.pdf',
+        content_type='application/pdf',
+    )
+
+# streaming exports for reporting jobs, see core/export.py for the filters
+@swagger_auto_schema(method='get', responses={200: 'NDJSON (default) or CSV stream, ?output=csv'})
+@api_view(['GET'])
+@permission_classes([IsAdminOrTeacher])
+def enrollment_export(request):
+    # teachers only get the enrollments of courses they instruct
+    extra = {} if request.user.role == 'admin' else {'course_id__instructors': request.user.pk}
+    return export_response('enrollments', request.query_params, extra)
+
+@swagger_auto_schema(method='get', responses={200: 'NDJSON (default) or CSV stream, ?output=csv'})
+@api_view(['GET'])
+@permission_classes([IsAdminOrTeacher])
+def questionanswer_export(request):
+    extra = {} if request.user.role == 'admin' else {'lesson_id__course_id__instructors': request.user.pk}
+    return export_response('questions', request.query_params, extra)
+
+# catalog import from a CSV/NDJSON manifest, run by a background job, see core/imports.py for the format
+def import_response(request, job, response_status):
+    url = request.build_absolute_uri(reverse('course_import_status', args=[job.pk]))
+    response = Response({'import': CatalogImportSerializer(job).data, 'status_url': url}, status=response_status)
+    response['Location'] = url
+    return response
+
+@swagger_auto_schema(method='post', responses={202: 'import queued, poll status_url', 200: 'already imported, nothing to do'})
+@api_view(['POST'])
+@permission_classes([IsAdmin])
+def course_import(request):
+    manifest = request.FILES.get('manifest')
+    if manifest is None:
+        return Response({'manifest': ['Upload the manifest file.']}, status=status.HTTP_400_BAD_REQUEST)
+    job, queued = start_import(manifest, request.data.get('input'))
+    return import_response(request, job, status.HTTP_202_ACCEPTED if queued else status.HTTP_200_OK)
+
+@swagger_auto_schema(method='get', responses={200: 'import progress and skipped rows'})
+@api_view(['GET'])
+@permission_classes([IsAdmin])
+def course_import_status(request, pk):
+    job = CatalogImport.objects.filter(pk=pk).first()
+    if job is None:
+        return Response({'detail': 'Import not found'}, status=status.HTTP_404_NOT_FOUND)
+    return import_response(request, job, status.HTTP_200_OK)
+
+# protected lesson videos, see core/media.py
+def can_watch_lesson(request, lesson):
+    if request.user.role == 'admin':
+        return True
+    if request.user.role == 'teacher':
+        return is_course_instructor(request, Course(pk=lesson.course_id_id))
+    return Enrollment.objects.filter(student_id=request.user.pk, course_id=lesson.course_id_id, is_active=True).exists()
+
+def get_watchable_lesson(request, pk):
+    # (lesson, None) or (None, error response)
+    lesson = Lesson.objects.filter(pk=pk).only('id', 'course_id', 'video').first()
+    if lesson is None or not lesson.video:
+        return None, Response({'detail': 'Lesson video not found'}, status=status.HTTP_404_NOT_FOUND)
+    if not can_watch_lesson(request, lesson):
+        return None, Response({'detail': 'Enroll in this course to watch its lessons.'}, status=status.HTTP_403_FORBIDDEN)
+    return lesson, None
+
+@swagger_auto_schema(method='get', responses={200: 'signed video URL and its expiry'})
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def lesson_video_url(request, pk):
+    lesson, error = get_watchable_lesson(request, pk)
+    if error:
+        return error
+    token, expires_at = sign_video(lesson, request.user.pk)
+    url = request.build_absolute_uri(reverse('lesson_video', args=[pk])) + '?' + urlencode({'token': token})
+    return Response({'url': url, 'expires_at': expires_at})
+
+@swagger_auto_schema(method='get', responses={200: 'whole video', 206: 'requested byte range', 416: 'range not satisfiable'})
+@api_view(['GET'])
+@permission_classes([AllowAny])  # a signed ?token= is the credential, without one: JWT + enrollment check
+def lesson_video(request, pk):
+    token = request.query_params.get('token')
+    if token:
+        name = read_video_token(token, pk)  # no query: the token carries the file name
+        if name is None:
+            return Response({'detail': 'Invalid or expired video link.'}, status=status.HTTP_403_FORBIDDEN)
+        return video_response(request, name)
+    if not request.user.is_authenticated:
+        return Response({'detail': 'Authentication credentials were not provided'}, status=status.HTTP_401_UNAUTHORIZED)
+    lesson, error = get_watchable_lesson(request, pk)
+    if error:
+        return error
+    return video_response(request, lesson.video.name)
+
+# live Q&A of a lesson over Server-Sent Events, the stream itself is an async view, see core/feeds.py
+@swagger_auto_schema(method='get', responses={200: 'signed stream URL and its expiry'})
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def lesson_question_stream_url(request, pk):
+    lesson = Lesson.objects.filter(pk=pk).only('id', 'course_id').first()
+    if lesson is None:
+        return Response({'detail': 'Lesson not found'}, status=status.HTTP_404_NOT_FOUND)
+    if not can_watch_lesson(request, lesson):
+        return Response({'detail': 'Enroll in this course to follow its questions.'}, status=status.HTTP_403_FORBIDDEN)
+    token, expires_at = sign_stream(lesson.pk, request.user.pk)
+    url = request.build_absolute_uri(reverse('lesson_question_stream', args=[pk])) + '?' + urlencode({'token': token})
+    return Response({'url': url, 'expires_at': expires_at})
+
+# chunked, resumable uploads of lesson videos and material files, see core/uploads.py
+def get_own_upload(request, pk):
+    # (upload, None) or (None, error response); an upload is only visible to its owner and admins
+    upload = Upload.objects.filter(pk=pk).first()
+    if upload is None or (upload.user_id != request.user.pk and request.user.role != 'admin'):
+        return None, Response({'detail': 'Upload not found'}, status=status.HTTP_404_NOT_FOUND)
+    return upload, None
+
+def upload_state(upload):
+    response = Response(UploadSerializer(upload).data)
+    response['Upload-Offset'] = str(upload.received)
+    response['Cache-Control'] = 'no-store'
+    return response
+
+@swagger_auto_schema(method='post', request_body=UploadSerializer, responses={201: UploadSerializer})
+@api_view(['POST'])
+@permission_classes([IsAdminOrTeacher])
+def upload_create(request):
+    serializer = UploadSerializer(data=request.data)
+    if not serializer.is_valid():
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+    upload = Upload(**serializer.validated_data)
+    obj, _ = get_target(upload)
+    if obj is None:
+        return Response({'object_id': ['No such lesson or material.']}, status=status.HTTP_400_BAD_REQUEST)
+    if request.user.role != 'admin' and not is_course_instructor(request, Course(pk=obj.course_id_id)):
+        return Response({'detail': 'Only the course instructors can upload its files.'}, status=status.HTTP_403_FORBIDDEN)
+    upload = serializer.save(user_id=request.user.pk)  # request.user is the stateless token user
+    start_upload(upload)
+    data = dict(UploadSerializer(upload).data, chunk_size=get_upload_setting('CHUNK_SIZE'))
+    return Response(data, status=status.HTTP_201_CREATED)
+
+@swagger_auto_schema(method='get', responses={200: UploadSerializer})
+@swagger_auto_schema(method='put', responses={200: 'new acknowledged offset', 409: 'resume from the acknowledged offset'})
+@api_view(['GET', 'PUT', 'DELETE'])
+@permission_classes([IsAdminOrTeacher])
+def upload_detail(request, pk):
+    upload, error = get_own_upload(request, pk)
+    if error:
+        return error
+    if request.method == 'GET':
+        return upload_state(upload)
+    elif request.method == 'PUT':
+        # raw chunk body, never parsed: request.data is not touched so the stream is read block by block
+        try:
+            offset = int(request.headers['Upload-Offset'])
+            length = int(request.headers['Content-Length'])
+        except (KeyError, ValueError):
+            return Response({'detail': 'Send Upload-Offset and Content-Length headers.'}, status=status.HTTP_400_BAD_REQUEST)
+        algorithm, _, checksum = request.headers.get('Upload-Checksum', '').partition(' ')
+        if algorithm.lower() != 'sha256' or not checksum:
+            return Response({'detail': 'Send an Upload-Checksum: sha256 <hex digest of the chunk> header.'}, status=status.HTTP_400_BAD_REQUEST)
+        write_chunk(upload, offset, request.stream, length, checksum.strip().lower())
+        return upload_state(upload)
+    elif request.method == 'DELETE':
+        discard_upload(upload)
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+@swagger_auto_schema(method='post', responses={200: 'the lesson or material with its new file'})
+@api_view(['POST'])
+@permission_classes([IsAdminOrTeacher])
+def upload_finalize(request, pk):
+    upload, error = get_own_upload(request, pk)
+    if error:
+        return error
+    obj = finalize_upload(upload)
+    serializer_class = LessonSerializer if isinstance(obj, Lesson) else MaterialSerializer
+    return Response(serializer_class(obj, context={'request': request}).data)
+
+# lesson progress heartbeats, buffered and written in batches, see core/progress.py
+MAX_PROGRESS_EVENTS = 500
+
+@swagger_auto_schema(method='get', responses={200: LessonProgressSerializer(many=True)})
+@swagger_auto_schema(method='post', request_body=ProgressEventSerializer, responses={202: 'accepted count'})
+@api_view(['GET', 'POST'])
+@permission_classes([IsAuthenticated])
+def lesson_progress(request):
+    if request.method == 'POST':
+        many = isinstance(request.data, list)
+        serializer = ProgressEventSerializer(data=request.data, many=many, **({'max_length': MAX_PROGRESS_EVENTS} if many else {}))
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        events = serializer.validated_data if many else [serializer.validated_data]
+        accepted = record_heartbeats(request.user.pk, events)
+        return Response({'accepted': accepted}, status=status.HTTP_202_ACCEPTED)
+
+    filters = {}
+    for param in ('course', 'lesson'):
+        value = request.query_params.get(param)
+        if value:
+            if not value.isdigit():
+                return Response({param: ['A valid integer is required.']}, status=status.HTTP_400_BAD_REQUEST)
+            filters[param] = int(value)
+    rows = LessonProgress.objects.filter(student_id=request.user.pk, **filters).order_by('lesson_id')
+    data = {row['lesson']: row for row in LessonProgressSerializer(rows, many=True).data}
+    # positions not flushed yet, so a reload resumes where the player was: this process's buffer only,
+    # another worker's heartbeats show once its flusher wrote them (within FLUSH_SECONDS)
+    for lesson_id, (position, duration, completed) in progress_buffer.pending(request.user.pk).items():
+        if lesson_id in data:
+            data[lesson_id].update(position=position, duration=duration,
+                                   is_completed=completed or data[lesson_id]['is_completed'])
+        elif not filters or filters == {'lesson': lesson_id}:
+            data[lesson_id] = {'lesson': lesson_id, 'course': None, 'position': position, 'duration': duration,
+                               'is_completed': completed, 'updated_at': None}
+    return Response(list(data.values()))
+
+# full-text search over the catalog and Q&A, see core/search.py
+@swagger_auto_schema(method='get', responses={200: 'ranked hits with highlighted title and snippet'})
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def search_view(request):
+    if not search_available():
+        return Response({'detail': 'Search needs the SQLite FTS5 index.'}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+    query = request.query_params.get('q', '')
+    if not query.strip():
+        return Response({'q': ['Enter something to search for.']}, status=status.HTTP_400_BAD_REQUEST)
+    kinds = [kind for kind in request.query_params.get('type', '').split(',') if kind]
+    if any(kind not in SEARCH_KINDS for kind in kinds):
+        return Response({'type': [f'Choose from {", ".join(SEARCH_KINDS)}.']}, status=status.HTTP_400_BAD_REQUEST)
+    numbers = {}
+    for param, default in (('course', None), ('page', 1), ('page_size', get_search_setting('PAGE_SIZE'))):
+        value = request.query_params.get(param)
+        if value and (not value.isdigit() or int(value) == 0):
+            return Response({param: ['A valid positive integer is required.']}, status=status.HTTP_400_BAD_REQUEST)
+        numbers[param] = int(value) if value else default
+    page, page_size = numbers['page'], min(numbers['page_size'], get_search_setting('MAX_PAGE_SIZE'))
+    offset = (page - 1) * page_size
+    if offset >= get_search_setting('MAX_RESULTS'):
+        return Response({'page': ['Too deep, refine the search instead.']}, status=status.HTTP_400_BAD_REQUEST)
+    # one extra hit tells whether there is a next page
+    hits = search(query, kinds, numbers['course'], limit=page_size + 1, offset=offset)
+    has_next = len(hits) > page_size and offset + page_size < get_search_setting('MAX_RESULTS')
+    url = request.build_absolute_uri()
+    return Response({
+        'next': replace_query_param(url, 'page', page + 1) if has_next else None,
+        'page_size': page_size,
+        'results': hits[:page_size],
+    })
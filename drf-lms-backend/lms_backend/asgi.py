@@ -5,6 +5,12 @@ It exposes the ASGI callable as a module-level variable named ``application``.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
+
+    WEB_CONCURRENCY=4 uvicorn lms_backend.asgi:application   # worker count read by core/cache.py too
+
+GET on the catalog, lesson and question lists is served by async views (core/async_views.py).
+Exports, videos and certificates stay sync views: core/streaming.py streams their bodies a chunk
+at a time here too, instead of Django reading them into memory first.
 """
 
 import os
@@ -12,5 +18,6 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'lms_backend.settings')
+os.environ.setdefault('LMS_SERVER', 'asgi')  # read by the settings: async views, no persistent connections
 
 application = get_asgi_application()
@@ -11,11 +11,18 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
+import sys
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
+# served by an ASGI server: lms_backend/asgi.py sets LMS_SERVER=asgi before these settings load,
+# wsgi.py, runserver and the other commands leave it unset. Read by LMS_ASYNC_READS and CONN_MAX_AGE.
+# The test suite runs the ASGI setup (its async views call the DRF ones too, so both are covered)
+ASGI = os.environ.get('LMS_SERVER') == 'asgi' or sys.argv[1:2] == ['test']
+
 
 # Quick-start development settings - unsuitable for production
 # See https://docs.djangoproject.com/en/5.2/howto/deployment/checklist/
@@ -48,6 +55,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.streaming.AsyncStreamingMiddleware',  # ASGI: exports and files streamed a chunk at a time, not read into memory
 	'corsheaders.middleware.CorsMiddleware', # ---
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -56,6 +64,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'core.replicas.ReplicaMiddleware',  # GET /api/ reads from LMS_REPLICAS, a no-op without them
 ]
 
 ROOT_URLCONF = 'lms_backend.urls'
@@ -81,12 +90,46 @@ WSGI_APPLICATION = 'lms_backend.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
+# SQLite set up for several workers (python manage.py benchmark_concurrency compares it with the stock settings):
+# - WAL: readers don't block the writer nor wait for it; synchronous=NORMAL is safe in WAL (a power
+#   cut can lose the last commits, never corrupt the file) and skips an fsync per commit
+# - transaction_mode IMMEDIATE: transaction.atomic() takes the write lock at BEGIN and waits for it up to
+#   timeout seconds; a deferred one that reads then writes fails with "database is locked" at once
+#   when another writer got there first, the busy timeout can't help it
+# - cache_size is per connection (negative: KiB), mmap_size lets reads skip a copy through it
+# - benchmark_concurrency measures the gain for forked sync workers (WSGI) keeping their connection;
+#   under ASGI every request reconnects and its page cache starts cold: `--profile all` measures both
+#   (the lock errors are gone either way, most of the throughput gain is the kept connection)
+SQLITE_OPTIONS = {
+    'init_command': (
+        'PRAGMA journal_mode=WAL; PRAGMA synchronous=NORMAL; PRAGMA cache_size=-20000; '
+        'PRAGMA mmap_size=268435456; PRAGMA temp_store=MEMORY'
+    ),
+    'transaction_mode': 'IMMEDIATE',
+    'timeout': 20,  # seconds a statement waits for the write lock
+}
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
-    }
+        'OPTIONS': SQLITE_OPTIONS,
+        # keep the connection (and its page cache) across requests. Not under ASGI: a request's sync code
+        # runs on a thread of its own there, a kept connection would never be reused, only left open
+        'CONN_MAX_AGE': 0 if ASGI else 600,
+        'CONN_HEALTH_CHECKS': True,  # a reused connection is checked before the request uses it
+    },
+    # read replica (core/replicas.py), only read from when listed in LMS_REPLICAS["ALIASES"]; locally a
+    # second SQLite file filled by python manage.py sync_replica, in production a standby of default
+    'replica': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': BASE_DIR / 'replica.sqlite3',
+        'OPTIONS': SQLITE_OPTIONS,
+        'CONN_MAX_AGE': 0 if ASGI else 600,
+        'CONN_HEALTH_CHECKS': True,
+    },
 }
+DATABASE_ROUTERS = ['core.replicas.ReplicaRouter']
 
 
 # Password validation
@@ -141,7 +184,8 @@ REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
 		#"rest_framework.authentication.SessionAuthentication",  # Uses Django's session-based authentication.
         #"rest_framework.authentication.BasicAuthentication",  # Uses HTTP Basic Authentication, where the client sends a username and password encoded in the Authorization header.
-        'rest_framework_simplejwt.authentication.JWTAuthentication',  # For APIs, also used in class 10
+        #'rest_framework_simplejwt.authentication.JWTAuthentication',  # For APIs, also used in class 10
+        'users.authentication.StatelessJWTAuthentication',  # JWT, request.user comes from the token claims (no User query)
 		#'rest_framework.authentication.TokenAuthentication',
     ),
 	# "DEFAULT_PERMISSION_CLASSES": [
@@ -156,6 +200,80 @@ SIMPLE_JWT = {
     "REFRESH_TOKEN_LIFETIME": timedelta(days=7),
     "ROTATE_REFRESH_TOKENS": True,
     "BLACKLIST_AFTER_ROTATION": True,
+    "TOKEN_OBTAIN_SERIALIZER": "users.serializers.LMSTokenObtainPairSerializer",  # adds role / is_active claims
+    "TOKEN_REFRESH_SERIALIZER": "users.serializers.LMSTokenRefreshSerializer",
+    "TOKEN_USER_CLASS": "users.authentication.LMSTokenUser",
+    # rotated / logged out refresh tokens are revoked in users/revocation.py (token_blacklist app is not installed)
+    "TOKEN_VERIFY_SERIALIZER": "users.serializers.LMSTokenVerifySerializer",
+    "TOKEN_BLACKLIST_SERIALIZER": "users.serializers.LMSTokenBlacklistSerializer",
+}
+
+LMS_REVOCATION = {
+    "CAPACITY": 1_000_000,  # Bloom filter size in revoked tokens (~1.8 MB)
+    "ERROR_RATE": 0.001,
+    "SYNC_SECONDS": 1,  # how often a worker pulls revocations made by other workers
+    "REBUILD_SECONDS": 60 * 60,  # a worker rebuilds its filter (in chunks, one per sync) this often
+    # expired rows are deleted by manage.py prune_revoked_tokens (cron) and the run_workers supervisor
+}
+
+# Protected lesson videos (core/media.py)
+LMS_MEDIA = {
+    "VIDEO_URL_TTL": 4 * 60 * 60,  # seconds a signed video URL stays valid
+    "OFFLOAD": "",  # "nginx" (X-Accel-Redirect) or "apache" (X-Sendfile) in production, "" streams from Django
+    "ACCEL_REDIRECT_PREFIX": "/protected-media/",  # nginx internal location aliased to MEDIA_ROOT
+    "BANNER_WIDTHS": (320, 640, 1280),  # course banner thumbnails + WebP (core/images.py), cropped to 16:9
+}
+
+# Background jobs (core/jobs.py), run with: python manage.py run_workers
+LMS_JOBS = {
+    "PROCESSES": 1,
+    "THREADS": 2,  # per process
+    "TIMEOUT_SECONDS": 10 * 60,  # a job running longer is presumed lost and retried
+    "MAX_ATTEMPTS": 5,
+    "BACKOFF_SECONDS": 10,  # 10s, 20s, 40s, ... between attempts
+}
+
+# Certificate PDFs (core/certificates.py), python manage.py generate_certificates
+LMS_CERTIFICATES = {
+    "CHUNK_SIZE": 500,  # enrollments per chunk, marked ready with one UPDATE
+    "PROCESSES": None,  # render processes, None: one per CPU
+    "MIN_MARK": 0,  # completed enrollments below this total_mark get no certificate
+    "FONT": None,  # path to a .ttf with the glyphs of your students' names, None: Pillow's bundled font
+}
+
+# Lesson progress heartbeats (core/progress.py), coalesced per (student, lesson) and flushed in batches
+LMS_PROGRESS = {
+    "FLUSH_SECONDS": 10,  # also the most a killed worker loses, and how far another worker's GET can lag
+    "MAX_BUFFERED": 5000,  # (student, lesson) pairs per process
+    "COMPLETE_RATIO": 0.9,  # a lesson watched to 90% is completed
+}
+
+# Read replicas (core/replicas.py): GET/HEAD/OPTIONS under /api/ read from one of ALIASES, writes go to default
+LMS_REPLICAS = {
+    "ALIASES": [],  # e.g. ["replica"], see DATABASES
+    "PIN_SECONDS": 10,  # a user who wrote reads from default this long: keep it above the replicas' lag
+}
+
+# Live Q&A over Server-Sent Events (core/feeds.py), /api/lessons/<pk>/questions/stream/
+LMS_FEEDS = {
+    "QUEUE_SIZE": 100,  # events waiting for a slow client before its stream is dropped (it reconnects and resumes)
+    "POLL_SECONDS": 15,  # idle streams read the index for questions created by other workers, and send a keepalive
+    "MAX_SECONDS": 30 * 60,  # a stream is closed after this, EventSource reconnects on its own
+}
+
+# Chunked, resumable uploads (core/uploads.py), parts are written to MEDIA_ROOT/uploads/
+LMS_UPLOADS = {
+    "CHUNK_SIZE": 8 * 1024 * 1024,  # suggested to clients
+    "MAX_CHUNK_SIZE": 64 * 1024 * 1024,  # keep it under the front proxy's client_max_body_size
+    "MAX_SIZE": 20 * 1024 * 1024 * 1024,
+    "EXPIRE_SECONDS": 24 * 60 * 60,  # manage.py prune_uploads deletes uploads untouched for this long
+}
+
+# Full-text search (core/search.py), an FTS5 table kept in sync by triggers, /api/search/?q=
+LMS_SEARCH = {
+    "PAGE_SIZE": 20,
+    "MAX_PAGE_SIZE": 50,
+    "MAX_RESULTS": 1000,  # hits a client can page through, past that: refine the query
 }
 
 SWAGGER_SETTINGS = {
@@ -170,6 +288,27 @@ SWAGGER_SETTINGS = {
     'USE_SESSION_AUTH': False,
 }
 
+# Response cache for the catalog listings (core/cache.py), entries are invalidated by version bumps in core/signals.py.
+# The cache must be shared by every process: a bump (or a replica pin, core/replicas.py) made by one web worker,
+# run_workers or a management command has to reach the others. FileBasedCache is shared by the processes of one
+# host; several hosts need Redis or memcached. LocMemCache is per process: core refuses it when WEB_CONCURRENCY
+# (the worker count uvicorn and gunicorn read) is above 1, and run_workers refuses it always
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': BASE_DIR / 'cache',
+        'OPTIONS': {'MAX_ENTRIES': 5000},
+    }
+}
+LMS_CACHE_ALIAS = 'default'
+
+LMS_RESPONSE_CACHE_TIMEOUT = 60 * 60  # seconds, versions make entries stale long before this
+LMS_COUNTS_CACHE_TIMEOUT = 60  # seconds the enrollment / lesson counts of a cached course page may lag (core/counters.py)
+
+# GET on the catalog, lesson and question lists is answered by async views (core/async_views.py) under
+# ASGI only; a WSGI worker would run each of them in an event loop of its own, for nothing
+LMS_ASYNC_READS = ASGI
+
 # Only allow your React dev server origin(s)
 CORS_ALLOWED_ORIGINS = [
     "http://localhost:3000",    # React Create‑React‑App default
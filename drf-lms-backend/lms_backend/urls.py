@@ -23,6 +23,7 @@ from rest_framework_simplejwt.views import (
     TokenObtainPairView,
     TokenRefreshView,
     TokenVerifyView, # ---
+    TokenBlacklistView,
 )
 
 from drf_yasg.views import get_schema_view
@@ -30,6 +31,7 @@ from drf_yasg import openapi
 from django.conf import settings
 from django.conf.urls.static import static
 from rest_framework import permissions
+from core.media import serve_public_media
 schema_view = get_schema_view(
     openapi.Info(
         title="LMS API",
@@ -47,10 +49,12 @@ urlpatterns = [
 	# ^ call in POST method with username & password, to get access and refresh token as response: {"refresh": "...", "access": "..."}	 
     path('api/token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
     path('api/token/verify/', TokenVerifyView.as_view(), name='token_verify'), 
+    path('api/token/blacklist/', TokenBlacklistView.as_view(), name='token_blacklist'),  # logout: POST {"refresh": "..."}
     path('swagger/', schema_view.with_ui('swagger', cache_timeout=0), name='schema-swagger-ui'),  # http://127.0.0.1:8000/swagger/  -- api doc
     path('redoc/', schema_view.with_ui('redoc', cache_timeout=0), name='schema-redoc'),
 ] 
-urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
+# lesson videos are not public, they go through /api/lessons/<pk>/video/ (core/media.py)
+urlpatterns += static(settings.MEDIA_URL, view=serve_public_media, document_root=settings.MEDIA_ROOT)
 
 """
 curl -X POST -H "Content-Type: application/json" -d '{"username": "yourusername", "password": "yourpassword"}' http://localhost:8000/api/token/
@@ -0,0 +1,65 @@
+# users, authentication.py:
+from django.utils.functional import cached_property
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTStatelessUserAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.models import TokenUser
+
+from .models import User
+
+
+class LMSTokenUser(TokenUser):
+    """
+    request.user built from the access token claims (id, role, is_active), no database hit.
+    Views that need the whole row (email, mobile_no, save()) use get_request_user(request).
+    """
+
+    @cached_property
+    def role(self):
+        if 'role' in self.token:
+            return self.token['role']
+        return self.db_user.role  # token issued before the role claim existed
+
+    @cached_property
+    def is_active(self):
+        return self.token.get('is_active', True)
+
+    @cached_property
+    def db_user(self):
+        try:
+            return User.objects.get(pk=self.id)
+        except User.DoesNotExist:  # deleted while its token is still valid: 401 like JWTAuthentication
+            raise AuthenticationFailed(_('User not found'), code='user_not_found')
+
+
+class StatelessJWTAuthentication(JWTStatelessUserAuthentication):
+    """JWTAuthentication without the per-request User SELECT, the user comes from the token claims."""
+
+    def get_user(self, validated_token):
+        user = super().get_user(validated_token)
+        if not user.is_active:
+            raise AuthenticationFailed(_('User is inactive'), code='user_inactive')
+        return user
+
+
+def get_request_user(request):
+    """The full User row behind request.user, loaded lazily and at most once per request."""
+    user = request.user
+    if isinstance(user, LMSTokenUser):
+        return user.db_user
+    return user
+
+
+async def aauthenticate(request):
+    """StatelessJWTAuthentication for async views: the token's user, None without a token, AuthenticationFailed if invalid."""
+    result = StatelessJWTAuthentication().authenticate(request)  # signature and claims, no query
+    if result is None:
+        return None
+    user, token = result
+    if 'role' not in token:
+        # token issued before the role claim: load it here, the cached_property would query from the event loop
+        try:
+            user.__dict__['role'] = (await User.objects.only('role').aget(pk=user.id)).role
+        except User.DoesNotExist:
+            raise AuthenticationFailed(_('User not found'), code='user_not_found')
+    return user
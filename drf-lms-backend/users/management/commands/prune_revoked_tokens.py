@@ -0,0 +1,12 @@
+# users, management/commands/prune_revoked_tokens.py:
+from django.core.management.base import BaseCommand
+
+from users.revocation import revocations
+
+
+class Command(BaseCommand):
+    help = 'Delete revoked refresh tokens that are past their expiry (safe to run from cron).'
+
+    def handle(self, *args, **options):
+        deleted = revocations.prune()
+        self.stdout.write(self.style.SUCCESS(f'Pruned {deleted} expired revoked tokens'))
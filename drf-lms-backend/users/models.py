@@ -9,10 +9,25 @@ class User(AbstractUser):
     role = models.CharField(max_length=10, choices=USER_ROLES)
     mobile_no = models.CharField(max_length=15, blank=True)
 
+    class Meta(AbstractUser.Meta):
+        indexes = [
+            models.Index(fields=['role'], name='user_role_idx'),  # instructors list, limit_choices_to
+        ]
+
     def __str__(self):
         return f"{self.username} ({self.role})"
 
 
+class RevokedToken(models.Model):
+    # refresh tokens that were rotated or logged out, see users/revocation.py
+    jti = models.CharField(max_length=255, unique=True)
+    expires_at = models.DateTimeField(db_index=True)  # rows past this are useless (the token is expired anyway) and get pruned
+    revoked_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    def __str__(self):
+        return self.jti
+
+
 """
 user = User.objects.create(username="alice", role="teacher")
 # In the database, role = "teacher" (lowercase)
@@ -0,0 +1,169 @@
+# users, revocation.py:
+import hashlib
+import math
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import datetime_from_epoch
+
+from .models import RevokedToken
+
+"""
+Refresh-token revocation store: an in-process Bloom filter in front of the RevokedToken table.
+
+- is_revoked(): a jti the filter has never seen is answered without a query; a filter hit
+  (real or false positive) is confirmed with one unique-index lookup.
+- revoke(): one INSERT on the unique jti. A second refresh with the same token loses on the
+  constraint, so rotation can't be replayed even by two concurrent requests.
+- the request path only syncs, at most one bounded query per SYNC_SECONDS: the revocations other
+  processes made since the last sync, or one REBUILD_CHUNK of a filter being rebuilt. A process
+  builds its filter that way on start (is_revoked asks the table until it is complete) and again
+  every REBUILD_SECONDS, which drops the bits of pruned jtis so the false positive rate stays low.
+- rows past their token's exp are deleted by manage.py prune_revoked_tokens (cron) and by the
+  run_workers supervisor, never by a request.
+
+Refresh itself never depends on the filter because of the INSERT above.
+"""
+
+DEFAULTS = {
+    'CAPACITY': 1_000_000,     # expected live revoked tokens, the filter grows on rebuild if exceeded
+    'ERROR_RATE': 0.001,       # false positive rate at CAPACITY (1M -> ~1.8 MB of bits)
+    'SYNC_SECONDS': 1,         # pull other processes' revocations at most this often
+    'SYNC_OVERLAP_SECONDS': 60,  # re-read this much history, a slow transaction may commit an older revoked_at
+    'REBUILD_SECONDS': 60 * 60,  # start a fresh filter this often (per process)
+    'REBUILD_CHUNK': 10_000,   # rows read by one sync while a filter is being built
+}
+
+
+def get_setting(name):
+    return getattr(settings, 'LMS_REVOCATION', {}).get(name, DEFAULTS[name])
+
+
+class BloomFilter:
+    def __init__(self, capacity, error_rate):
+        capacity = max(capacity, 1)
+        self.size = max(8, math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.capacity = capacity
+
+    def positions(self, key):
+        # double hashing: k positions from one 128-bit digest
+        digest = hashlib.blake2b(key.encode('utf-8'), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        return [(h1 + i * h2) % self.size for i in range(self.hashes)]
+
+    def add(self, key):
+        for position in self.positions(key):
+            self.bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, key):
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self.positions(key))
+
+
+class Build:
+    # a filter being filled REBUILD_CHUNK rows at a time, in id order
+    def __init__(self, capacity):
+        self.bloom = BloomFilter(capacity, get_setting('ERROR_RATE'))
+        self.started_at = timezone.now()  # syncs re-read from here: rows revoked during the build aren't missed
+        self.last_id = 0
+        self.rows = 0
+
+
+class RevocationStore:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.bloom = None       # None until the first build completed: is_revoked asks the table
+        self.build = None
+        self.synced_at = None   # revoked_at high-water mark of the last sync
+        self.live = 0           # rows in the last completed build, sizes the next one
+        self.next_sync = 0.0
+        self.next_rebuild = 0.0
+
+    def build_step(self):
+        """Adds the next chunk to the filter being built; swaps it in once the table is read."""
+        build = self.build
+        chunk = get_setting('REBUILD_CHUNK')
+        rows = list(
+            RevokedToken.objects.filter(pk__gt=build.last_id, expires_at__gt=timezone.now())
+            .order_by('pk').values_list('pk', 'jti')[:chunk]
+        )
+        for pk, jti in rows:
+            build.bloom.add(jti)
+        build.rows += len(rows)
+        if rows:
+            build.last_id = rows[-1][0]
+        if len(rows) < chunk:
+            self.bloom, self.synced_at, self.live, self.build = build.bloom, build.started_at, build.rows, None
+            self.next_rebuild = time.monotonic() + get_setting('REBUILD_SECONDS')
+
+    def start_build(self):
+        self.build = Build(max(get_setting('CAPACITY'), self.live * 2))
+
+    def rebuild(self):
+        """A complete filter now, every chunk in one go (commands, tests): not for the request path."""
+        with self.lock:
+            self.start_build()
+            while self.build is not None:
+                self.build_step()
+            self.next_sync = time.monotonic() + get_setting('SYNC_SECONDS')
+
+    def sync(self):
+        if time.monotonic() < self.next_sync:
+            return
+        with self.lock:
+            if time.monotonic() < self.next_sync:
+                return
+            if self.build is None and time.monotonic() >= self.next_rebuild:
+                self.start_build()
+            if self.build is not None:
+                self.build_step()
+            elif self.bloom is not None:
+                now = timezone.now()
+                since = self.synced_at - timedelta(seconds=get_setting('SYNC_OVERLAP_SECONDS'))
+                for jti in RevokedToken.objects.filter(revoked_at__gte=since).values_list('jti', flat=True).iterator():
+                    self.bloom.add(jti)
+                self.synced_at = now
+            self.next_sync = time.monotonic() + get_setting('SYNC_SECONDS')
+
+    def remember(self, jti):
+        for bloom in (self.bloom, self.build and self.build.bloom):
+            if bloom is not None:
+                bloom.add(jti)
+
+    def is_revoked(self, jti):
+        if not jti:
+            return False
+        self.sync()
+        bloom = self.bloom
+        if bloom is not None and jti not in bloom:
+            return False
+        return RevokedToken.objects.filter(jti=jti).exists()
+
+    def revoke(self, token):
+        """Records the token's jti, returns False if it was already revoked."""
+        jti = token[api_settings.JTI_CLAIM]
+        expires_at = datetime_from_epoch(token['exp'])
+        self.sync()
+        try:
+            with transaction.atomic():
+                RevokedToken.objects.create(jti=jti, expires_at=expires_at)
+        except IntegrityError:
+            return False
+        finally:
+            self.remember(jti)
+        return True
+
+    def prune(self):
+        """Deletes the rows of expired tokens (prune_revoked_tokens, run_workers); filters drop them on their next rebuild."""
+        deleted, _ = RevokedToken.objects.filter(expires_at__lte=timezone.now()).delete()
+        return deleted
+
+
+revocations = RevocationStore()
@@ -1,14 +1,92 @@
 from rest_framework import serializers
 from .models import User
+from django.apps import apps
 from django.contrib.auth.hashers import make_password 
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.serializers import (
+    TokenObtainPairSerializer, TokenRefreshSerializer, TokenVerifySerializer, TokenBlacklistSerializer
+)
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import UntypedToken
+from core.models import Course
+from core.query_plan import QueryPlanMixin
+from .revocation import revocations
 
-class UserSerializer(serializers.ModelSerializer):
+class TaughtCourseSerializer(QueryPlanMixin, serializers.ModelSerializer):
+    class Meta:
+        model = Course
+        fields = ('id', 'title', 'category', 'is_active')
+
+class UserSerializer(QueryPlanMixin, serializers.ModelSerializer):
     password = serializers.CharField(write_only=True, required = True)
 
     class Meta:
         model = User
         fields = ['id', 'username', 'email', 'role', 'mobile_no','password']
+        expandable = {'courses': TaughtCourseSerializer}  # ?expand=courses, the courses a teacher instructs
     
     def create(self, validated_data):
         validated_data['password'] = make_password(validated_data['password'])
-        return super().create(validated_data)
\ No newline at end of file
+        return super().create(validated_data)
+
+def add_user_claims(token, user):
+    # read by users.authentication.LMSTokenUser, so permission checks don't need a User SELECT
+    token['role'] = user.role
+    token['is_active'] = user.is_active
+    return token
+
+
+class LMSTokenObtainPairSerializer(TokenObtainPairSerializer):
+    @classmethod
+    def get_token(cls, user):
+        return add_user_claims(super().get_token(user), user)
+
+
+class LMSTokenRefreshSerializer(TokenRefreshSerializer):
+    # same flow as TokenRefreshSerializer.validate, but the claims are re-read from the user row,
+    # so a role change or deactivation reaches the next access token
+    def validate(self, attrs):
+        refresh = self.token_class(attrs['refresh'])
+        if revocations.is_revoked(refresh.get(api_settings.JTI_CLAIM)):
+            raise InvalidToken(_('Token is blacklisted'))
+
+        user_id = refresh.payload.get(api_settings.USER_ID_CLAIM, None)
+        user = User.objects.filter(**{api_settings.USER_ID_FIELD: user_id}).only('id', 'role', 'is_active').first()
+        if user is None or not api_settings.USER_AUTHENTICATION_RULE(user):
+            raise AuthenticationFailed(self.error_messages['no_active_account'], 'no_active_account')
+        add_user_claims(refresh, user)
+
+        data = {'access': str(refresh.access_token)}
+
+        if api_settings.ROTATE_REFRESH_TOKENS:
+            if api_settings.BLACKLIST_AFTER_ROTATION:
+                # INSERT on the unique jti, a concurrent second refresh with the same token fails here
+                if not revocations.revoke(refresh):
+                    raise InvalidToken(_('Token is blacklisted'))
+
+            refresh.set_jti()
+            refresh.set_exp()
+            refresh.set_iat()
+            if apps.is_installed('rest_framework_simplejwt.token_blacklist'):
+                refresh.outstand()  # OutstandingToken is abstract (no table) without the app
+
+            data['refresh'] = str(refresh)
+
+        return data
+
+
+class LMSTokenVerifySerializer(TokenVerifySerializer):
+    def validate(self, attrs):
+        token = UntypedToken(attrs['token'])
+        if revocations.is_revoked(token.get(api_settings.JTI_CLAIM)):
+            raise InvalidToken(_('Token is blacklisted'))
+        return {}
+
+
+class LMSTokenBlacklistSerializer(TokenBlacklistSerializer):
+    # logout: revoke the refresh token in users.revocation instead of the token_blacklist app
+    def validate(self, attrs):
+        refresh = self.token_class(attrs['refresh'])
+        revocations.revoke(refresh)
+        return {}
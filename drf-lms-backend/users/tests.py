@@ -1,3 +1,178 @@
-from django.test import TestCase
+from datetime import timedelta
+from io import StringIO
 
-# Create your tests here.
+from django.core.management import call_command
+from django.test import override_settings
+from django.utils import timezone
+from rest_framework_simplejwt.tokens import AccessToken, RefreshToken
+
+from core.tests import QueryBudgetTestCase
+from .models import User, RevokedToken
+from .revocation import BloomFilter, revocations
+from .serializers import LMSTokenObtainPairSerializer
+
+
+class UserQueryBudgetTests(QueryBudgetTestCase):
+    def test_list_as_admin(self):
+        self.login(self.admin)
+        response = self.assertBudget('get', '/api/user/auth/', queries=1)
+        self.assertEqual(len(response.data), User.objects.count())
+
+    def test_list_as_student(self):
+        self.login(self.student)
+        response = self.assertBudget('get', '/api/user/auth/', queries=1)
+        self.assertEqual([row['id'] for row in response.data], [self.student.pk])
+
+    def test_instructors_with_courses(self):
+        self.login(self.admin)
+        response = self.assertBudget('get', '/api/user/instructors/?fields=id,username&expand=courses', queries=2)
+        row = next(row for row in response.data if row['id'] == self.teacher.pk)
+        self.assertEqual(set(row), {'id', 'username', 'courses'})
+        self.assertIn(self.course.pk, [course['id'] for course in row['courses']])
+
+    def test_register(self):
+        data = {'username': 'newbie', 'email': 'newbie@example.com', 'role': 'student', 'password': 'secret-pass'}
+        # PBKDF2 is slow on purpose, give it room
+        self.assertBudget('post', '/api/user/auth/', queries=2, status=201, data=data, seconds=3.0)
+
+    def test_profile(self):
+        self.login(self.student)
+        self.assertBudget('get', '/api/user/profile/', queries=1)
+
+    def test_profile_update(self):
+        self.login(self.student)
+        self.assertBudget('put', '/api/user/profile/', queries=3, data={'mobile_no': '0123456789'})
+
+    def test_detail(self):
+        self.login(self.admin)
+        self.assertBudget('get', f'/api/user/{self.student.pk}/', queries=1)
+
+    def test_detail_denied(self):
+        self.login(self.student)
+        self.assertBudget('get', f'/api/user/{self.admin.pk}/', queries=0, status=403)
+
+    def test_detail_update(self):
+        self.login(self.admin)
+        self.assertBudget('put', f'/api/user/{self.student.pk}/', queries=3, data={'mobile_no': '0123456789'})
+
+    def test_delete(self):
+        self.login(self.admin)
+        # + enrollment_count / question_count of the courses and lessons the user leaves behind, + uploads, lesson progress
+        self.assertBudget('delete', f'/api/user/{self.student.pk}/', queries=13, status=204)
+
+    def test_instructors(self):
+        self.login(self.student)
+        response = self.assertBudget('get', '/api/user/instructors/', queries=1)
+        self.assertEqual(len(response.data), 10)
+
+
+class StatelessTokenTests(QueryBudgetTestCase):
+    def obtain(self, user):
+        response = self.client.post('/api/token/', {'username': user.username, 'password': 'password'})
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def test_access_token_carries_role(self):
+        tokens = self.obtain(self.teacher)
+        self.assertEqual(AccessToken(tokens['access'])['role'], 'teacher')
+        self.assertTrue(AccessToken(tokens['access'])['is_active'])
+
+    def test_refresh_rereads_claims(self):
+        tokens = self.obtain(self.teacher)
+        User.objects.filter(pk=self.teacher.pk).update(role='admin')
+        response = self.client.post('/api/token/refresh/', {'refresh': tokens['refresh']})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(AccessToken(response.data['access'])['role'], 'admin')
+        self.assertIn('refresh', response.data)
+
+    def test_refresh_rejects_inactive_user(self):
+        tokens = self.obtain(self.teacher)
+        User.objects.filter(pk=self.teacher.pk).update(is_active=False)
+        response = self.client.post('/api/token/refresh/', {'refresh': tokens['refresh']})
+        self.assertEqual(response.status_code, 401)
+
+    def test_inactive_claim_is_rejected(self):
+        token = LMSTokenObtainPairSerializer.get_token(self.student).access_token
+        token['is_active'] = False
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+        self.assertEqual(self.client.get('/api/categories/').status_code, 401)
+
+    def test_token_without_role_claim_loads_user(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(self.admin)}')
+        response = self.assertBudget('get', f'/api/user/{self.student.pk}/', queries=2)
+        self.assertEqual(response.data['id'], self.student.pk)
+
+    def test_deleted_user_gets_401(self):
+        user = User.objects.create_user('leaving', 'leaving@example.com', 'password', role='student')
+        self.login(user)
+        without_role = AccessToken.for_user(user)
+        user.delete()
+        response = self.client.get('/api/user/profile/')
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(response.data['code'], 'user_not_found')
+        # the async views load the role of a token issued before the claim existed
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {without_role}')
+        self.assertEqual(self.client.get('/api/categories/').status_code, 401)
+
+
+class RevocationTests(QueryBudgetTestCase):
+    def obtain(self, user):
+        return self.client.post('/api/token/', {'username': user.username, 'password': 'password'}).data
+
+    def test_rotated_refresh_token_is_revoked(self):
+        tokens = self.obtain(self.student)
+        first = self.client.post('/api/token/refresh/', {'refresh': tokens['refresh']})
+        self.assertEqual(first.status_code, 200)
+        replay = self.client.post('/api/token/refresh/', {'refresh': tokens['refresh']})
+        self.assertEqual(replay.status_code, 401)
+        self.assertEqual(self.client.post('/api/token/refresh/', {'refresh': first.data['refresh']}).status_code, 200)
+
+    def test_verify(self):
+        tokens = self.obtain(self.student)
+        self.assertEqual(self.client.post('/api/token/verify/', {'token': tokens['refresh']}).status_code, 200)
+        self.client.post('/api/token/blacklist/', {'refresh': tokens['refresh']})
+        self.assertEqual(self.client.post('/api/token/verify/', {'token': tokens['refresh']}).status_code, 401)
+
+    def test_unknown_jti_skips_the_table(self):
+        revocations.rebuild()
+        with self.assertNumQueries(0):
+            self.assertFalse(revocations.is_revoked('never-revoked'))
+
+    def test_revoke_is_idempotent(self):
+        token = RefreshToken.for_user(self.student)
+        self.assertTrue(revocations.revoke(token))
+        self.assertFalse(revocations.revoke(token))
+        self.assertTrue(revocations.is_revoked(token['jti']))
+
+    def test_prune_expired(self):
+        RevokedToken.objects.create(jti='old', expires_at=timezone.now() - timedelta(days=1))
+        live = RevokedToken.objects.create(jti='live', expires_at=timezone.now() + timedelta(days=1))
+        call_command('prune_revoked_tokens', stdout=StringIO())
+        self.assertEqual(list(RevokedToken.objects.values_list('jti', flat=True)), [live.jti])
+        revocations.rebuild()
+        self.assertTrue(revocations.is_revoked('live'))
+        self.assertFalse(revocations.is_revoked('old'))
+
+    @override_settings(LMS_REVOCATION={'REBUILD_CHUNK': 2, 'SYNC_SECONDS': 0})
+    def test_filter_is_built_a_chunk_per_sync(self):
+        for i in range(5):
+            RevokedToken.objects.create(jti=f'chunk-{i}', expires_at=timezone.now() + timedelta(days=1))
+        revocations.rebuild()
+        self.assertIn('chunk-4', revocations.bloom)
+        revocations.next_rebuild = 0  # due: the next syncs build a new filter beside the current one
+        RevokedToken.objects.create(jti='during-build', expires_at=timezone.now() + timedelta(days=1))
+        with self.assertNumQueries(1):
+            revocations.sync()
+        self.assertIsNotNone(revocations.build)
+        while revocations.build is not None:
+            revocations.sync()
+        self.assertIn('during-build', revocations.bloom)
+        self.assertTrue(revocations.is_revoked('during-build'))
+
+    def test_bloom_filter(self):
+        bloom = BloomFilter(capacity=1000, error_rate=0.01)
+        for i in range(1000):
+            bloom.add(f'jti-{i}')
+        self.assertTrue(all(f'jti-{i}' in bloom for i in range(1000)))
+        false_positives = sum(f'other-{i}' in bloom for i in range(10000))
+        self.assertLess(false_positives, 300)
@@ -5,8 +5,10 @@ from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import IsAuthenticated
 from .models import User
 from .serializers import UserSerializer
+from .authentication import get_request_user
 from drf_yasg.utils import swagger_auto_schema
 from django.core.exceptions import ObjectDoesNotExist
+from core.export import export_response
 
 @swagger_auto_schema(method='get', responses={200: UserSerializer(many=True)})
 @swagger_auto_schema(method='post', request_body=UserSerializer, responses={201: UserSerializer})
@@ -20,7 +22,8 @@ def user_list_create(request):
             users = User.objects.all()
         else:
             users = User.objects.filter(id=request.user.id)
-        serializer = UserSerializer(users, many=True)
+        users = UserSerializer.setup_queryset(users, context={'request': request})
+        serializer = UserSerializer(users, many=True, context={'request': request})
         return Response(serializer.data)
     elif request.method == 'POST':
         serializer = UserSerializer(data=request.data)
@@ -35,12 +38,13 @@ def user_list_create(request):
 @permission_classes([IsAuthenticated])
 def current_user_profile(request):
     # Get or update the current user's profile
+    user = get_request_user(request)  # request.user only carries the token claims, load the full row
     if request.method == 'GET':
-        serializer = UserSerializer(request.user)
+        serializer = UserSerializer(user, context={'request': request})
         return Response(serializer.data)
     
     elif request.method == 'PUT':
-        serializer = UserSerializer(request.user, data=request.data, partial=True)
+        serializer = UserSerializer(user, data=request.data, partial=True)
         if serializer.is_valid():
             serializer.save()
             return Response(serializer.data)
@@ -63,7 +67,7 @@ def user_detail(request, user_id):
         return Response({'detail': 'User not found'}, status=status.HTTP_404_NOT_FOUND)
     
     if request.method == 'GET':
-        serializer = UserSerializer(user)
+        serializer = UserSerializer(user, context={'request': request})
         return Response(serializer.data)
     
     elif request.method == 'PUT':
@@ -83,6 +87,16 @@ def user_detail(request, user_id):
 @permission_classes([IsAuthenticated])
 def get_all_instructors(request):    
     # Get all users with role='teacher' (instructors)    
-    instructors = User.objects.filter(role='teacher')
-    serializer = UserSerializer(instructors, many=True)
-    return Response(serializer.data)
\ No newline at end of file
+    instructors = UserSerializer.setup_queryset(User.objects.filter(role='teacher'), context={'request': request})
+    serializer = UserSerializer(instructors, many=True, context={'request': request})
+    return Response(serializer.data)
+
+
+@swagger_auto_schema(method='get', responses={200: 'NDJSON (default) or CSV stream, ?output=csv&role=student'})
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def user_export(request):
+    if request.user.role != 'admin':
+        return Response({'detail': 'Access denied'}, status=status.HTTP_403_FORBIDDEN)
+    extra = {'role': request.query_params['role']} if request.query_params.get('role') else None
+    return export_response('users', request.query_params, extra)
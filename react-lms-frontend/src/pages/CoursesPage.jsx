@@ -8,6 +8,8 @@ const baseUrl = "http://127.0.0.1:8000";
 export default function CoursesPage() {
   const { token } = useAuth();
   const [courses, setCourses] = useState([]);
+  const [nextPage, setNextPage] = useState(null); // url of the next catalog page, null on the last one
+  const [loadingMore, setLoadingMore] = useState(false);
   const [categories, setCategories] = useState([]);
   const [instructors, setInstructors] = useState([]);
   const [loading, setLoading] = useState(true);
@@ -40,7 +42,8 @@ export default function CoursesPage() {
           Authorization: `Bearer ${token}`
         }
       });
-      setCourses(response.data);
+      setCourses(response.data.results); // list endpoints are cursor paginated: {next, first, page_size, results}
+      setNextPage(response.data.next);
       setError(null);
     } catch (err) {
       console.error('Error fetching courses:', err);
@@ -50,6 +53,25 @@ export default function CoursesPage() {
     }
   };
 
+  // Follow the cursor: next is an absolute url carrying the cursor of the last course shown
+  const loadMoreCourses = async () => {
+    setLoadingMore(true);
+    try {
+      const response = await axios.get(nextPage, {
+        headers: {
+          Authorization: `Bearer ${token}`
+        }
+      });
+      setCourses(current => [...current, ...response.data.results]);
+      setNextPage(response.data.next);
+    } catch (err) {
+      console.error('Error fetching more courses:', err);
+      setError('Failed to fetch courses');
+    } finally {
+      setLoadingMore(false);
+    }
+  };
+
   const fetchCategories = async () => {
     try {
       const response = await axios.get(`${baseUrl}/api/categories/`, {
@@ -361,6 +383,17 @@ export default function CoursesPage() {
               ))}
             </div>
           )}
+          {nextPage && (
+            <div className="mt-8 text-center">
+              <button
+                onClick={loadMoreCourses}
+                disabled={loadingMore}
+                className="inline-flex items-center px-4 py-2 border border-gray-300 shadow-sm text-sm font-medium rounded-md text-gray-700 bg-white hover:bg-gray-50 disabled:opacity-50 focus:outline-none focus:ring-2 focus:ring-offset-2 focus:ring-green-500"
+              >
+                {loadingMore ? 'Loading...' : 'Load more courses'}
+              </button>
+            </div>
+          )}
         </>
       )}
 